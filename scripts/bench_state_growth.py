@@ -0,0 +1,113 @@
+# scripts/bench_state_growth.py
+"""
+状态开销基准: 测量串行图每一步的耗时是否随课程数增长。
+使用真实的 AgentState、load_and_prepare / get_next_lesson / finalize_lesson 节点和路由,
+出题相关节点替换为产出固定大小课程的本地节点 (不调用 LLM / TTS), 因此测到的只是状态传递的开销。
+
+用法 (在项目根目录): python -m scripts.bench_state_growth --lessons 5 50 200 500
+"""
+import io
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from langgraph.graph import StateGraph, END
+from models import AgentState, LessonOutput, VocabPackage, Question, Stimuli, OptionItem
+from graph import node_load_and_prepare, node_get_next_lesson, node_finalize_lesson, router_should_continue, recursion_limit_for
+
+
+def make_input(num_lessons: int, words_per_lesson: int) -> dict:
+    lessons = []
+    for i in range(num_lessons):
+        lessons.append({
+            "lesson_id": i + 1,
+            "lesson_name": f"Lesson {i + 1}",
+            "description": "benchmark lesson",
+            "duration": 10,
+            "skill_distribution": {"reading": 5},
+            "type": "passage",
+            "related_vocabulary": [
+                {"word_id": i * 100 + w, "word": f"词{w}", "HSK_level": 1, "skill_distribution": {"reading": 2}}
+                for w in range(words_per_lesson)
+            ],
+        })
+    return {"topic": "bench", "question_num": 2, "hsk_level": 1, "total_lessons": num_lessons,
+            "estimated_duration": num_lessons * 10, "lessons": lessons}
+
+
+def node_fake_lesson(state: AgentState) -> dict:
+    """代替 generate_content ~ quality_check: 产出固定大小的课程 (每词 2 道选择题)。"""
+    lesson = state.current_lesson
+    packages = [
+        VocabPackage(word_id=str(v.word_id), word=v.word, questions=[
+            Question(level=1, type="read_choice", stimuli=Stimuli(text=f"我喜欢{v.word}。"), stem=f"{v.word}是什么意思？",
+                     options=[OptionItem(id="A", text=f"{v.word}一"), OptionItem(id="B", text=f"{v.word}二")], answer="A")
+            for _ in range(2)
+        ])
+        for v in lesson.related_vocabulary
+    ]
+    output_lesson = LessonOutput(lesson_id=str(lesson.lesson_id), lesson_name=lesson.lesson_name,
+                                 type=lesson.type, vocab_packages=packages)
+    return {"current_output_lesson": output_lesson, "current_content_text": "我喜欢。"}
+
+
+def build_bench_graph():
+    graph = StateGraph(AgentState)
+    graph.add_node("load_and_prepare", node_load_and_prepare)
+    graph.add_node("get_next_lesson", node_get_next_lesson)
+    graph.add_node("fake_lesson", node_fake_lesson)
+    graph.add_node("finalize_lesson", node_finalize_lesson)
+    graph.set_entry_point("load_and_prepare")
+    graph.add_edge("load_and_prepare", "get_next_lesson")
+    graph.add_edge("get_next_lesson", "fake_lesson")
+    graph.add_edge("fake_lesson", "finalize_lesson")
+    graph.add_conditional_edges(
+        "finalize_lesson",
+        router_should_continue,
+        {"get_next_lesson": "get_next_lesson", "end": END}
+    )
+    return graph.compile()
+
+
+def run_once(num_lessons: int, words_per_lesson: int) -> dict:
+    """运行一次, 以相邻两个 updates 之间的间隔作为每步耗时。"""
+    app = build_bench_graph()
+    step_times = []
+    with contextlib.redirect_stdout(io.StringIO()): # 丢弃节点的 print 输出
+        start = last = time.perf_counter()
+        for _ in app.stream({"stage2_input": make_input(num_lessons, words_per_lesson)},
+                            {"recursion_limit": recursion_limit_for(num_lessons)},
+                            stream_mode="updates"):
+            now = time.perf_counter()
+            step_times.append(now - last)
+            last = now
+    total = last - start
+    tail = max(1, len(step_times) // 10)
+    return {
+        "steps": len(step_times),
+        "total_s": total,
+        "ms_per_step": total / len(step_times) * 1000,
+        "first_ms": sum(step_times[1:tail + 1]) / tail * 1000, # 跳过 load_and_prepare
+        "last_ms": sum(step_times[-tail:]) / tail * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-step state overhead of the serial graph.")
+    parser.add_argument("--lessons", type=int, nargs="+", default=[5, 50, 200, 500])
+    parser.add_argument("--words", type=int, default=8, help="每课的词数 (每词 2 道题)")
+    args = parser.parse_args()
+
+    print(f"{'lessons':>8} {'steps':>7} {'total_s':>9} {'ms/step':>9} {'first10%':>9} {'last10%':>9}")
+    for n in args.lessons:
+        r = run_once(n, args.words)
+        print(f"{n:>8} {r['steps']:>7} {r['total_s']:>9.3f} {r['ms_per_step']:>9.3f} {r['first_ms']:>9.3f} {r['last_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
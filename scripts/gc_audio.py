@@ -0,0 +1,32 @@
+# scripts/gc_audio.py
+import sys
+import argparse
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from database import audio_reference_counts
+from tools.audio_store import get_audio_store
+
+
+def main(min_age_hours: float = 24.0, dry_run: bool = False):
+    """删除数据库中没有任何题目 (stimuli.audio_url) 引用的音频文件。"""
+    print("--- Audio store garbage collection ---")
+    reference_counts = audio_reference_counts()
+    print(f"  - {len(reference_counts)} audio files referenced by questions in DB.")
+    result = get_audio_store().collect_garbage(
+        reference_counts,
+        min_age_seconds=min_age_hours * 3600,
+        dry_run=dry_run
+    )
+    print(f"  - Result: {result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced TTS audio files.")
+    parser.add_argument("--min-age-hours", type=float, default=24.0,
+                        help="只删除早于该时长写入的文件 (默认 24 小时)")
+    parser.add_argument("--dry-run", action="store_true", help="只统计, 不删除")
+    args = parser.parse_args()
+    main(min_age_hours=args.min_age_hours, dry_run=args.dry_run)
@@ -0,0 +1,54 @@
+# scripts/migrate_topic_name_unique.py
+import sys
+import argparse
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from sqlalchemy import text
+from database import engine, SCHEMA_NAME
+
+TOPICS = f'"{SCHEMA_NAME}".topics'
+LESSONS = f'"{SCHEMA_NAME}".generated_lessons'
+
+
+def main(dry_run: bool = False):
+    """
+    一次性迁移: 合并同名 topic (课程改挂到 topic_id 最小的一行, 其余行删除), 再建唯一索引 uq_topics_topic_name。
+    批量保存 (save_topic_outputs) 的 upsert 依赖该索引; 可重复执行, 没有重复行时只建索引。
+    """
+    print("--- Migrate topics.topic_name to unique ---")
+    with engine.connect() as conn: # 未 commit 时关闭连接即回滚
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('uq_topics_topic_name'))"))
+        duplicates = conn.execute(text(f"""
+            SELECT topic_name, MIN(topic_id), COUNT(*) FROM {TOPICS}
+            GROUP BY topic_name HAVING COUNT(*) > 1 ORDER BY topic_name
+        """)).all()
+        print(f"  - {len(duplicates)} topic names have duplicate rows.")
+        for topic_name, keep_id, count in duplicates:
+            print(f"    - '{topic_name}': {count} rows, keeping topic_id {keep_id}")
+        if dry_run:
+            print("  - Dry run: nothing changed.")
+            return
+
+        moved = conn.execute(text(f"""
+            UPDATE {LESSONS} AS l SET topic_id = keep.topic_id
+            FROM {TOPICS} AS t,
+                 (SELECT topic_name, MIN(topic_id) AS topic_id FROM {TOPICS} GROUP BY topic_name) AS keep
+            WHERE l.topic_id = t.topic_id AND t.topic_name = keep.topic_name AND t.topic_id <> keep.topic_id
+        """)).rowcount
+        deleted = conn.execute(text(f"""
+            DELETE FROM {TOPICS} AS t USING {TOPICS} AS keep
+            WHERE t.topic_name = keep.topic_name AND t.topic_id > keep.topic_id
+        """)).rowcount
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_topics_topic_name ON {TOPICS} (topic_name)"))
+        conn.commit()
+    print(f"  - Moved {moved} lessons, deleted {deleted} duplicate topic rows, uq_topics_topic_name in place.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge duplicate topics and add the unique index on topics.topic_name.")
+    parser.add_argument("--dry-run", action="store_true", help="只列出重复的 topic, 不修改")
+    args = parser.parse_args()
+    main(dry_run=args.dry_run)
@@ -0,0 +1,40 @@
+# scripts/plan_exercises.py
+import sys
+import json
+import argparse
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from models import Stage2Input
+from utils.exercise_planner import plan_lesson
+
+
+def main(input_path: str = "data/stage2_example.json", seed: int | None = None, as_json: bool = False):
+    """打印每课的出题计划 (与 gen_vocab_questions 使用的计划相同), 不调用 LLM。"""
+    with open(input_path, "r", encoding="utf-8") as f:
+        stage2_input = Stage2Input.model_validate(json.load(f))
+
+    plans = [plan_lesson(lesson, stage2_input.question_num, topic=stage2_input.topic, seed=seed).to_dict()
+             for lesson in stage2_input.lessons]
+    if as_json:
+        print(json.dumps(plans, ensure_ascii=False, indent=2))
+        return
+
+    print(f"--- Exercise plans for '{stage2_input.topic}' (question_num={stage2_input.question_num}) ---")
+    for lesson, plan in zip(stage2_input.lessons, plans):
+        print(f"\nLesson {plan['lesson_id']} '{lesson.lesson_name}': {sum(plan['types'].values())}/{plan['target']} questions (seed {plan['seed']})")
+        print(f"  - skills: {plan['skills']}")
+        print(f"  - types:  {plan['types']}")
+        for word_plan in plan["words"].values():
+            print(f"    - {word_plan['word']}: {word_plan['exercises']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the per-lesson exercise plan without calling the LLM.")
+    parser.add_argument("input_path", nargs="?", default="data/stage2_example.json")
+    parser.add_argument("--seed", type=int, default=None, help="覆盖随机种子 (默认由 topic 和 lesson_id 推导)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整计划")
+    args = parser.parse_args()
+    main(args.input_path, seed=args.seed, as_json=args.json)
@@ -0,0 +1,219 @@
+# scripts/run_batch.py
+"""
+多 topic 批量运行: 一次接收一个目录 / glob / 若干 Stage2Input JSON 文件, 在进程池中并行运行。
+- 每个工作进程只初始化一次 (解释器、build_graph() 编译、数据库连接池), 之后连续处理多个 topic。
+- 所有工作进程共用一个 LLM 限流器 (QPS + TPM 令牌桶, 见 src/rate_limit.py)。
+- 每个 topic 的状态写入 manifest (JSON), 失败的 topic 可以用 --retry-failed 单独重跑。
+- 每个 topic 的节点日志写入 <log-dir>/<文件名>.log, 终端只打印进度。
+
+用法 (在项目根目录):
+  python -m scripts.run_batch data/topics/ --workers 4 --qps 10 --tpm 300000
+  python -m scripts.run_batch "data/topics/*.json" --mode parallel
+  python -m scripts.run_batch --retry-failed
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+import traceback
+from pathlib import Path
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from models import AgentState
+from graph import build_graph, recursion_limit_for
+from database import engine, save_topic_outputs, SaveError
+from config import LLM_RATE_LIMIT_QPS, LLM_RATE_LIMIT_TPM
+from rate_limit import RateLimiter, install_rate_limiter
+
+DEFAULT_MANIFEST = project_root / "outputs" / "batch_manifest.json"
+DEFAULT_LOG_DIR = project_root / "outputs" / "batch_logs"
+
+
+def collect_inputs(patterns: List[str]) -> List[Path]:
+    """目录取其中的 *.json; 含通配符的按 glob 展开; 其余视为文件路径。去重并保持顺序。"""
+    paths: List[Path] = []
+    for pattern in patterns:
+        p = Path(pattern)
+        if p.is_dir():
+            paths.extend(sorted(p.glob("*.json")))
+        elif any(ch in pattern for ch in "*?["):
+            paths.extend(Path(m) for m in sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(p)
+    seen, unique = set(), []
+    for p in paths:
+        key = str(p.resolve())
+        if key not in seen:
+            seen.add(key)
+            unique.append(p.resolve())
+    return unique
+
+
+class BatchManifest:
+    """
+    {input_path: {status, topic, lessons, errors, ...}}。每次更新后原子写回文件, 批量运行中途退出也能看到已完成的状态。
+    status: queued -> done / failed
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            self.entries = json.loads(path.read_text(encoding="utf-8")).get("topics", {})
+
+    def update(self, input_path: str, **fields) -> None:
+        self.entries.setdefault(input_path, {}).update(fields)
+        self.save()
+
+    def failed(self) -> List[str]:
+        return [p for p, entry in self.entries.items() if entry.get("status") != "done"]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({"updated_at": datetime.now().isoformat(timespec="seconds"),
+                                        "topics": self.entries}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+# ---------------- 工作进程 ----------------
+
+def init_worker(limiter: Optional[RateLimiter]) -> None:
+    # 父进程创建的共享限流器只能在进程创建时传入
+    install_rate_limiter(limiter)
+    # fork 出来的连接池不能与父进程共用连接
+    engine.dispose(close=False)
+
+
+@lru_cache(maxsize=None)
+def get_app(mode: Optional[str], max_parallel: Optional[int]):
+    """每个工作进程每种模式只编译一次图。"""
+    return build_graph(mode=mode, max_parallel=max_parallel)
+
+
+def run_topic(input_path: str, mode: Optional[str], max_parallel: Optional[int], log_dir: str, save_to_db: bool = True) -> Dict[str, Any]:
+    """在工作进程中运行一个 topic, 返回写入 manifest 的状态记录。"""
+    started_at = time.time()
+    record: Dict[str, Any] = {"status": "failed", "pid": os.getpid()}
+    log_path = Path(log_dir) / f"{Path(input_path).stem}.log"
+    record["log_path"] = str(log_path)
+
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            input_data = json.loads(Path(input_path).read_text(encoding="utf-8"))
+            topic_name = input_data.get("topic", "Unknown Topic")
+            num_lessons = len(input_data.get("lessons") or [])
+            record["topic"] = topic_name
+
+            app = get_app(mode, max_parallel)
+            final_state_dict = app.invoke({"stage2_input": input_data}, {"recursion_limit": recursion_limit_for(num_lessons)})
+            final_state = AgentState.model_validate(final_state_dict)
+
+            save_errors: List[str] = []
+            if final_state.outputs and save_to_db:
+                try:
+                    save_topic_outputs(topic_name, final_state.outputs, input_data.get("hsk_level"))
+                except SaveError as e: # 其余课程已提交; 记为失败以便重跑 (已保存的课程会被跳过)
+                    save_errors = [f"SaveError: lesson {lesson_id}: {error}" for lesson_id, error in e.failed]
+                except Exception as e: # 例如 topics 表缺少唯一索引; 仍写出 JSON 结果, 记为失败
+                    save_errors = [f"{type(e).__name__}: {e}"]
+
+            output_path = project_root / "outputs" / f"output_batch_{Path(input_path).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump({"topic": topic_name, "lessons": final_state.outputs}, f, ensure_ascii=False, indent=2)
+
+            record.update({
+                # 有错误 (串行模式会在第一个错误处停止) 或课程不全时记为失败, 以便重跑; 已生成的课程照常保存
+                "status": "done" if not final_state.errors and not save_errors and len(final_state.outputs) == num_lessons else "failed",
+                "lessons": len(final_state.outputs),
+                "expected_lessons": num_lessons,
+                "errors": final_state.errors + save_errors,
+                "output_path": str(output_path),
+            })
+        except Exception as e:
+            print(f"ERROR running topic '{input_path}': {e}\n{traceback.format_exc()}")
+            record["errors"] = [f"{type(e).__name__}: {e}"]
+
+    record["duration_s"] = round(time.time() - started_at, 2)
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+# ---------------- 主进程 ----------------
+
+def main(patterns: List[str], workers: int = 2, mode: Optional[str] = None, max_parallel: Optional[int] = None,
+         qps: float = LLM_RATE_LIMIT_QPS, tpm: float = LLM_RATE_LIMIT_TPM, manifest_path: Path = DEFAULT_MANIFEST,
+         log_dir: Path = DEFAULT_LOG_DIR, retry_failed: bool = False, save_to_db: bool = True):
+    manifest = BatchManifest(manifest_path)
+    inputs = [str(p) for p in collect_inputs(patterns)]
+    if retry_failed:
+        inputs += [p for p in manifest.failed() if p not in inputs]
+    if not inputs:
+        print("  - No input files found. Nothing to do.")
+        return
+
+    log_dir.mkdir(parents=True, exist_ok=True)
+    (project_root / "outputs").mkdir(exist_ok=True)
+    limiter = RateLimiter(qps, tpm) if (qps > 0 or tpm > 0) else None
+    workers = max(1, min(workers, len(inputs)))
+
+    print(f"--- Batch run: {len(inputs)} topics, {workers} worker processes, "
+          f"rate limit {'qps=%s tpm=%s' % (qps, tpm) if limiter else 'off'} ---")
+    print(f"  - Manifest: {manifest_path}")
+    for input_path in inputs:
+        manifest.update(input_path, status="queued", errors=[])
+
+    start_time = time.time()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter,)) as executor:
+        futures = {executor.submit(run_topic, p, mode, max_parallel, str(log_dir), save_to_db): p for p in inputs}
+        for future in as_completed(futures):
+            input_path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e: # 工作进程崩溃等
+                record = {"status": "failed", "errors": [f"Worker failed: {e}"]}
+            manifest.update(input_path, **record)
+            if record["status"] == "done":
+                done += 1
+            else:
+                failed += 1
+            print(f"  - [{done + failed}/{len(inputs)}] {record['status'].upper():6} {record.get('topic', input_path)} "
+                  f"({record.get('lessons', 0)} lessons, {record.get('duration_s', 0)}s)")
+
+    print(f"\n--- Batch finished in {time.time() - start_time:.2f} seconds: {done} done, {failed} failed ---")
+    if failed:
+        print(f"  - Retry failed topics with: python -m scripts.run_batch --retry-failed --manifest {manifest_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the learning agent for many Stage2Input files.")
+    parser.add_argument("inputs", nargs="*", help="Stage2Input JSON 文件、目录或 glob")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--mode", choices=["serial", "parallel"], default=None,
+                        help="课程执行模式 (默认读取 LESSON_EXECUTION_MODE)")
+    parser.add_argument("--max-parallel", type=int, default=None,
+                        help="parallel 模式下每个 topic 同时运行的最大课程数")
+    parser.add_argument("--qps", type=float, default=LLM_RATE_LIMIT_QPS,
+                        help="所有进程共享的 LLM 每秒请求数上限 (默认读取 LLM_RATE_LIMIT_QPS, 0 为不限)")
+    parser.add_argument("--tpm", type=float, default=LLM_RATE_LIMIT_TPM,
+                        help="所有进程共享的 LLM 每分钟 token 上限 (默认读取 LLM_RATE_LIMIT_TPM, 0 为不限)")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST, help="状态 manifest 路径")
+    parser.add_argument("--log-dir", type=Path, default=DEFAULT_LOG_DIR, help="每个 topic 的日志目录")
+    parser.add_argument("--retry-failed", action="store_true", help="重跑 manifest 中未完成的 topic")
+    parser.add_argument("--no-db", action="store_true", help="只写 JSON 输出, 不写数据库")
+    args = parser.parse_args()
+    if not args.inputs and not args.retry_failed:
+        parser.error("需要提供输入文件/目录/glob, 或使用 --retry-failed")
+    main(args.inputs, workers=args.workers, mode=args.mode, max_parallel=args.max_parallel,
+         qps=args.qps, tpm=args.tpm, manifest_path=args.manifest, log_dir=args.log_dir,
+         retry_failed=args.retry_failed, save_to_db=not args.no_db)
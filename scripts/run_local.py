@@ -1,6 +1,7 @@
 # src/run_local.py
 import json
 import sys
+import argparse
 from pathlib import Path
 from datetime import datetime
 import time
@@ -9,12 +10,47 @@ project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root / "src"))
 
 from models import AgentState # V7/V8 AgentState
-from graph import build_graph # V7/V8 Graph
+from graph import build_graph, recursion_limit_for # V7/V8 Graph
 # 导入数据库函数
-from database import save_lesson_output
-
-def main(input_path: str = "data/stage2_example.json"):
-    print("--- Starting Learning Agent (Batch DB Save Mode) ---")
+from database import save_topic_outputs, SaveError
+from llm_cache import get_llm_cache
+from rate_limit import get_concurrency_limiter
+from llm_deadline import get_latency_tracker
+from question_bank import get_question_bank
+from utils.question_rules import get_rule_stats
+from tools.tts import get_tts_queue
+from lesson_sink import WriteBehindLessonSink
+from checkpointing import open_checkpointer, CHECKPOINT_DB_PATH
+
+
+def stream_graph(app, initial_state: dict, config: dict, sink: WriteBehindLessonSink) -> dict | None:
+    """
+    流式执行图: 每当 finalize_lesson (串行主图, 或 parallel 模式下的课程子图) 产出一课,
+    立即交给后台写入器落盘。返回主图的最终状态 dict。
+    """
+    final_state_dict = None
+    submitted = set()
+    for namespace, stream_mode, chunk in app.stream(initial_state, config, stream_mode=["updates", "values"], subgraphs=True):
+        if stream_mode == "values":
+            if not namespace: # 只保留主图的状态
+                final_state_dict = chunk
+            continue
+        update = chunk.get("finalize_lesson") if isinstance(chunk, dict) else None
+        if not update or not update.get("outputs"):
+            continue
+        # outputs 为追加式字段, finalize_lesson 的更新只包含本课 (0 或 1 条)
+        for lesson_dict in update["outputs"]:
+            lesson_key = lesson_dict.get("lesson_id")
+            if lesson_key in submitted:
+                continue
+            submitted.add(lesson_key)
+            sink.submit(lesson_dict)
+    return final_state_dict
+
+
+def main(input_path: str = "data/stage2_example.json", mode: str | None = None, max_parallel: int | None = None,
+         stream: bool = False, max_pending: int = 4, run_id: str | None = None, checkpoint_db: str = CHECKPOINT_DB_PATH):
+    print(f"--- Starting Learning Agent ({'Streaming' if stream else 'Batch'} DB Save Mode) ---")
     start_time = time.time()
 
     try:
@@ -32,17 +68,48 @@ def main(input_path: str = "data/stage2_example.json"):
          return
 
     print("  - Building and compiling the graph...")
-    app = build_graph() #
+    checkpointer = open_checkpointer(checkpoint_db) if run_id else None
+    app = build_graph(mode=mode, max_parallel=max_parallel, checkpointer=checkpointer) #
 
     initial_state = {
         "stage2_input": input_data
     }
 
+    # 断点续跑: 同一 run_id 已有未完成的检查点时, 以 None 作为输入从最后完成的节点继续
+    run_config = {}
+    finished_state = None
+    if run_id:
+        run_config["configurable"] = {"thread_id": run_id, "checkpoint_db": checkpoint_db}
+        snapshot = app.get_state(run_config)
+        if snapshot.values and snapshot.next:
+            print(f"  - Resuming run '{run_id}' from checkpoint (next: {', '.join(snapshot.next)}).")
+            initial_state = None
+        elif snapshot.values:
+            print(f"  - Run '{run_id}' already finished in checkpoint '{checkpoint_db}'. Re-using its final state.")
+            finished_state = snapshot.values
+        else:
+            print(f"  - Starting new checkpointed run '{run_id}' (checkpoints in '{checkpoint_db}').")
+
     print(f"  - Invoking agent execution for Topic: '{topic_name}'...")
 
+    output_dir = project_root / "outputs"
+    output_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
     final_state_result = None 
+    sink = None
     try:
-        final_state_dict = app.invoke(initial_state, {"recursion_limit": 100})
+        num_lessons = len(input_data.get("lessons") or [])
+        run_config["recursion_limit"] = recursion_limit_for(num_lessons)
+        if finished_state is not None:
+            final_state_dict = finished_state
+        elif stream:
+            stream_path = output_dir / f"output_stream_{timestamp}.jsonl"
+            print(f"  - Streaming finished lessons to DB and '{stream_path}' (max {max_pending} pending writes).")
+            sink = WriteBehindLessonSink(topic_name, topic_hsk_level, stream_path, max_pending=max_pending)
+            final_state_dict = stream_graph(app, initial_state, run_config, sink)
+        else:
+            final_state_dict = app.invoke(initial_state, run_config)
         final_state = AgentState.model_validate(final_state_dict) #
         final_state_result = final_state # 保存最终状态
 
@@ -53,12 +120,36 @@ def main(input_path: str = "data/stage2_example.json"):
          print(traceback.format_exc())
 
          return 
+    finally:
+        if sink is not None:
+            sink.close() # 屏障: 已完成的课程 (包括出错前完成的) 全部落盘后再退出
+            print(f"  - Write-behind sink flushed: {sink.written} lessons persisted, {len(sink.errors)} errors.")
 
     end_time = time.time()
     total_duration = end_time - start_time
     print(f"\n--- Agent execution finished in {total_duration:.2f} seconds ---")
 
 
+    rule_stats = get_rule_stats()
+    if rule_stats:
+        print(f"  - Structural rule stats (rejected questions skip the LLM judge): {rule_stats}")
+
+    print(f"  - TTS job stats: {get_tts_queue().metrics()}")
+
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        print(f"  - LLM cache stats: {llm_cache.stats()}")
+
+    question_bank = get_question_bank()
+    if question_bank is not None:
+        print(f"  - Question bank reuse stats: {question_bank.stats()}")
+
+    concurrency_limiter = get_concurrency_limiter()
+    if concurrency_limiter is not None:
+        print(f"  - LLM concurrency window (AIMD): {concurrency_limiter.stats()}")
+
+    print(f"  - LLM latency / prompt cache by call type: {get_latency_tracker().stats()}")
+
     if final_state_result and final_state_result.errors:
         print("\n--- Execution Errors ---")
         for error in final_state_result.errors:
@@ -66,23 +157,24 @@ def main(input_path: str = "data/stage2_example.json"):
 
 
 
-    if final_state_result and final_state_result.outputs:
+    if stream:
+        print("\n--- Lessons were persisted incrementally by the streaming writer ---")
+    elif final_state_result and final_state_result.outputs:
         print(f"\n--- Saving {len(final_state_result.outputs)} completed lessons to database ---")
-
-        for lesson_data_dict in final_state_result.outputs:
-            lesson_name = lesson_data_dict.get("lesson_name", "Unknown Lesson")
-            print(f"  - Saving lesson '{lesson_name}'...")
-            # 调用保存函数，传入 topic 信息和 lesson 字典
-            save_lesson_output(topic_name, lesson_data_dict, topic_hsk_level) #
-        print("--- Database save complete ---")
+        try:
+            saved = save_topic_outputs(topic_name, final_state_result.outputs, topic_hsk_level) # 整个 topic 分批批量写入
+            print(f"--- Database save complete ({saved} new lessons) ---")
+        except SaveError as e:
+            print(f"--- Database save incomplete: {e.saved} new lessons saved, {len(e.failed)} failed ---")
+            for lesson_id, error in e.failed:
+                print(f"- Lesson {lesson_id}: {error}")
+        except Exception as e:
+            print(f"--- Database save failed: {e} ---")
     else:
         print("\n--- No lessons generated or found in final state. Nothing to save to database. ---")
 
 
 
-    output_dir = project_root / "outputs"
-    output_dir.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_filename = f"output_batch_{timestamp}.json"
     output_path = output_dir / output_filename
 
@@ -104,5 +196,21 @@ def main(input_path: str = "data/stage2_example.json"):
 
 
 if __name__ == "__main__":
-        file_path = sys.argv[1] if len(sys.argv) > 1 else "data/stage2_example.json"
-        main(file_path)
\ No newline at end of file
+        parser = argparse.ArgumentParser(description="Run the learning agent for one Stage2Input file.")
+        parser.add_argument("input_path", nargs="?", default="data/stage2_example.json")
+        parser.add_argument("--mode", choices=["serial", "parallel"], default=None,
+                            help="课程执行模式 (默认读取 LESSON_EXECUTION_MODE)")
+        parser.add_argument("--max-parallel", type=int, default=None,
+                            help="parallel 模式下同时运行的最大课程数 (默认读取 MAX_PARALLEL_LESSONS)")
+        parser.add_argument("--stream", action="store_true",
+                            help="流式模式: 每课完成后立即由后台线程写入数据库和 JSONL 文件")
+        parser.add_argument("--max-pending", type=int, default=4,
+                            help="流式模式下待写入课程的队列上限 (背压)")
+        parser.add_argument("--run-id", default=None,
+                            help="运行 id (LangGraph thread_id)。指定后开启 SQLite 检查点, 用同一 id 重启即可从中断处继续")
+        parser.add_argument("--checkpoint-db", default=CHECKPOINT_DB_PATH,
+                            help="检查点 SQLite 文件路径 (默认读取 CHECKPOINT_DB_PATH)")
+        args = parser.parse_args()
+        main(args.input_path, mode=args.mode, max_parallel=args.max_parallel,
+             stream=args.stream, max_pending=args.max_pending,
+             run_id=args.run_id, checkpoint_db=args.checkpoint_db)
\ No newline at end of file
@@ -0,0 +1,66 @@
+# scripts/test_apply_edits.py
+import sys
+from pathlib import Path
+
+# 确保项目根目录和 src 目录在路径中 (节点模块同时使用 src.xxx 和 xxx 两种导入)
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from nodes.ensure_vocab_cover import apply_edits, SentenceEdit
+
+UNITS = ["s0", "s1", "s2"]
+
+
+def make(edit: SentenceEdit, old):
+    return f"{edit.op}:{edit.text}" + (f"<{old}" if old is not None else "")
+
+
+def edits(*specs) -> list:
+    return [SentenceEdit(op=op, index=index, text=text) for op, index, text in specs]
+
+
+def test_replace_keeps_position():
+    assert apply_edits(UNITS, edits(("replace", 1, "x")), make) == ["s0", "replace:x<s1", "s2"]
+    assert apply_edits(UNITS, edits(("replace", 0, "a"), ("replace", 2, "c")), make) == ["replace:a<s0", "s1", "replace:c<s2"]
+
+
+def test_insert_at_boundaries():
+    """index 指原文编号: insert i 插在原第 i 句之前, i == len 时追加到末尾。"""
+    assert apply_edits(UNITS, edits(("insert", 0, "a")), make) == ["insert:a", "s0", "s1", "s2"]
+    assert apply_edits(UNITS, edits(("insert", 3, "z")), make) == ["s0", "s1", "s2", "insert:z"]
+    assert apply_edits([], edits(("insert", 0, "only")), make) == ["insert:only"]
+
+
+def test_indices_refer_to_the_original_text():
+    """多个修改的 index 都按原文编号, 不受前面插入的影响; 同一位置的插入保持给出的顺序。"""
+    result = apply_edits(UNITS, edits(("insert", 1, "a"), ("insert", 1, "b"), ("replace", 1, "x"), ("insert", 3, "z")), make)
+    assert result == ["s0", "insert:a", "insert:b", "replace:x<s1", "s2", "insert:z"]
+    assert apply_edits(UNITS, [], make) == UNITS
+
+
+def test_out_of_range_indices_rejected():
+    assert apply_edits(UNITS, edits(("replace", 3, "x")), make) is None # replace 不能指向末尾之后
+    assert apply_edits(UNITS, edits(("replace", -1, "x")), make) is None
+    assert apply_edits(UNITS, edits(("insert", 4, "x")), make) is None
+    assert apply_edits(UNITS, edits(("insert", -1, "x")), make) is None
+    assert apply_edits([], edits(("replace", 0, "x")), make) is None
+    # 任一修改无效时整体放弃 (调用方回退到全文改写)
+    assert apply_edits(UNITS, edits(("replace", 0, "ok"), ("insert", 9, "bad")), make) is None
+
+
+def test_double_replace_rejected():
+    assert apply_edits(UNITS, edits(("replace", 1, "x"), ("replace", 1, "y")), make) is None
+
+
+def main():
+    tests = [test_replace_keeps_position, test_insert_at_boundaries, test_indices_refer_to_the_original_text,
+             test_out_of_range_indices_rejected, test_double_replace_rejected]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} apply_edits tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
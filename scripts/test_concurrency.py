@@ -0,0 +1,86 @@
+# scripts/test_concurrency.py
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 确保 src 目录在路径中
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from utils.concurrency import map_ordered
+
+
+def test_results_follow_input_order():
+    """后提交的任务先完成时, 结果仍按输入顺序返回。"""
+    delays = [0.05, 0.0, 0.03, 0.0, 0.01]
+
+    def work(item):
+        index, delay = item
+        time.sleep(delay)
+        return index * 10
+
+    assert map_ordered(work, list(enumerate(delays)), max_concurrency=4) == [0, 10, 20, 30, 40]
+
+
+def test_concurrency_limit():
+    """同一时刻的在途任务数不超过 max_concurrency。"""
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def work(item):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return item
+
+    assert map_ordered(work, range(8), max_concurrency=2) == list(range(8))
+    assert peak <= 2
+
+
+def test_error_propagates_after_in_flight_tasks():
+    """任务抛出的异常原样抛出, 出错后不再提交新任务, 已在途的任务照常结束。"""
+    started = []
+    finished = []
+
+    def work(item):
+        started.append(item)
+        if item == 1:
+            raise ValueError("boom 1")
+        time.sleep(0.05)
+        finished.append(item)
+        return item
+
+    try:
+        map_ordered(work, range(6), max_concurrency=2)
+    except ValueError as e:
+        assert str(e) == "boom 1"
+    else:
+        raise AssertionError("map_ordered should re-raise the task error")
+    assert 0 in finished # 与出错任务同时在途的任务没有被中断
+    assert len(started) < 6 # 出错后没有继续提交剩余任务
+
+
+def test_serial_path_and_empty_input():
+    """max_concurrency=1 时在调用线程中依次执行; 空输入返回空列表。"""
+    caller = threading.get_ident()
+    assert map_ordered(lambda item: threading.get_ident() == caller, [1, 2], max_concurrency=1) == [True, True]
+    assert map_ordered(lambda item: item, []) == []
+
+
+def main():
+    tests = [test_results_follow_input_order, test_concurrency_limit,
+             test_error_propagates_after_in_flight_tasks, test_serial_path_and_empty_input]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} map_ordered tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# scripts/test_exercise_planner.py
+import sys
+import random
+from collections import Counter
+from pathlib import Path
+
+# 确保 src 目录在路径中
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from models import LessonInput
+from config import SKILL_TO_EXERCISE_MAP
+from utils.exercise_planner import apportion, plan_lesson, trim_to_plan
+
+
+def make_lesson(skill_distribution: dict, word_skills: list, lesson_id: int = 1) -> LessonInput:
+    return LessonInput.model_validate({
+        "lesson_id": lesson_id,
+        "lesson_name": f"Lesson {lesson_id}",
+        "description": "",
+        "duration": 5,
+        "skill_distribution": skill_distribution,
+        "type": "passage",
+        "related_vocabulary": [
+            {"word_id": i, "word": f"词{i}", "HSK_level": 1, "skill_distribution": skills}
+            for i, skills in enumerate(word_skills)
+        ],
+    })
+
+
+LESSON = make_lesson(
+    {"listening": 3, "reading": 4, "writing": 1, "speaking": 0},
+    [{"listening": 2, "reading": 1}, {"reading": 3, "writing": 1}, {"listening": 1}],
+)
+
+
+def test_apportion_largest_remainder():
+    # 精确值 3.5 / 2.1 / 1.4: 先取整 3 / 2 / 1, 剩下的 1 份给余数最大的 a
+    assert apportion(7, {"a": 5, "b": 3, "c": 2}, random.Random(0)) == {"a": 4, "b": 2, "c": 1}
+    # 精确值 4.2 / 2.8 / 2.8 / 0.2: 余数 0.8 的两项各得 1 份
+    assert apportion(10, {"a": 6, "b": 4, "c": 4, "d": 0.3}, random.Random(0)) == {"a": 4, "b": 3, "c": 3, "d": 0}
+    assert apportion(5, {"a": 0, "b": -1}, random.Random(0)) == {"a": 0, "b": 0}
+    assert apportion(0, {"a": 1}, random.Random(0)) == {"a": 0}
+
+
+def test_apportion_ties_follow_the_seed():
+    """余数相同的项由 rng 决定先后: 同一种子结果相同, 总数始终守恒。"""
+    weights = {"a": 1, "b": 1, "c": 1}
+    results = {tuple(sorted(apportion(10, weights, random.Random(seed)).items())) for seed in range(20)}
+    assert all(sum(n for _, n in result) == 10 and sorted(n for _, n in result) == [3, 3, 4] for result in results)
+    assert len(results) > 1 # 平局不总是落在同一项上
+    assert apportion(10, weights, random.Random(3)) == apportion(10, weights, random.Random(3))
+
+
+def test_plan_hits_question_num():
+    """课程题量为 question_num: 课程技能分布按比例缩放 (最大余数法)。"""
+    plan = plan_lesson(LESSON, question_num=20, seed=1)
+    assert plan.target == 20
+    # 精确值 7.5 / 10 / 2.5: 取整 7 / 10 / 2, 剩下 1 份在余数相同的 listening 和 writing 间由种子决定
+    assert plan.skills["reading"] == 10 and sorted([plan.skills["listening"], plan.skills["writing"]]) in ([2, 8], [3, 7])
+    assert sum(plan.skills.values()) == 20 and sum(plan.types.values()) == 20
+    for skill, count in plan.skills.items():
+        assert sum(n for t, n in plan.types.items() if t in SKILL_TO_EXERCISE_MAP[skill]) == count
+    # 技能只分给在该技能上有权重的词
+    assert set(plan.for_word(2)) <= set(SKILL_TO_EXERCISE_MAP["listening"])
+
+
+def test_unscaled_when_question_num_matches_or_is_missing():
+    plan = plan_lesson(LESSON, question_num=8, seed=1)
+    assert plan.skills == {"listening": 3, "reading": 4, "writing": 1}
+    assert sum(plan.for_word(1).values()) == 4 # reading 4 题中按权重 3:1 分到 3 题, writing 1 题
+    assert plan_lesson(LESSON, question_num=0, seed=1).target == 8 # question_num <= 0 时取技能分布之和
+
+
+def test_word_distributions_without_lesson_distribution():
+    lesson = make_lesson({}, [{"listening": 2, "reading": 1}, {"reading": 3}])
+    assert plan_lesson(lesson, question_num=12, seed=1).skills == {"listening": 4, "reading": 8}
+    assert plan_lesson(lesson, question_num=0, seed=1).target == 6
+
+
+def test_same_seed_same_plan():
+    first = plan_lesson(LESSON, question_num=0, topic="t", seed=42).to_dict()
+    assert plan_lesson(LESSON, question_num=0, topic="t", seed=42).to_dict() == first
+    assert first["seed"] == 42
+    plans = {str(plan_lesson(LESSON, question_num=0, seed=seed).to_dict()["words"]) for seed in range(20)}
+    assert len(plans) > 1 # 不同种子会改变题型轮转的起点
+    # 未指定种子时由 topic 和 lesson_id 推导, 重复调用不变
+    assert plan_lesson(LESSON, 0, topic="餐厅").seed == plan_lesson(LESSON, 0, topic="餐厅").seed
+
+
+def test_trim_to_plan():
+    class Q:
+        def __init__(self, q_type):
+            self.type = q_type
+    questions = [Q("read_tf"), Q("read_tf"), Q("write_word"), Q("listen_tf"), Q("read_tf")]
+    kept = trim_to_plan(questions, Counter({"read_tf": 2, "listen_tf": 1, "speak_follow": 1}))
+    assert [q.type for q in kept] == ["read_tf", "read_tf", "listen_tf"]
+
+
+def main():
+    tests = [test_apportion_largest_remainder, test_apportion_ties_follow_the_seed, test_plan_hits_question_num,
+             test_unscaled_when_question_num_matches_or_is_missing, test_word_distributions_without_lesson_distribution,
+             test_same_seed_same_plan, test_trim_to_plan]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} exercise planner tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# scripts/test_json_stream.py
+import sys
+import json
+from pathlib import Path
+
+# 确保 src 目录在路径中
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from utils.json_stream import JsonArrayStream
+
+QUESTIONS = [
+    {"type": "read_tf", "stem": "他说: \"菜单{在}哪里?\"", "answer": True},
+    {"type": "read_choice", "stem": "路径 C:\\menu\\ [1]", "options": [{"key": "A", "text": "}]"}]},
+    {"type": "write_word", "stem": "换行\n和 \\\" 结尾", "answer": {"text": "菜单"}},
+]
+OUTPUT = "```json\n" + json.dumps({"lesson": {"questions": "ignored"}, "questions": QUESTIONS}, ensure_ascii=False) + "\n```"
+
+
+def feed_in_chunks(stream: JsonArrayStream, text: str, size: int) -> list:
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(stream.feed(text[start:start + size]))
+    return items
+
+
+def test_whole_text():
+    stream = JsonArrayStream("questions")
+    assert stream.feed(OUTPUT) == QUESTIONS
+    assert stream.items_emitted == 3 and stream.items_failed == 0 and stream.complete
+
+
+def test_every_chunk_size():
+    """任意位置切分 (包括转义符和引号之间) 得到的元素与整段解析相同。"""
+    for size in range(1, 12):
+        stream = JsonArrayStream("questions")
+        assert feed_in_chunks(stream, OUTPUT, size) == QUESTIONS, f"chunk size {size}"
+        assert stream.complete
+
+
+def test_item_emitted_as_soon_as_it_closes():
+    stream = JsonArrayStream("questions")
+    first = json.dumps(QUESTIONS[0], ensure_ascii=False)
+    assert stream.feed('{"questions": [' + first[:-1]) == []
+    assert stream.feed(first[-1]) == [QUESTIONS[0]]
+    assert stream.feed(", {\"type\": \"read") == []
+    assert not stream.complete
+
+
+def test_other_keys_and_nested_arrays_are_ignored():
+    """只输出 key 对应数组的顶层元素; 同名的嵌套字段和其他数组不会被当作元素。"""
+    text = json.dumps({"meta": [{"questions": [{"x": 1}]}], "questions": [{"a": [{"b": 1}]}]})
+    assert JsonArrayStream("questions").feed(text) == [{"a": [{"b": 1}]}]
+
+
+def test_malformed_item_is_counted_and_reset():
+    stream = JsonArrayStream("questions")
+    assert stream.feed('{"questions": [{"a": 1,}, {"b": 2}]}') == [{"b": 2}]
+    assert stream.items_failed == 1 and stream.items_emitted == 1
+    stream.reset()
+    assert stream.items_failed == 0 and not stream.complete
+    assert stream.feed('{"questions": [{"c": 3}]}') == [{"c": 3}]
+
+
+def main():
+    tests = [test_whole_text, test_every_chunk_size, test_item_emitted_as_soon_as_it_closes,
+             test_other_keys_and_nested_arrays_are_ignored, test_malformed_item_is_counted_and_reset]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} JsonArrayStream tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# scripts/test_llm_cache.py
+import sys
+import tempfile
+import contextlib
+from pathlib import Path
+
+# 确保 src 目录在路径中
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+import llm_cache
+from llm_cache import LLMResponseCache
+
+
+class FakeClock:
+    """代替 llm_cache 模块里的 time 模块 (只用到 time.time()), 让 TTL 和 LRU 的时间线固定。"""
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@contextlib.contextmanager
+def fake_cache(**kwargs):
+    """在临时目录中创建缓存, 返回 (cache, clock); 退出时恢复 time 模块。"""
+    clock = FakeClock()
+    original_time = llm_cache.time
+    llm_cache.time = clock
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = LLMResponseCache(path=str(Path(tmp_dir) / "cache.sqlite"), **kwargs)
+            try:
+                yield cache, clock
+            finally:
+                cache._conn.close()
+    finally:
+        llm_cache.time = original_time
+
+
+def test_key_covers_every_parameter():
+    base = LLMResponseCache.make_key("qwen", "sys", "prompt", 0.7, 100)
+    assert base == LLMResponseCache.make_key("qwen", "sys", "prompt", 0.7, 100)
+    variants = [("qwen-max", "sys", "prompt", 0.7, 100), ("qwen", None, "prompt", 0.7, 100),
+                ("qwen", "sys", "prompt!", 0.7, 100), ("qwen", "sys", "prompt", 0.0, 100), ("qwen", "sys", "prompt", 0.7, 200)]
+    assert len({base} | {LLMResponseCache.make_key(*v) for v in variants}) == 6
+
+
+def test_ttl_expiry():
+    with fake_cache(ttl_seconds=60) as (cache, clock):
+        cache.put("k", "answer")
+        clock.now += 59
+        assert cache.get("k") == "answer"
+        clock.now += 2 # 按写入时间计算, 读取不会续期
+        assert cache.get("k") is None
+        assert cache.stats()["entries"] == 0 and cache.evictions == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_zero_never_expires():
+    with fake_cache(ttl_seconds=0) as (cache, clock):
+        cache.put("k", "answer")
+        clock.now += 10 * 365 * 86400
+        assert cache.get("k") == "answer"
+
+
+def test_lru_eviction_by_size():
+    with fake_cache(max_bytes=30, ttl_seconds=0) as (cache, clock):
+        for key in ("a", "b", "c"):
+            clock.now += 1
+            cache.put(key, key * 10) # 每条 10 字节, 正好装满
+        clock.now += 1
+        assert cache.get("a") == "a" * 10 # a 变为最近访问, b 成为最久未访问
+        clock.now += 1
+        cache.put("d", "d" * 10)
+        assert cache.get("b") is None
+        assert [cache.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+        assert cache.stats()["bytes"] == 30 and cache.evictions == 1
+
+
+def test_errors_and_empty_responses_not_stored():
+    with fake_cache() as (cache, _):
+        cache.put("err", "API_ERROR: Throttling")
+        cache.put("empty", "")
+        assert cache.get("err") is None and cache.get("empty") is None
+        assert cache.stats()["entries"] == 0
+
+
+def test_parse_retry_bypasses_cached_output():
+    """解析失败的输出被删除, use_cache=False 的重试重新请求并覆盖旧条目。"""
+    import llm_client
+    replies = iter(['{"questions": [', '{"questions": []}'])
+    original = (llm_client.get_llm_cache, llm_client._generate_with_retries)
+    with fake_cache() as (cache, _):
+        llm_client.get_llm_cache = lambda: cache
+        llm_client._generate_with_retries = lambda *args, **kwargs: next(replies)
+        try:
+            assert llm_client.llm("p", system="s", call_type="judge") == '{"questions": ['
+            assert llm_client.llm("p", system="s", call_type="judge") == '{"questions": [' # 命中缓存
+            assert llm_client.llm("p", system="s", call_type="judge", use_cache=False) == '{"questions": []}'
+            assert llm_client.llm("p", system="s", call_type="judge") == '{"questions": []}'
+            llm_client.discard_cached_response("p", "s", "judge")
+            assert cache.stats()["entries"] == 0
+        finally:
+            llm_client.get_llm_cache, llm_client._generate_with_retries = original
+
+
+def main():
+    tests = [test_key_covers_every_parameter, test_ttl_expiry, test_ttl_zero_never_expires,
+             test_lru_eviction_by_size, test_errors_and_empty_responses_not_stored, test_parse_retry_bypasses_cached_output]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} LLM cache tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# scripts/test_question_rules.py
+import sys
+from collections import Counter
+from pathlib import Path
+
+# 确保 src 目录在路径中
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root / "src"))
+
+from models import Question
+from config import ALL_EXERCISE_TYPES
+from utils.question_rules import RULES, rules_for, validate_question
+
+TARGET = ("菜单", "菜单")
+
+
+def make_q(q_type: str, **fields) -> Question:
+    data = {
+        "level": 2,
+        "type": q_type,
+        "stimuli": {"text": "服务员, 请给我菜单。"},
+        "stem": "他要什么?",
+        "options": [{"id": "A", "text": "菜单"}, {"id": "B", "text": "咖啡"}],
+        "answer": "A",
+    }
+    data.update(fields)
+    return Question.model_validate(data)
+
+
+def test_registry_covers_every_type():
+    names = [rule.name for rule in RULES]
+    assert len(names) == len(set(names)) # 统计按规则名累计, 名字不能重复
+    for q_type in ALL_EXERCISE_TYPES:
+        applicable = [rule.name for rule in rules_for(q_type)]
+        assert "empty_stem" in applicable and "unknown_type" not in applicable, q_type
+        # 注册表顺序即执行顺序
+        assert applicable == [name for name in names if name in applicable]
+    assert [rule.name for rule in rules_for("dance_move")] == ["unknown_type"]
+
+
+def test_valid_questions_pass():
+    stats: Counter = Counter()
+    assert validate_question(make_q("read_choice"), TARGET, stats) == (True, None)
+    assert validate_question(make_q("read_tf", options=None, answer=True), TARGET, stats) == (True, None)
+    assert validate_question(make_q("write_word", stimuli={}, stem="写出: cài dān", options=None, answer="菜单"), TARGET, stats) == (True, None)
+    assert stats == Counter({"checked": 3, "passed": 3})
+
+
+def test_rejections_name_the_rule():
+    cases = [
+        (make_q("dance_move"), "unknown_type"),
+        (make_q("read_choice", stem="  "), "empty_stem"),
+        (make_q("read_choice", stimuli={"text": "你好"}, stem="他要什么?"), "target_word_missing"),
+        (make_q("listen_tf", stimuli={}, stem="菜单在哪里?", options=None, answer=True), "listen_without_stimuli"),
+        (make_q("read_choice", options=[{"id": "A", "text": "菜单"}]), "too_few_options"),
+        (make_q("read_choice", options=[{"id": "A", "text": "菜单"}, {"id": "A", "text": "咖啡"}]), "duplicate_option_ids"),
+        (make_q("read_choice", options=[{"id": "A", "text": "菜单"}, {"id": "B", "text": "菜单 "}]), "duplicate_option_texts"),
+        (make_q("read_choice", answer="C"), "answer_not_in_options"),
+        (make_q("read_tf", options=None, answer="maybe"), "tf_answer_not_bool"),
+        (make_q("translate_e2c", options=None, answer=" "), "missing_answer"),
+    ]
+    for q, rule_name in cases:
+        stats: Counter = Counter()
+        is_valid, reason = validate_question(q, TARGET, stats)
+        assert not is_valid and reason.startswith(f"{rule_name}: "), (rule_name, reason)
+        assert stats[f"rejected.{rule_name}"] == 1 and "passed" not in stats
+
+
+def test_fixes_run_before_checks():
+    stats: Counter = Counter()
+    q = make_q("read_choice", answer=["(b)"])
+    assert validate_question(q, TARGET, stats) == (True, None) and q.answer == "B"
+    q = make_q("read_choice", answer="咖啡") # 答案写成了选项文本
+    assert validate_question(q, TARGET, stats) == (True, None) and q.answer == "B"
+    q = make_q("listen_tf", options=None, answer="正确")
+    assert validate_question(q, TARGET, stats) == (True, None) and q.answer is True
+    q = make_q("read_tf", options=[{"id": "A", "text": "对"}, {"id": "B", "text": "错"}], answer="b")
+    assert validate_question(q, TARGET, stats) == (True, None) and q.answer is False
+    assert stats["fixed.answer_not_in_options"] == 2 and stats["fixed.tf_answer_not_bool"] == 2
+    assert stats["passed"] == 4
+
+
+def main():
+    tests = [test_registry_covers_every_type, test_valid_questions_pass, test_rejections_name_the_rule, test_fixes_run_before_checks]
+    for test in tests:
+        test()
+        print(f"  - {test.__name__}: OK")
+    print(f"--- {len(tests)} question rule tests passed ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# src/checkpointing.py
+"""
+断点续跑支持:
+  - open_checkpointer(): LangGraph 的 SQLite 检查点后端 (离线可用), 串行图每个节点完成后落一次检查点,
+    重启时从最后完成的节点继续。
+  - RunProgress: 同一个 SQLite 文件中的课程/单词级进度表。parallel 模式的课程子图和
+    gen_vocab_questions 用它跳过已完成的课程和单词。
+两者都以运行 id (LangGraph 的 thread_id) 区分不同的运行。
+"""
+import os
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite")
+
+
+def open_checkpointer(path: str = CHECKPOINT_DB_PATH):
+    """返回基于 SQLite 文件的 LangGraph checkpointer (需要 langgraph-checkpoint-sqlite)。"""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError as e:
+        raise ImportError("Checkpointing requires the 'langgraph-checkpoint-sqlite' package.") from e
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(conn)
+
+
+class RunProgressStore:
+    """课程/单词级完成记录 (与 checkpointer 共用同一个 SQLite 文件, 表名不冲突)。"""
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_lesson_progress (
+                thread_id TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                errors TEXT NOT NULL,
+                PRIMARY KEY (thread_id, lesson_id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS run_word_progress (
+                thread_id TEXT NOT NULL,
+                lesson_id TEXT NOT NULL,
+                word_id TEXT NOT NULL,
+                package TEXT NOT NULL,
+                errors TEXT NOT NULL,
+                PRIMARY KEY (thread_id, lesson_id, word_id)
+            )
+        """)
+        self._conn.commit()
+
+    def _get(self, sql: str, params: tuple) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _put(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def get_lesson(self, thread_id: str, lesson_id: str) -> Optional[Tuple[List[Dict], List[str]]]:
+        row = self._get("SELECT outputs, errors FROM run_lesson_progress WHERE thread_id = ? AND lesson_id = ?",
+                        (thread_id, lesson_id))
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def save_lesson(self, thread_id: str, lesson_id: str, outputs: List[Dict], errors: List[str]) -> None:
+        self._put("INSERT OR REPLACE INTO run_lesson_progress VALUES (?, ?, ?, ?)",
+                  (thread_id, lesson_id, json.dumps(outputs, ensure_ascii=False), json.dumps(errors, ensure_ascii=False)))
+
+    def get_word(self, thread_id: str, lesson_id: str, word_id: str) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+        row = self._get("SELECT package, errors FROM run_word_progress WHERE thread_id = ? AND lesson_id = ? AND word_id = ?",
+                        (thread_id, lesson_id, word_id))
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def save_word(self, thread_id: str, lesson_id: str, word_id: str, package: Dict[str, Any], errors: List[str]) -> None:
+        self._put("INSERT OR REPLACE INTO run_word_progress VALUES (?, ?, ?, ?, ?)",
+                  (thread_id, lesson_id, word_id, json.dumps(package, ensure_ascii=False), json.dumps(errors, ensure_ascii=False)))
+
+
+class RunProgress:
+    """绑定到某个运行 id 的进度视图。"""
+
+    def __init__(self, store: RunProgressStore, thread_id: str):
+        self.store = store
+        self.thread_id = thread_id
+
+    def get_lesson(self, lesson_id: str):
+        return self.store.get_lesson(self.thread_id, lesson_id)
+
+    def save_lesson(self, lesson_id: str, outputs: List[Dict], errors: List[str]) -> None:
+        self.store.save_lesson(self.thread_id, lesson_id, outputs, errors)
+
+    def get_word(self, lesson_id: str, word_id: str):
+        return self.store.get_word(self.thread_id, lesson_id, word_id)
+
+    def save_word(self, lesson_id: str, word_id: str, package: Dict[str, Any], errors: List[str]) -> None:
+        self.store.save_word(self.thread_id, lesson_id, word_id, package, errors)
+
+
+_stores: Dict[str, RunProgressStore] = {}
+_stores_lock = threading.Lock()
+
+def get_run_progress(config: Optional[Dict[str, Any]]) -> Optional[RunProgress]:
+    """
+    从节点收到的 RunnableConfig 中取运行 id (configurable.thread_id) 和进度库路径 (configurable.checkpoint_db)。
+    未指定运行 id 时 (不开启断点续跑) 返回 None。
+    """
+    configurable = (config or {}).get("configurable") or {}
+    thread_id = configurable.get("thread_id")
+    if not thread_id:
+        return None
+    path = configurable.get("checkpoint_db") or CHECKPOINT_DB_PATH
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = RunProgressStore(path)
+    return RunProgress(store, str(thread_id))
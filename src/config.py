@@ -1,3 +1,8 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 
 SKILL_TO_EXERCISE_MAP = {
     "listening": [
@@ -38,4 +43,141 @@ ALL_EXERCISE_TYPES = {
     "translate_e2c",
     "speak_follow",
     "write_word"
-}
\ No newline at end of file
+}
+
+
+# =============== 课程执行模式 ===============
+# serial: 逐课循环 (get_next_lesson -> ... -> finalize_lesson)
+# parallel: map 模式, 每个 LessonInput 独立运行子图, 结果按原顺序合并
+LESSON_EXECUTION_MODE = os.getenv("LESSON_EXECUTION_MODE", "serial")
+MAX_PARALLEL_LESSONS = int(os.getenv("MAX_PARALLEL_LESSONS", "4"))
+
+# =============== LLM 并发 ===============
+# 共享工作线程池大小, 同时也是 gen_vocab_questions / quality_check 单次批量调用的默认并发上限
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# =============== LLM 限流 (见 rate_limit.py) ===============
+# 0 表示不限制; 两项都为 0 时 get_rate_limiter() 返回 None。
+# 也可以按每分钟请求数配置 LLM_RATE_LIMIT_RPM (优先于 QPS)
+LLM_RATE_LIMIT_QPS = float(os.getenv("LLM_RATE_LIMIT_RPM", "0")) / 60.0 or float(os.getenv("LLM_RATE_LIMIT_QPS", "0"))
+LLM_RATE_LIMIT_TPM = float(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+# 请求前按 "输入字符数 + 该值" 预估 token, 返回后按实际 usage 多退少补
+LLM_RATE_LIMIT_OUTPUT_ESTIMATE = int(os.getenv("LLM_RATE_LIMIT_OUTPUT_ESTIMATE", "512"))
+
+# =============== 自适应并发 (AIMD) 与退避 (见 rate_limit.py) ===============
+# 并发窗口: 成功时加性增长 (每个窗口的请求成功后 +1), 被限流时乘性减半 (冷却期内只减一次)
+LLM_AIMD_ENABLED = os.getenv("LLM_AIMD_ENABLED", "1").lower() in ("1", "true", "yes")
+LLM_AIMD_MIN_WINDOW = float(os.getenv("LLM_AIMD_MIN_WINDOW", "1"))
+LLM_AIMD_MAX_WINDOW = float(os.getenv("LLM_AIMD_MAX_WINDOW", str(LLM_MAX_CONCURRENCY * 2)))
+LLM_AIMD_DECREASE_COOLDOWN = float(os.getenv("LLM_AIMD_DECREASE_COOLDOWN", "2"))
+# 指数退避: delay = uniform(0, min(MAX, BASE * 2^attempt)) (full jitter); 限流错误至少等待 BASE
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# =============== LLM 响应缓存 (见 llm_cache.py) ===============
+# LLM_CACHE_ENABLED=1 开启; 默认关闭
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) # 0 表示永不过期
+
+# =============== 题库复用 (见 question_bank.py) ===============
+# QUESTION_BANK_ENABLED=1 开启 (需要 DATABASE_URL); 默认关闭
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "0").lower() in ("1", "true", "yes")
+# 只复用不依赖课文上下文的题型
+QUESTION_BANK_TYPES = {t.strip() for t in os.getenv(
+    "QUESTION_BANK_TYPES", "write_word,translate_c2e,translate_e2c,speak_follow").split(",") if t.strip()}
+# 新鲜度: 只复用最近 N 天内生成的课程中的题目; 0 表示不限
+QUESTION_BANK_MAX_AGE_DAYS = float(os.getenv("QUESTION_BANK_MAX_AGE_DAYS", "180"))
+# 多样性: 同一 (词, 级别, 题型) 的候选题少于该数量时不复用, 以免所有课程拿到同一道题
+QUESTION_BANK_MIN_POOL = int(os.getenv("QUESTION_BANK_MIN_POOL", "3"))
+
+# =============== 质检 (LLM Judge) ===============
+# batch: 一次请求评审 QC_JUDGE_BATCH_SIZE 道题, 解析失败时回退到逐题评审; single: 逐题评审
+QC_JUDGE_MODE = os.getenv("QC_JUDGE_MODE", "batch")
+QC_JUDGE_BATCH_SIZE = int(os.getenv("QC_JUDGE_BATCH_SIZE", "10"))
+# 质检后的补题 (repair_questions): 只为被拒绝的 (词, 题型) 空位重新出题, 附上评审给出的原因;
+# 每次请求最多 QC_REPAIR_BATCH_SIZE 个空位, 最多 QC_REPAIR_MAX_ROUNDS 轮 (新题同样要通过质检),
+# 每课最多 QC_REPAIR_MAX_CALLS 次请求; QC_REPAIR_MAX_ROUNDS=0 关闭补题
+QC_REPAIR_MAX_ROUNDS = int(os.getenv("QC_REPAIR_MAX_ROUNDS", "2"))
+QC_REPAIR_BATCH_SIZE = int(os.getenv("QC_REPAIR_BATCH_SIZE", "6"))
+QC_REPAIR_MAX_CALLS = int(os.getenv("QC_REPAIR_MAX_CALLS", "6"))
+
+# =============== 出题 (gen_vocab_questions) ===============
+# batch: 一次请求为 VOCAB_QUESTIONS_BATCH_SIZE 个词出题 (共用一份课文, 节省输入 token 和调用次数),
+#        某个词的部分缺失或解析失败时该词回退到单词出题; single: 每个词单独请求
+VOCAB_QUESTIONS_MODE = os.getenv("VOCAB_QUESTIONS_MODE", "batch")
+VOCAB_QUESTIONS_BATCH_SIZE = int(os.getenv("VOCAB_QUESTIONS_BATCH_SIZE", "4"))
+# 出题上下文: window 只发送包含目标词的句子及前后 VOCAB_CONTEXT_NEIGHBOURS 句 (总长不超过 VOCAB_CONTEXT_MAX_CHARS 字);
+# full 发送整篇课文/对话。需要通篇理解的题型 (VOCAB_FULL_CONTEXT_TYPES, 逗号分隔) 始终使用全文
+VOCAB_CONTEXT_MODE = os.getenv("VOCAB_CONTEXT_MODE", "window")
+VOCAB_CONTEXT_NEIGHBOURS = int(os.getenv("VOCAB_CONTEXT_NEIGHBOURS", "1"))
+VOCAB_CONTEXT_MAX_CHARS = int(os.getenv("VOCAB_CONTEXT_MAX_CHARS", "400"))
+VOCAB_FULL_CONTEXT_TYPES = {t.strip() for t in os.getenv("VOCAB_FULL_CONTEXT_TYPES", "listen_choice").split(",") if t.strip()}
+# 补词 (ensure_vocab_cover): patch 让模型只返回句子级的插入/替换 (附该句的译文), 在本地应用并检查覆盖;
+# 解析或应用失败时回退到 rewrite (输出修改后的全文)
+VOCAB_COVER_MODE = os.getenv("VOCAB_COVER_MODE", "patch")
+# 出题计划 (utils/exercise_planner.py) 的随机种子; 未设置时由 topic 和 lesson_id 推导, 同一课程每次得到同一计划
+EXERCISE_PLAN_SEED = int(os.environ["EXERCISE_PLAN_SEED"]) if os.getenv("EXERCISE_PLAN_SEED") else None
+
+# =============== 拼音 ===============
+# 课文/对话/选项的 pinyin 字段在本地标注 (utils/pinyin_annotator.py, 需要 pypinyin), 提示词不再要求模型输出拼音;
+# 按词缓存的条目数上限
+PINYIN_CACHE_SIZE = int(os.getenv("PINYIN_CACHE_SIZE", "20000"))
+
+# =============== TTS ===============
+# 语音合成工作线程数 (与 LLM 线程池相互独立, 合成不占用 LLM 并发)
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "4"))
+# finalize_lesson 等待一课全部音频的最长时间 (秒, 整课共用一个截止时间); 超时或合成失败的题目不写 audio_url,
+# 只打印警告 (不计入 errors, 以免串行模式因此终止后续课程)
+TTS_RESULT_TIMEOUT = float(os.getenv("TTS_RESULT_TIMEOUT", "30"))
+
+# =============== LLM 超时 / 课程时间预算 / 对冲请求 ===============
+# 按调用类型的单次请求超时 (秒), 可用 LLM_TIMEOUT_<TYPE> 覆盖, 如 LLM_TIMEOUT_JUDGE=20
+LLM_CALL_TIMEOUTS = {
+    call_type: float(os.getenv(f"LLM_TIMEOUT_{call_type.upper()}", default))
+    for call_type, default in {
+        "content": 90,          # generate_content 课文/对话
+        "cover": 60,            # ensure_vocab_cover 补词
+        "vocab_questions": 60,  # gen_vocab_questions 出题
+        "vocab_batch": 150,     # gen_vocab_questions 多词合并出题 (输出约为单词的 K 倍)
+        "judge": 30,            # quality_check 评审 (单题/批量)
+        "repair": 60,           # repair_questions 为被拒绝的空位重新出题
+        "default": 120,
+    }.items()
+}
+# =============== LLM 调用配置 (按调用类型) ===============
+# 每种调用类型 (同上: content / cover / vocab_questions / vocab_batch / judge / repair) 对应一个配置,
+# 可单独指定模型、温度和最大输出 token; 未指定的项使用 .env 中的 MODEL_NAME / TEMP / MAX_TOKENS。
+# 环境变量覆盖: LLM_PROFILE_<TYPE>_MODEL / LLM_PROFILE_<TYPE>_TEMP / LLM_PROFILE_<TYPE>_MAX_TOKENS,
+# 例如把评审和补词交给更快的模型: LLM_PROFILE_JUDGE_MODEL=qwen-turbo LLM_PROFILE_COVER_MODEL=qwen-turbo
+def _profile(call_type: str, model: str | None = None, temperature: float | None = None, max_tokens: int | None = None) -> dict:
+    prefix = f"LLM_PROFILE_{call_type.upper()}_"
+    env_temp, env_max = os.getenv(prefix + "TEMP"), os.getenv(prefix + "MAX_TOKENS")
+    return {
+        "model": os.getenv(prefix + "MODEL") or model,
+        "temperature": float(env_temp) if env_temp else temperature,
+        "max_tokens": int(env_max) if env_max else max_tokens,
+    }
+
+LLM_PROFILES = {
+    "content": _profile("content"),
+    "cover": _profile("cover", temperature=0.3),
+    "vocab_questions": _profile("vocab_questions"),
+    "vocab_batch": _profile("vocab_batch", max_tokens=6000),     # 一次输出 K 个词的题目
+    "judge": _profile("judge", temperature=0.0, max_tokens=1024), # 只输出 is_valid / verdicts 的小 JSON
+    "repair": _profile("repair"),
+    "default": _profile("default"),
+}
+
+# 每课的 LLM 时间预算 (秒, 从 get_next_lesson 开始计时), 超出后该课剩余的 LLM 调用直接返回 API_ERROR; 0 为不限
+LESSON_TIME_BUDGET_SECONDS = float(os.getenv("LESSON_TIME_BUDGET_SECONDS", "0"))
+# 对冲请求: 调用超过该类型的 p95 延迟仍未返回时, 再发一个相同请求, 先返回的成功结果胜出
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")) # 样本不足时不对冲
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2")) # 对冲等待的下限 (秒)
+
+# =============== 流式输出 ===============
+# 出题调用使用 DashScope 增量输出 (stream + incremental_output): 每道题的 JSON 一闭合就解析、校验并提交 TTS,
+# 与模型生成剩余题目的时间重叠。流式调用不做对冲请求。
+LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "0").lower() in ("1", "true", "yes")
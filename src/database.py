@@ -1,12 +1,15 @@
 # src/database.py
 import os
 import uuid # (新增) 导入 uuid 模块
+import threading
 from sqlalchemy import (
     create_engine, Column, Integer, String, Text, ForeignKey, Boolean, Index,
     UniqueConstraint, DateTime,CheckConstraint
 )
 # (新增) 导入 UUID 类型
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy import insert, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 from sqlalchemy.sql import func
 from dotenv import load_dotenv
@@ -22,6 +25,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 SCHEMA_NAME = "Scenario_learning"
+# 批量保存时每个事务写入的课程数; 一个批次失败时该批次逐课重试, 不影响其他批次
+DB_SAVE_CHUNK_SIZE = int(os.getenv("DB_SAVE_CHUNK_SIZE", "10"))
 
 class TopicDB(Base):
     __tablename__ = "topics"
@@ -34,6 +39,9 @@ class TopicDB(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     lessons = relationship("GeneratedLessonDB", back_populates="topic")
     __table_args__ = (
+        # (新增) 批量 upsert 需要唯一约束; 已有库由 ensure_topic_name_unique() 在首次保存前补建
+        # (有重复行时先运行 scripts/migrate_topic_name_unique.py)
+        UniqueConstraint('topic_name', name='uq_topics_topic_name'),
         Index('ix_topics_topic_name', 'topic_name'), # 显式定义索引
         {'schema': SCHEMA_NAME}
     )
@@ -113,115 +121,220 @@ class GeneratedQuestionDB(Base):
         {'schema': SCHEMA_NAME}
     )
 
-# (核心修改) 更新保存逻辑以匹配新的模型/键名
-def save_lesson_output(topic_name: str, lesson_data: dict, topic_hsk_level: int | None = None):
+def _word_hsk_level(vp_data: dict, topic_hsk_level: int | None) -> int:
+    # --- HSK Level 获取逻辑 (不变): 优先取题目 level, 否则用 topic 级别 ---
+    word_hsk_level = topic_hsk_level if topic_hsk_level else 0 # 简化默认值
+    if vp_data.get("questions"):
+         q_levels = [q.get("level") for q in vp_data["questions"] if q.get("level") is not None]
+         if q_levels: word_hsk_level = q_levels[0]
+    return word_hsk_level
+
+class SaveError(Exception):
+    """部分课程未能写入数据库。saved 为已写入的课程数, failed 为 [(lesson_id, 错误信息)]。"""
+    def __init__(self, topic_name: str, saved: int, failed: list[tuple[str, str]]):
+        self.saved = saved
+        self.failed = failed
+        super().__init__(f"{len(failed)} lessons of Topic '{topic_name}' failed to save: "
+                         + "; ".join(f"{lesson_id}: {error}" for lesson_id, error in failed))
+
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+# (新增) create_all 不会给已有的 topics 表加约束: 首次保存前补建唯一索引 (可重复执行, advisory lock
+# 让多个进程同时启动时只有一个在建索引)。已有重复的 topic_name 时建索引失败, 不在这里改动数据,
+# 而是报错并提示先运行 scripts/migrate_topic_name_unique.py 合并重复行。
+def ensure_topic_name_unique() -> None:
+    global _schema_checked
+    if _schema_checked:
+        return
+    with _schema_lock:
+        if _schema_checked:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('uq_topics_topic_name'))"))
+                conn.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_topics_topic_name ON "{SCHEMA_NAME}".topics (topic_name)'))
+        except IntegrityError as e:
+            raise RuntimeError(
+                f'"{SCHEMA_NAME}".topics has duplicate topic_name rows, so uq_topics_topic_name cannot be created. '
+                "Run scripts/migrate_topic_name_unique.py to merge them first."
+            ) from e
+        _schema_checked = True
+
+
+def _upsert_topic(topic_name: str, topic_hsk_level: int | None) -> int:
+    # DO UPDATE 保证冲突时也能 RETURNING 已有 topic_id
     db = SessionLocal()
-    lesson_id_to_save = lesson_data.get("lesson_id") # 这是字符串 '1', '2' 等
-    lesson_name_to_save = lesson_data.get('lesson_name', 'Unknown')
+    try:
+        topic_stmt = pg_insert(TopicDB).values(topic_name=topic_name, input_hsk_level=topic_hsk_level)
+        topic_stmt = topic_stmt.on_conflict_do_update(
+            index_elements=[TopicDB.topic_name],
+            set_={"topic_name": topic_stmt.excluded.topic_name}
+        ).returning(TopicDB.topic_id)
+        topic_id = db.execute(topic_stmt).scalar_one()
+        db.commit()
+        return topic_id
+    finally:
+        db.close()
+
 
+# (核心修改) 集合式批量保存: 一批课程用固定数量的多行 INSERT ... ON CONFLICT ... RETURNING 完成
+# (lessons / vocabulary / vocab_packages / questions 各一条语句), 与课程数和题目数无关; 一批一个事务。
+# 冲突处理使同一 topic/单词/题目的并发保存是安全的: 已存在的课程和题目会被跳过。
+def _save_lessons(topic_id: int, lessons_data: list[dict], topic_hsk_level: int | None) -> tuple[int, int, int]:
+    """在一个事务中写入一批课程, 返回 (新写入的课程数, 词包数, 题目数); 失败时回滚并抛出异常。"""
+    db = SessionLocal()
     try:
-        # 1. 获取或创建 Topic (使用 TopicDB 和 topic_id)
-        topic_db = db.query(TopicDB).filter(TopicDB.topic_name == topic_name).first()
-        if not topic_db:
-            print(f"  - Topic '{topic_name}' not found. Creating new topic entry...")
-            topic_db = TopicDB(topic_name=topic_name, input_hsk_level=topic_hsk_level)
-            db.add(topic_db)
-            db.flush()
-            print(f"  - Created Topic '{topic_name}' with DB ID {topic_db.topic_id}.")
-        # else: 更新逻辑可选
-
-        # 2. 检查 Lesson (使用 GeneratedLessonDB 和 lesson_id_str)
-        existing_lesson = db.query(GeneratedLessonDB).filter(GeneratedLessonDB.lesson_id_str == lesson_id_to_save).first()
-        if existing_lesson:
-            print(f"  - Lesson '{lesson_name_to_save}' (ID: {lesson_id_to_save}) already exists in DB. Skipping save.")
-            db.close()
-            return
+        # 1. 批量插入 Lessons, 已存在的 lesson_id_str 跳过 (与原逻辑一致)
+        lesson_rows = [
+            {
+                "topic_id": topic_id,
+                "lesson_id_str": lesson_data.get("lesson_id"),
+                "lesson_name": lesson_data.get("lesson_name", "Unknown"),
+                "type": lesson_data.get("type"),
+                "passage": lesson_data.get("passage"),
+                "roles": lesson_data.get("roles"),
+                "dialogues": lesson_data.get("dialogues"),
+            }
+            for lesson_data in lessons_data
+        ]
+        inserted = db.execute(
+            pg_insert(GeneratedLessonDB).values(lesson_rows)
+            .on_conflict_do_nothing(index_elements=[GeneratedLessonDB.lesson_id_str])
+            .returning(GeneratedLessonDB.lesson_id_str, GeneratedLessonDB.lesson_db_id)
+        ).all()
+        lesson_db_ids = {lesson_id_str: lesson_db_id for lesson_id_str, lesson_db_id in inserted}
+        for lesson_data in lessons_data:
+            if lesson_data.get("lesson_id") not in lesson_db_ids:
+                print(f"  - Lesson '{lesson_data.get('lesson_name', 'Unknown')}' (ID: {lesson_data.get('lesson_id')}) already exists in DB. Skipping save.")
+        if not lesson_db_ids:
+            db.commit()
+            return 0, 0, 0
 
-        # 3. 创建 LessonDB (使用 GeneratedLessonDB 和 topic_id)
-        lesson_db = GeneratedLessonDB(
-            topic_id=topic_db.topic_id, # 使用 topic_id
-            lesson_id_str=lesson_id_to_save,
-            lesson_name=lesson_name_to_save,
-            type=lesson_data.get("type"),
-            passage=lesson_data.get("passage"),
-            roles=lesson_data.get("roles"),
-            dialogues=lesson_data.get("dialogues")
-        )
-        db.add(lesson_db)
-        db.flush() # 获取 lesson_db_id
-
-        # 4. 处理 VocabPackages 和 Vocabulary
-        vocab_packages_data = lesson_data.get("vocab_packages", [])
-        for vp_data in vocab_packages_data:
-            word_str = vp_data.get("word")
-            # --- HSK Level 获取逻辑 (不变) ---
-            word_hsk_level = topic_hsk_level if topic_hsk_level else 0 # 简化默认值
-            if vp_data.get("questions"):
-                 q_levels = [q.get("level") for q in vp_data["questions"] if q.get("level") is not None]
-                 if q_levels: word_hsk_level = q_levels[0]
-
-            if not word_str: continue
-
-            # 获取或创建 VocabularyDB (使用 word 和 hsk_level 查找)
-            vocabulary_item = db.query(VocabularyDB).filter(
-                VocabularyDB.word == word_str,
-                VocabularyDB.hsk_level == word_hsk_level
-            ).first()
-
-            if not vocabulary_item:
-                print(f"    - Creating new vocabulary entry for '{word_str}' (HSK {word_hsk_level})...")
-                vocabulary_item = VocabularyDB(word=word_str, hsk_level=word_hsk_level)
-                db.add(vocabulary_item)
-                db.flush() # 获取 vocab_uuid
-
-            # 创建 VocabPackageDB (使用 GeneratedVocabPackageDB, lesson_db_id, vocab_uuid)
-            vocab_package_db = GeneratedVocabPackageDB(
-                lesson_db_id=lesson_db.lesson_db_id,
-                vocab_uuid=vocabulary_item.vocab_uuid # 使用 UUID 外键
-                # word_id 字段已移除
-            )
-            db.add(vocab_package_db)
-            db.flush() # 获取 vocab_package_db_id
+        # 2. 收集新课程的 VocabPackages, 批量 Upsert Vocabulary
+        packages = [] # (lesson_db_id, (word, hsk_level), vp_data)
+        for lesson_data in lessons_data:
+            lesson_db_id = lesson_db_ids.get(lesson_data.get("lesson_id"))
+            if lesson_db_id is None:
+                continue
+            for vp_data in lesson_data.get("vocab_packages", []):
+                word_str = vp_data.get("word")
+                if not word_str: continue
+                packages.append((lesson_db_id, (word_str, _word_hsk_level(vp_data, topic_hsk_level)), vp_data))
+
+        vocab_uuids = {}
+        vocab_keys = list(dict.fromkeys(key for _, key, _ in packages)) # 去重且保序 (同一语句内不能两次更新同一行)
+        if vocab_keys:
+            vocab_stmt = pg_insert(VocabularyDB).values([{"word": w, "hsk_level": lvl} for w, lvl in vocab_keys])
+            vocab_stmt = vocab_stmt.on_conflict_do_update(
+                constraint="uq_vocabulary_word_level",
+                set_={"word": vocab_stmt.excluded.word}
+            ).returning(VocabularyDB.word, VocabularyDB.hsk_level, VocabularyDB.vocab_uuid)
+            vocab_uuids = {(w, lvl): vocab_uuid for w, lvl, vocab_uuid in db.execute(vocab_stmt).all()}
 
-            # 处理 Questions (使用 GeneratedQuestionDB, vocab_package_db_id, question_uuid)
-            questions_data = vp_data.get("questions", [])
-            for q_data in questions_data:
+        # 3. 批量插入 VocabPackages; sort_by_parameter_order 保证 RETURNING 顺序与参数顺序一致
+        package_ids = []
+        if packages:
+            package_ids = db.scalars(
+                insert(GeneratedVocabPackageDB).returning(
+                    GeneratedVocabPackageDB.vocab_package_db_id, sort_by_parameter_order=True
+                ),
+                [{"lesson_db_id": lesson_db_id, "vocab_uuid": vocab_uuids[key]} for lesson_db_id, key, _ in packages]
+            ).all()
+
+        # 4. 批量插入 Questions, 已存在的 question_uuid 跳过
+        question_rows = []
+        for package_id, (_, _, vp_data) in zip(package_ids, packages):
+            for q_data in vp_data.get("questions", []):
                  q_uuid_to_save_str = q_data.get("id") # 这是 UUID 字符串
                  if not q_uuid_to_save_str: continue # 跳过没有 ID 的问题数据
-
                  try:
                      q_uuid_to_save = uuid.UUID(q_uuid_to_save_str) # 转换为 UUID 对象
                  except ValueError:
                       print(f"    - WARN: Invalid UUID format for question id: {q_uuid_to_save_str}. Skipping question.")
                       continue
+                 question_rows.append({
+                    "vocab_package_db_id": package_id,
+                    "question_uuid": q_uuid_to_save,
+                    "level": q_data.get("level"),
+                    "type": q_data.get("type"),
+                    "stimuli": q_data.get("stimuli"),
+                    "stem": q_data.get("stem"),
+                    "stem_en": q_data.get("stem_en"),
+                    "options": q_data.get("options"),
+                    "answer": q_data.get("answer")
+                 })
+        if question_rows:
+            db.execute(
+                pg_insert(GeneratedQuestionDB).values(question_rows)
+                .on_conflict_do_nothing(index_elements=[GeneratedQuestionDB.question_uuid])
+            )
 
-                 # 检查问题重复 (使用 GeneratedQuestionDB 和 question_uuid)
-                 existing_question = db.query(GeneratedQuestionDB).filter(GeneratedQuestionDB.question_uuid == q_uuid_to_save).first()
-                 if existing_question:
-                     print(f"    - Question (UUID: {q_uuid_to_save_str}) already exists. Skipping.")
-                     continue
-
-                 # 创建 QuestionDB (使用 GeneratedQuestionDB, vocab_package_db_id, question_uuid)
-                 question_db = GeneratedQuestionDB(
-                    vocab_package_db_id=vocab_package_db.vocab_package_db_id,
-                    question_uuid=q_uuid_to_save, # 存储 UUID 对象
-                    level=q_data.get("level"),
-                    type=q_data.get("type"),
-                    stimuli=q_data.get("stimuli"),
-                    stem=q_data.get("stem"),
-                    stem_en=q_data.get("stem_en"),
-                    options=q_data.get("options"),
-                    answer=q_data.get("answer")
-                 )
-                 db.add(question_db)
-
-        db.commit() # 提交整个事务
-        print(f"  - Successfully saved Lesson '{lesson_db.lesson_name}' (ID: {lesson_db.lesson_id_str}) under Topic '{topic_name}' to DB.")
-
-    except Exception as e:
-        db.rollback() # 回滚事务
-        print(f"  - ERROR saving Lesson '{lesson_name_to_save}' to DB: {e}")
-        import traceback
-        traceback.print_exc()
+        db.commit()
+        return len(lesson_db_ids), len(packages), len(question_rows)
+    except Exception:
+        db.rollback() # 回滚本批次
+        raise
     finally:
         db.close() # 关闭会话
+
+
+def save_topic_outputs(topic_name: str, lessons_data: list[dict], topic_hsk_level: int | None = None) -> int:
+    """
+    保存一个 topic 下的多个课程, 返回实际新写入的课程数。
+    每 DB_SAVE_CHUNK_SIZE 课一个事务; 批次失败时逐课重试, 仍失败的课程汇总后抛出 SaveError (其余课程已提交)。
+    """
+    if not lessons_data:
+        return 0
+    ensure_topic_name_unique()
+    topic_id = _upsert_topic(topic_name, topic_hsk_level)
+
+    chunk_size = max(1, DB_SAVE_CHUNK_SIZE)
+    saved, package_count, question_count = 0, 0, 0
+    failed: list[tuple[str, str]] = []
+    for start in range(0, len(lessons_data), chunk_size):
+        chunk = lessons_data[start:start + chunk_size]
+        try:
+            counts = [_save_lessons(topic_id, chunk, topic_hsk_level)]
+        except Exception as e:
+            if len(chunk) == 1:
+                failed.append((chunk[0].get("lesson_id"), str(e)))
+                print(f"  - ERROR saving lesson '{chunk[0].get('lesson_name', 'Unknown')}' of Topic '{topic_name}': {e}")
+                continue
+            print(f"  - WARNING: Saving {len(chunk)} lessons of Topic '{topic_name}' in one batch failed ({e}). Retrying one by one.")
+            counts = []
+            for lesson_data in chunk:
+                try:
+                    counts.append(_save_lessons(topic_id, [lesson_data], topic_hsk_level))
+                except Exception as lesson_error:
+                    failed.append((lesson_data.get("lesson_id"), str(lesson_error)))
+                    print(f"  - ERROR saving lesson '{lesson_data.get('lesson_name', 'Unknown')}' of Topic '{topic_name}': {lesson_error}")
+        for lessons, packages, questions in counts:
+            saved += lessons
+            package_count += packages
+            question_count += questions
+
+    print(f"  - Successfully saved {saved} lessons ({package_count} vocab packages, {question_count} questions) under Topic '{topic_name}' to DB.")
+    if failed:
+        raise SaveError(topic_name, saved, failed)
+    return saved
+
+def save_lesson_output(topic_name: str, lesson_data: dict, topic_hsk_level: int | None = None) -> int:
+    return save_topic_outputs(topic_name, [lesson_data], topic_hsk_level)
+
+
+# (新增) 音频引用计数: {audio_url: 引用该音频的题目数}, 供音频库垃圾回收使用
+def audio_reference_counts() -> dict:
+    db = SessionLocal()
+    try:
+        audio_url = GeneratedQuestionDB.stimuli["audio_url"].astext
+        rows = (
+            db.query(audio_url, func.count(GeneratedQuestionDB.question_db_id))
+            .filter(audio_url.isnot(None))
+            .group_by(audio_url)
+            .all()
+        )
+        return {url: count for url, count in rows}
+    finally:
+        db.close()
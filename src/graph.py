@@ -1,17 +1,25 @@
 # src/graph.py
+import time
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
 # (修复) 导入 Dict, Any 用于类型提示
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from models import AgentState, Stage2Input, LessonInput
+from config import LESSON_EXECUTION_MODE, MAX_PARALLEL_LESSONS, LISTENING_EXERCISE_TYPES, TTS_RESULT_TIMEOUT
+from tools.tts import get_tts_queue, audio_text_for, tts_group_for
+from question_bank import get_question_bank
+from checkpointing import get_run_progress
+from llm_deadline import new_lesson_deadline, with_lesson_deadline
 from nodes.generate_content import generate_content
 from nodes.gen_vocab_questions import gen_vocab_questions
 from nodes.ensure_vocab_cover import ensure_vocab_cover
 from nodes.quality_check import check_questions
+from nodes.repair_questions import repair_questions
 
 # (修复) 返回 dict, 正确处理错误
 def node_load_and_prepare(state: AgentState) -> Dict[str, Any]:
     print("---NODE: load_and_prepare ---")
-    errors = list(state.errors) # 操作副本
     try:
         stage2_data = Stage2Input.model_validate(state.stage2_input)
         lesson_queue = list(stage2_data.lessons) # Pydantic 对象列表
@@ -19,48 +27,141 @@ def node_load_and_prepare(state: AgentState) -> Dict[str, Any]:
         return {
             "stage2_input": stage2_data, # 返回 Pydantic 对象
             "lesson_queue": lesson_queue, # 返回 Pydantic 对象列表
-            "errors": errors # 返回当前错误列表
+            "next_lesson_index": 0
         }
     except Exception as e:
         import traceback
         print(f"ERROR in load_and_prepare: {e}\n{traceback.format_exc()}")
-        errors.append(f"Input validation failed: {e}")
-        return {"errors": errors} # 仅返回错误字典
+        return {"errors": [f"Input validation failed: {e}"]} # errors 为追加式字段, 只返回新增错误
 
-# (修复) 返回包含修改后队列和当前课程的 dict
+# (修改) 只前移 next_lesson_index, 不再复制并 pop 整个 lesson_queue
 def node_get_next_lesson(state: AgentState) -> Dict[str, Any]:
     print("---NODE: get_next_lesson ---")
-    queue = list(state.lesson_queue) # 创建副本
-    errors = list(state.errors)
-    if not queue:
-        errors.append("Lesson queue empty unexpectedly.")
+    if not state.remaining_lessons:
         print("  - ERROR: Lesson queue empty unexpectedly.")
-        return {"errors": errors}
+        return {"errors": ["Lesson queue empty unexpectedly."]}
 
-    current_lesson = queue.pop(0) # 从副本中弹出
+    current_lesson = state.lesson_queue[state.next_lesson_index]
     print(f"  - Processing lesson: '{current_lesson.lesson_name}'")
     return {
         "current_lesson": current_lesson, # 返回 Pydantic 对象
-        "lesson_queue": queue # 返回修改后的 Pydantic 对象列表
+        "next_lesson_index": state.next_lesson_index + 1,
+        "lesson_deadline": new_lesson_deadline() # 课程时间预算从这里开始计时
     }
 
-# (修复) 返回包含更新后 outputs 和已清理字段的 dict
+# (新增) 从 TTS 队列取回本课听力/跟读题的音频地址 (缺失的任务会补交合成), 并丢弃被质检淘汰题目的任务;
+# 整课最多等待 TTS_RESULT_TIMEOUT 秒, 超时或合成失败的题目不写 audio_url, 只打印警告 (课程照常输出)
+def attach_audio_urls(lesson_dict: Dict[str, Any], tts_group: str) -> None:
+    tts_queue = get_tts_queue()
+    deadline = time.monotonic() + TTS_RESULT_TIMEOUT
+    missing = 0
+    for vocab_pkg in lesson_dict.get("vocab_packages") or []:
+        for q in vocab_pkg.get("questions") or []:
+            stimuli = q.get("stimuli") or {}
+            if q.get("type") not in LISTENING_EXERCISE_TYPES or stimuli.get("audio_url"):
+                continue
+            text = audio_text_for(q.get("type"), stimuli.get("text"), q.get("stem"))
+            if not text:
+                continue
+            try:
+                stimuli["audio_url"] = tts_queue.result(q["id"], text, timeout=max(0.0, deadline - time.monotonic()))
+                q["stimuli"] = stimuli
+            except Exception as e:
+                missing += 1
+                reason = f"not ready within the {TTS_RESULT_TIMEOUT}s lesson deadline" if isinstance(e, FutureTimeoutError) else f"failed ({type(e).__name__}: {e})"
+                print(f"  - WARNING: TTS for question {q['id']} ({q.get('type')}) {reason}. audio_url left unset.")
+    if missing:
+        print(f"  - WARNING: {missing} questions in lesson {lesson_dict.get('lesson_id')} have no audio_url.")
+    dropped = tts_queue.release_group(tts_group)
+    if dropped:
+        print(f"  - Dropped {dropped} TTS jobs for questions removed by quality_check.")
+
+# (新增) 课程结束 (或失败) 时丢弃题库中该课尚未质检的复用题 id
+def release_reused_questions(topic: str, lesson_id: str) -> None:
+    bank = get_question_bank()
+    if bank is None:
+        return
+    leftover = bank.release_lesson(topic, lesson_id)
+    if leftover:
+        print(f"  - Released {leftover} reused question ids that never reached quality_check.")
+
+# (修改) outputs 为追加式字段: 只返回本课这一条, 不再复制已完成的全部课程
 def node_finalize_lesson(state: AgentState) -> Dict[str, Any]:
     print("---NODE: finalize_lesson ---")
-    outputs = list(state.outputs) # 创建副本
+    outputs = []
     lesson_name = state.current_lesson.lesson_name if state.current_lesson else "UNKNOWN"
 
     if state.current_output_lesson:
-        outputs.append(state.current_output_lesson.model_dump()) # 将 dict 添加到列表
+        lesson_dict = state.current_output_lesson.model_dump()
+        attach_audio_urls(lesson_dict, tts_group_for(state.stage2_input.topic, lesson_dict.get("lesson_id")))
+        outputs.append(lesson_dict)
         print(f"  - Lesson '{state.current_output_lesson.lesson_name}' added to final outputs.")
     else:
         print(f"  - WARNING: No output lesson found for '{lesson_name}'.")
+    if state.current_lesson:
+        release_reused_questions(state.stage2_input.topic, str(state.current_lesson.lesson_id))
 
     return {
-        "outputs": outputs, # 返回修改后的 dict 列表
+        "outputs": outputs, # 本步新增的课程 (0 或 1 条)
         "current_lesson": None,
         "current_output_lesson": None,
-        "current_content_text": ""
+        "current_content_text": "",
+        "current_exercise_plan": None,
+        "current_rejected_slots": [],
+        "lesson_deadline": None
+    }
+
+# (新增) map 模式: 每课独立运行 generate -> cover -> questions -> check -> repair 子图, 按原顺序合并结果
+def node_run_lessons_parallel(state: AgentState, config: Optional[RunnableConfig] = None, max_parallel: int = MAX_PARALLEL_LESSONS) -> Dict[str, Any]:
+    print("---NODE: run_lessons_parallel ---")
+    outputs: list = []
+    errors: list = []
+    lessons = state.lesson_queue[state.next_lesson_index:]
+    if not lessons:
+        print("  - ERROR: Lesson queue empty unexpectedly.")
+        return {"errors": ["Lesson queue empty unexpectedly."]}
+
+    workers = max(1, min(max_parallel, len(lessons)))
+    print(f"  - Running {len(lessons)} lessons with max parallelism {workers}.")
+    lesson_app = build_lesson_graph()
+
+    progress = get_run_progress(config)
+
+    def run_one(lesson: LessonInput) -> Dict[str, Any]:
+        # 断点续跑: 本运行中已完成的课程直接复用结果
+        if progress is not None:
+            finished = progress.get_lesson(str(lesson.lesson_id))
+            if finished is not None:
+                print(f"  - Lesson '{lesson.lesson_name}' already finished in this run. Skipping.")
+                return {"outputs": finished[0], "errors": finished[1]}
+        try:
+            # 传入父图 config, 子图的 finalize_lesson 更新会出现在父图的 stream(subgraphs=True) 中
+            result = lesson_app.invoke(
+                {"stage2_input": state.stage2_input, "current_lesson": lesson, "lesson_deadline": new_lesson_deadline()},
+                {**(config or {}), "recursion_limit": LESSON_RECURSION_LIMIT}
+            )
+            if progress is not None and result.get("outputs"):
+                progress.save_lesson(str(lesson.lesson_id), result.get("outputs") or [], result.get("errors") or [])
+            return result
+        except Exception as e:
+            import traceback
+            print(f"ERROR in lesson '{lesson.lesson_name}': {e}\n{traceback.format_exc()}")
+            release_reused_questions(state.stage2_input.topic, str(lesson.lesson_id))
+            return {"errors": [f"Lesson execution failed: {e}"]}
+
+    # executor.map 保证结果顺序与 lesson_queue 一致
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_one, lessons))
+
+    for lesson, result in zip(lessons, results):
+        outputs.extend(result.get("outputs") or [])
+        errors.extend(f"[lesson {lesson.lesson_id}] {err}" for err in result.get("errors") or [])
+
+    print(f"  - {len(outputs)} lessons merged into outputs.")
+    return {
+        "outputs": outputs,
+        "errors": errors,
+        "next_lesson_index": len(state.lesson_queue)
     }
 
 # (无需更改) 路由函数是正确的
@@ -69,22 +170,87 @@ def router_should_continue(state: AgentState) -> str:
     if state.errors:
         print("  - Errors detected. Ending graph execution.")
         return "end"
-    if state.lesson_queue:
-        print(f"  - {len(state.lesson_queue)} lessons remaining. Continuing loop.")
+    if state.remaining_lessons:
+        print(f"  - {state.remaining_lessons} lessons remaining. Continuing loop.")
         return "get_next_lesson"
     else:
         print("  - Lesson queue is empty. Ending graph execution.")
         return "end"
 
-def build_graph():
+# 串行模式下每课经过的节点数: get_next_lesson, generate_content, ensure_vocab_cover,
+# gen_vocab_questions, quality_check, repair_questions, finalize_lesson
+STEPS_PER_LESSON = 7
+LESSON_RECURSION_LIMIT = STEPS_PER_LESSON + 5
+
+def recursion_limit_for(num_lessons: int) -> int:
+    """根据课程数量计算 invoke 所需的 recursion_limit (固定的 100 在约 16 课时会溢出)。"""
+    return max(25, num_lessons * STEPS_PER_LESSON + 10)
+
+def build_lesson_graph():
+    """单课子图: generate_content -> ensure_vocab_cover -> gen_vocab_questions -> quality_check -> repair_questions -> finalize_lesson"""
+    graph = StateGraph(AgentState)
+
+    # 调用 LLM 的节点在当前课程的时间预算下运行 (见 llm_deadline.py)
+    graph.add_node("generate_content", with_lesson_deadline(generate_content))
+    graph.add_node("ensure_vocab_cover", with_lesson_deadline(ensure_vocab_cover))
+    graph.add_node("gen_vocab_questions", with_lesson_deadline(gen_vocab_questions))
+    graph.add_node("quality_check", with_lesson_deadline(check_questions))
+    graph.add_node("repair_questions", with_lesson_deadline(repair_questions))
+    graph.add_node("finalize_lesson", node_finalize_lesson)
+
+    graph.set_entry_point("generate_content")
+    graph.add_edge("generate_content", "ensure_vocab_cover")
+    graph.add_edge("ensure_vocab_cover", "gen_vocab_questions")
+    graph.add_edge("gen_vocab_questions", "quality_check")
+    graph.add_edge("quality_check", "repair_questions")
+    graph.add_edge("repair_questions", "finalize_lesson")
+    graph.add_edge("finalize_lesson", END)
+
+    # checkpointer=False: 不继承父图的检查点 (多个课程子图在同一节点内并发运行, 命名空间会冲突),
+    # 课程/单词级的续跑由 checkpointing.RunProgress 负责
+    return graph.compile(checkpointer=False)
+
+def build_parallel_graph(max_parallel: int = MAX_PARALLEL_LESSONS, checkpointer=None):
+    graph = StateGraph(AgentState)
+
+    graph.add_node("load_and_prepare", node_load_and_prepare)
+    graph.add_node(
+        "run_lessons_parallel",
+        lambda s, config: node_run_lessons_parallel(s, config, max_parallel=max_parallel)
+    )
+
+    graph.set_entry_point("load_and_prepare")
+    graph.add_conditional_edges(
+        "load_and_prepare",
+        lambda s: "end" if s.errors else "run_lessons_parallel",
+        {"run_lessons_parallel": "run_lessons_parallel", "end": END}
+    )
+    graph.add_edge("run_lessons_parallel", END)
+
+    return graph.compile(checkpointer=checkpointer)
+
+def build_graph(mode: Optional[str] = None, max_parallel: Optional[int] = None, checkpointer=None):
+    """
+    mode: "serial" (默认, 逐课循环) 或 "parallel" (map 模式, 最多 max_parallel 课同时运行)。
+    未指定时读取 config.LESSON_EXECUTION_MODE / MAX_PARALLEL_LESSONS。
+    checkpointer: 可选的 LangGraph checkpointer (见 checkpointing.open_checkpointer), 配合 thread_id 实现断点续跑。
+    """
+    mode = mode or LESSON_EXECUTION_MODE
+    if mode == "parallel":
+        return build_parallel_graph(max_parallel or MAX_PARALLEL_LESSONS, checkpointer=checkpointer)
+    if mode != "serial":
+        raise ValueError(f"Unknown lesson execution mode: {mode}")
+
     graph = StateGraph(AgentState)
 
     graph.add_node("load_and_prepare", node_load_and_prepare)
     graph.add_node("get_next_lesson", node_get_next_lesson)
-    graph.add_node("generate_content", generate_content)
-    graph.add_node("ensure_vocab_cover", ensure_vocab_cover)
-    graph.add_node("gen_vocab_questions", gen_vocab_questions)
-    graph.add_node("quality_check", check_questions)
+    # 调用 LLM 的节点在当前课程的时间预算下运行 (见 llm_deadline.py)
+    graph.add_node("generate_content", with_lesson_deadline(generate_content))
+    graph.add_node("ensure_vocab_cover", with_lesson_deadline(ensure_vocab_cover))
+    graph.add_node("gen_vocab_questions", with_lesson_deadline(gen_vocab_questions))
+    graph.add_node("quality_check", with_lesson_deadline(check_questions))
+    graph.add_node("repair_questions", with_lesson_deadline(repair_questions))
     graph.add_node("finalize_lesson", node_finalize_lesson)
 
     graph.set_entry_point("load_and_prepare")
@@ -101,7 +267,8 @@ def build_graph():
     graph.add_edge("generate_content", "ensure_vocab_cover")
     graph.add_edge("ensure_vocab_cover", "gen_vocab_questions")
     graph.add_edge("gen_vocab_questions", "quality_check")
-    graph.add_edge("quality_check", "finalize_lesson")
+    graph.add_edge("quality_check", "repair_questions")
+    graph.add_edge("repair_questions", "finalize_lesson")
 
     # (无需更改) 循环条件边是正确的
     graph.add_conditional_edges(
@@ -110,5 +277,5 @@ def build_graph():
         {"get_next_lesson": "get_next_lesson", "end": END}
     )
 
-    app = graph.compile()
+    app = graph.compile(checkpointer=checkpointer)
     return app
\ No newline at end of file
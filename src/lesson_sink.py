@@ -0,0 +1,67 @@
+# src/lesson_sink.py
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from database import save_lesson_output
+
+
+class WriteBehindLessonSink:
+    """
+    流式运行模式的后台写入器: finalize_lesson 产出一课就提交一课, 由后台线程写入数据库并追加到 JSONL 文件。
+    - 背压: 待写队列满 (max_pending) 时 submit() 阻塞, 图执行随之放慢, 内存中积压的课程数有上限。
+    - flush(): 屏障, 等待已提交的课程全部落盘。
+    """
+
+    _STOP = object()
+
+    def __init__(self, topic_name: str, topic_hsk_level: Optional[int], jsonl_path: Path,
+                 max_pending: int = 4, save_to_db: bool = True):
+        self.topic_name = topic_name
+        self.topic_hsk_level = topic_hsk_level
+        self.jsonl_path = jsonl_path
+        self.save_to_db = save_to_db
+        self.written = 0
+        self.errors: List[str] = []
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._file = open(jsonl_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._worker, name="lesson-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, lesson_dict: Dict[str, Any]) -> None:
+        self._queue.put(lesson_dict) # 队列满时阻塞 (背压)
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                self._write(item)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, lesson_dict: Dict[str, Any]) -> None:
+        lesson_name = lesson_dict.get("lesson_name", "Unknown Lesson")
+        try:
+            # 先写文件 (便宜且可恢复), 再写数据库
+            self._file.write(json.dumps(lesson_dict, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.save_to_db:
+                save_lesson_output(self.topic_name, lesson_dict, self.topic_hsk_level)
+            self.written += 1
+            print(f"  - [writer] Lesson '{lesson_name}' persisted ({self.written} so far).")
+        except Exception as e:
+            print(f"  - [writer] ERROR persisting lesson '{lesson_name}': {e}")
+            self.errors.append(f"Failed to persist lesson '{lesson_name}': {e}")
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        self.flush()
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._file.close()
@@ -1,21 +1,97 @@
 # src/app/llm_client.py
 
 import os
+import math
+import time
+import asyncio
+import weakref
+import threading
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Callable
 from http import HTTPStatus
+from concurrent.futures import wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 import dashscope
+try:
+    import aiohttp
+except ImportError: # 可选依赖, 只有 AsyncLLMClient / allm() 需要; 同步调用路径不受影响
+    aiohttp = None
+from llm_cache import get_llm_cache
+from rate_limit import get_rate_limiter, get_concurrency_limiter, estimate_tokens, usage_tokens, usage_prompt_tokens, backoff_delay
+from config import LLM_CALL_TIMEOUTS, LLM_STREAMING_ENABLED, LLM_PROFILES
+from llm_deadline import call_timeout, remaining_budget, get_latency_tracker, get_call_executor
 
 load_dotenv()
 
+# 异步客户端连接池大小与单次请求超时 (秒)
+LLM_ASYNC_MAX_CONNECTIONS = int(os.getenv("LLM_ASYNC_MAX_CONNECTIONS", "100"))
+LLM_ASYNC_TIMEOUT = float(os.getenv("LLM_ASYNC_TIMEOUT", "120"))
+# 限流 / 瞬时错误的最大重试次数 (永久错误不重试), 退避参数见 rate_limit.py
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
 
-def llm(prompt: str, system: str | None = None) -> str:
+
+class LLMCallError(Exception):
     """
-    调用通义千问（DashScope）大模型生成回复的统一函数。
-    从 .env 中读取：
+    单次 DashScope 调用失败。kind:
+      - throttle: 429 / Throttling.* (限流、配额), 退避后重试并收缩并发窗口
+      - transient: 超时、5xx、网络错误、空返回, 退避后重试
+      - permanent: 参数错误、鉴权失败、欠费、内容审核等, 重试无意义
+    """
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+# 这些错误码即使不是 4xx 也不值得重试
+PERMANENT_ERROR_CODES = {"InvalidApiKey", "InvalidParameter", "Arrearage", "DataInspectionFailed", "AccessDenied", "ModelNotFound"}
+TRANSIENT_ERROR_CODES = {"InternalError", "ServiceUnavailable", "RequestTimeOut", "SystemError"}
+
+def classify_error(status_code: int | None, code: str | None) -> str:
+    code = code or ""
+    if status_code == HTTPStatus.TOO_MANY_REQUESTS or code.startswith("Throttling"):
+        return "throttle"
+    if code.split(".")[0] in PERMANENT_ERROR_CODES:
+        return "permanent"
+    if code.split(".")[0] in TRANSIENT_ERROR_CODES or status_code is None or status_code >= 500 or status_code == HTTPStatus.REQUEST_TIMEOUT:
+        return "transient"
+    return "permanent"
+
+def classify_exception(e: Exception) -> str:
+    """网络层异常 (连接、超时) 视为瞬时错误, 其余 (编程错误等) 视为永久错误。"""
+    if isinstance(e, (ConnectionError, TimeoutError, asyncio.TimeoutError, OSError)):
+        return "transient"
+    if aiohttp is not None and isinstance(e, aiohttp.ClientError):
+        return "transient"
+    module = type(e).__module__ or ""
+    if module.startswith(("requests", "urllib3", "http.client")):
+        return "transient"
+    return "permanent"
+
+
+@dataclass(frozen=True)
+class LLMSettings:
+    api_key: str
+    model: str
+    temperature: float
+    max_tokens: int
+    http_base_url: str
+
+
+@lru_cache(maxsize=None)
+def get_llm_settings(profile: str = "default") -> LLMSettings:
+    """
+    从 .env 中读取一次 LLM 配置并缓存 (每个 profile 进程内只读一次)：
       - DASHSCOPE_API_KEY
       - MODEL_NAME (如 qwen-plus 或 qwen2.5-7b-instruct)
       - TEMP, MAX_TOKENS（可选）
+      - DASHSCOPE_HTTP_BASE_URL（可选, 异步客户端使用）
+    profile 为调用类型, config.LLM_PROFILES 中该类型指定的 model / temperature / max_tokens 覆盖上面的默认值。
     """
+    if profile != "default":
+        overrides = {k: v for k, v in (LLM_PROFILES.get(profile) or {}).items() if v is not None}
+        return replace(get_llm_settings(), **overrides)
 
     api_key = os.getenv("DASHSCOPE_API_KEY")
     if not api_key:
@@ -25,25 +101,279 @@ def llm(prompt: str, system: str | None = None) -> str:
     if not model:
         raise ValueError("❌ 缺少 MODEL_NAME，请在 .env 文件中指定，例如 MODEL_NAME=qwen-plus")
 
-    temperature = float(os.getenv("TEMP", "0.5"))
-    max_tokens = int(os.getenv("MAX_TOKENS", "2048"))
-
     dashscope.api_key = api_key
+    return LLMSettings(
+        api_key=api_key,
+        model=model,
+        temperature=float(os.getenv("TEMP", "0.5")),
+        max_tokens=int(os.getenv("MAX_TOKENS", "2048")),
+        http_base_url=os.getenv("DASHSCOPE_HTTP_BASE_URL", "https://dashscope.aliyuncs.com/api/v1").rstrip("/"),
+    )
 
-    # =============== 构建消息 ===============
+
+def build_messages(prompt: str, system: str | None = None) -> list[dict]:
     messages = []
     if system:
         messages.append({"role": "system", "content": system})
     messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def llm(prompt: str, system: str | None = None, call_type: str = "default",
+        on_delta: Callable[[str | None], None] | None = None, use_cache: bool = True) -> str:
+    """
+    调用通义千问（DashScope）大模型生成回复的统一函数。
+    配置见 get_llm_settings()。失败时返回以 "API_ERROR" 开头的字符串。
+    开启 LLM_CACHE_ENABLED 时先查本地响应缓存 (见 llm_cache.py); use_cache=False 时跳过查询 (用于解析失败后的重试),
+    新结果仍会写入并覆盖旧条目。调用方确认输出无法解析时用 discard_cached_response() 删除缓存。
+    配置了 LLM_RATE_LIMIT_QPS / LLM_RATE_LIMIT_TPM 时, 缓存未命中的请求先经过全局限流器 (见 rate_limit.py)。
+    限流和瞬时错误在这里按指数退避 + 抖动重试 (最多 LLM_MAX_RETRIES 次), 同时调整 AIMD 并发窗口;
+    调用方拿到 API_ERROR 时说明重试已用尽或是永久错误, 不应再立即重试。
+    call_type 决定单次超时 (config.LLM_CALL_TIMEOUTS) 和对冲阈值的统计口径; 课程时间预算用完时直接返回 API_ERROR。
+    on_delta: 增量回调。开启 LLM_STREAMING_ENABLED 时按 DashScope 流式返回的片段逐段调用 (在请求线程中),
+    每次 (重试) 请求开始前先以 None 调用一次, 表示丢弃之前收到的片段; 未开启流式或命中缓存时以完整文本调用一次。
+    无论是否流式, 返回值都是完整文本。
+    """
+    settings = get_llm_settings(call_type) # 按调用类型选择模型 / 温度 / 最大输出 (config.LLM_PROFILES)
+
+    cache = get_llm_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(settings.model, system, prompt, settings.temperature, settings.max_tokens)
+        cached = cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+    stream_to = on_delta if LLM_STREAMING_ENABLED else None
+    result = _generate_with_retries(settings, build_messages(prompt, system), call_type, stream_to)
+    if on_delta is not None and stream_to is None and not result.startswith("API_ERROR"):
+        on_delta(result)
+    if cache is not None:
+        cache.put(cache_key, result) # API_ERROR 结果不会被写入
+    return result
+
+
+# (新增) 缓存只排除 API_ERROR, 截断或格式错误的输出也会被写入; 调用方解析失败时删除, 避免重试和之后的运行重放同一结果
+def discard_cached_response(prompt: str, system: str | None = None, call_type: str = "default") -> None:
+    """删除 llm(prompt, system, call_type) 对应的缓存条目; 未开启缓存时不做任何事。"""
+    cache = get_llm_cache()
+    if cache is not None:
+        settings = get_llm_settings(call_type)
+        cache.discard(cache.make_key(settings.model, system, prompt, settings.temperature, settings.max_tokens))
+
+
+def record_prompt_usage(call_type: str, usage) -> None:
+    """累计输入 token 和命中服务端前缀缓存的 token (静态说明放在 system 消息中, 见 prompts.py), 用于核对缓存命中率。"""
+    input_tokens, cached = usage_prompt_tokens(usage)
+    if input_tokens:
+        tracker = get_latency_tracker()
+        tracker.incr(call_type, "input_tokens", input_tokens)
+        tracker.incr(call_type, "cached_tokens", cached)
+
+
+def _generate_with_retries(settings: LLMSettings, messages: list[dict], call_type: str = "default",
+                          on_delta: Callable[[str | None], None] | None = None) -> str:
+    limiter = get_rate_limiter()
+    window = get_concurrency_limiter()
+    tracker = get_latency_tracker()
+    error: LLMCallError | None = None
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        timeout = call_timeout(call_type)
+        if timeout <= 0:
+            tracker.incr(call_type, "budget_exhausted")
+            error = LLMCallError("permanent", f"lesson time budget exhausted ({call_type})")
+            break
+        estimated = estimate_tokens(messages) if limiter is not None else 0
+        if limiter is not None:
+            limiter.acquire(estimated)
+        if window is not None:
+            window.acquire()
+        outcome = "success"
+        try:
+            if on_delta is not None:
+                content, usage = _generate_streamed(settings, messages, call_type, timeout, on_delta)
+            else:
+                content, usage = _generate_hedged(settings, messages, call_type, timeout, limiter, estimated, window)
+            if limiter is not None:
+                limiter.settle(estimated, usage_tokens(usage))
+            record_prompt_usage(call_type, usage)
+            return content
+        except LLMCallError as e:
+            error, outcome = e, e.kind
+            if limiter is not None:
+                limiter.settle(estimated, 0) # 失败的请求不计 token
+        finally:
+            if window is not None:
+                window.release(outcome)
+
+        if error.kind == "permanent" or attempt == LLM_MAX_RETRIES:
+            break
+        delay = backoff_delay(attempt, error.kind)
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= delay:
+            break # 等不到下一次重试, 课程预算就用完了
+        print(f"    - LLM {error.kind} error ({error}). Retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s.")
+        time.sleep(delay)
+
+    return f"API_ERROR: {error}"
+
+
+def _reserve_hedge(limiter, window, estimated: int) -> bool:
+    """为对冲请求占用一个并发窗口名额并预扣 token, 任一不足时不对冲 (不等待)。"""
+    if window is not None and not window.try_acquire():
+        return False
+    if limiter is not None and limiter.try_acquire(estimated) > 0:
+        if window is not None:
+            window.release("cancelled")
+        return False
+    return True
+
+
+def _hedge_call(settings: LLMSettings, messages: list[dict], timeout: float, limiter, window, estimated: int) -> tuple[str, dict | None]:
+    # 对冲请求自带限流额度和并发窗口名额, 请求结束 (包括被放弃后在后台结束) 时按实际 usage 结算并归还
+    outcome, usage = "success", None
+    try:
+        content, usage = _dashscope_generate(settings, messages, timeout)
+        return content, usage
+    except LLMCallError as e:
+        outcome = e.kind
+        raise
+    finally:
+        if limiter is not None:
+            limiter.settle(estimated, usage_tokens(usage) if usage is not None else 0)
+        if window is not None:
+            window.release(outcome)
+
+
+def _generate_hedged(settings: LLMSettings, messages: list[dict], call_type: str, timeout: float,
+                     limiter, estimated: int, window) -> tuple[str, dict | None]:
+    """
+    一次 (可能对冲的) 调用, 最多等待 timeout 秒 (超时抛出 transient 错误, 由外层退避重试)。
+    开启对冲且延迟样本足够时, 主请求超过该类型 p95 仍未返回就再发一个相同请求 (需要并发窗口和限流器都还有额度,
+    不等待), 先返回的成功结果胜出。被放弃的请求在后台自行结束 (受 request_timeout 约束), 结果丢弃。
+    """
+    tracker = get_latency_tracker()
+    hedge_after = tracker.hedge_delay(call_type)
+    started_at = time.monotonic()
+
+    executor = get_call_executor()
+    primary = executor.submit(_dashscope_generate, settings, messages, timeout)
+    pending = {primary}
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done and _reserve_hedge(limiter, window, estimated):
+            tracker.incr(call_type, "hedged")
+            pending.add(executor.submit(_hedge_call, settings, messages, timeout - hedge_after, limiter, window, estimated))
+
+    last_error: LLMCallError | None = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, timeout - (time.monotonic() - started_at)), return_when=FIRST_COMPLETED)
+        if not done:
+            tracker.incr(call_type, "timeouts")
+            raise LLMCallError("transient", f"{call_type} call timed out after {timeout:.0f}s")
+        for future in done:
+            try:
+                result = future.result()
+            except LLMCallError as e:
+                last_error = e
+                continue
+            tracker.record(call_type, time.monotonic() - started_at)
+            if future is not primary:
+                tracker.incr(call_type, "hedge_wins")
+            return result
+    raise last_error
+
 
+def _generate_streamed(settings: LLMSettings, messages: list[dict], call_type: str, timeout: float,
+                       on_delta: Callable[[str | None], None]) -> tuple[str, dict | None]:
+    """
+    一次流式调用, 最多等待 timeout 秒 (与 _generate_hedged 相同的超时语义, 但不对冲:
+    两路流会交错回调 on_delta)。超时后通知请求线程停止读取, 之后不会再有回调。
+    """
+    tracker = get_latency_tracker()
+    started_at = time.monotonic()
+    cancelled = threading.Event()
+    callback_lock = threading.Lock()
+
+    def guarded_delta(delta: str | None) -> None:
+        # 取消后 (包括正在回调时超时) 不再把片段交给调用方, 避免与重试请求的片段交错
+        with callback_lock:
+            if not cancelled.is_set():
+                on_delta(delta)
+
+    future = get_call_executor().submit(_dashscope_stream, settings, messages, timeout, guarded_delta, cancelled)
+    done, _ = wait({future}, timeout=timeout)
+    if not done:
+        with callback_lock:
+            cancelled.set()
+        tracker.incr(call_type, "timeouts")
+        raise LLMCallError("transient", f"{call_type} call timed out after {timeout:.0f}s")
+    result = future.result() # 失败时抛出 LLMCallError
+    tracker.record(call_type, time.monotonic() - started_at)
+    tracker.incr(call_type, "streamed")
+    return result
+
+
+def _dashscope_stream(settings: LLMSettings, messages: list[dict], timeout: float | None,
+                      on_delta: Callable[[str | None], None], cancelled: threading.Event) -> tuple[str, dict | None]:
+    """单次流式调用 (incremental_output: 每个响应只含新增片段)。成功返回 (完整文本, usage), 失败抛出已分类的 LLMCallError。"""
+    try:
+        on_delta(None)
+        responses = dashscope.Generation.call(
+            model=settings.model,
+            messages=messages,
+            result_format="message",
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            request_timeout=max(1, math.ceil(timeout or LLM_CALL_TIMEOUTS["default"])),
+            stream=True,
+            incremental_output=True,
+        )
+        parts: list[str] = []
+        usage = None
+        for response in responses:
+            if cancelled.is_set():
+                raise LLMCallError("transient", "stream cancelled after timeout")
+            if response.status_code != HTTPStatus.OK:
+                code = getattr(response, "code", None) or response.get("code", "")
+                message = getattr(response, "message", None) or response.get("message", "")
+                raise LLMCallError(classify_error(response.status_code, code), f"DashScope {code} - {message}")
+            output = getattr(response, "output", None) or response.get("output", {})
+            choices = getattr(output, "choices", None) or output.get("choices", [])
+            usage = getattr(response, "usage", None) or usage # 最后一个响应带累计 usage
+            if not choices:
+                continue
+            msg = getattr(choices[0], "message", None) or choices[0].get("message", {})
+            delta = getattr(msg, "content", None) or msg.get("content", "")
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+
+        content = "".join(parts).strip()
+        if not content:
+            raise LLMCallError("transient", "empty stream")
+        return content, usage
+
+    except LLMCallError:
+        raise
+    except Exception as e:
+        raise LLMCallError(classify_exception(e), str(e)) from e
+
+
+def _dashscope_generate(settings: LLMSettings, messages: list[dict], timeout: float | None = None) -> tuple[str, dict | None]:
+    """单次调用。成功返回 (文本, usage), 失败抛出已分类的 LLMCallError。"""
     # =============== 调用模型 ===============
     try:
         response = dashscope.Generation.call(
-            model=model,
+            model=settings.model,
             messages=messages,
             result_format="message",   # 保证输出格式兼容 OpenAI
-            temperature=temperature,
-            max_tokens=max_tokens,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            request_timeout=max(1, math.ceil(timeout or LLM_CALL_TIMEOUTS["default"])),
         )
 
         # =============== 解析返回 ===============
@@ -51,17 +381,183 @@ def llm(prompt: str, system: str | None = None) -> str:
             # 兼容两种返回结构（对象或字典）
             output = getattr(response, "output", None) or response.get("output", {})
             choices = getattr(output, "choices", None) or output.get("choices", [])
+            usage = getattr(response, "usage", None)
             if not choices:
-                return "API_ERROR: empty choices"
+                raise LLMCallError("transient", "empty choices")
 
             msg = getattr(choices[0], "message", None) or choices[0].get("message", {})
             content = getattr(msg, "content", None) or msg.get("content", "")
-            return content.strip()
+            return content.strip(), usage
 
         else:
             code = getattr(response, "code", None) or response.get("code", "")
             message = getattr(response, "message", None) or response.get("message", "")
-            return f"API_ERROR: DashScope {code} - {message}"
+            raise LLMCallError(classify_error(response.status_code, code), f"DashScope {code} - {message}")
 
+    except LLMCallError:
+        raise
     except Exception as e:
-        return f"API_ERROR: {e}"
+        raise LLMCallError(classify_exception(e), str(e)) from e
+
+
+class AsyncLLMClient:
+    """
+    异步 DashScope 客户端。配置在构造时固定, 底层复用一个 aiohttp.ClientSession
+    (keep-alive 连接池), 同一事件循环上可以 await 大量并发调用。
+    返回约定与 llm() 相同: 成功返回文本, 失败返回 "API_ERROR: ..." 字符串。
+
+        async with AsyncLLMClient() as client:
+            results = await asyncio.gather(*(client.chat(p) for p in prompts))
+    """
+
+    GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+    def __init__(
+        self,
+        settings: LLMSettings | None = None,
+        max_connections: int = LLM_ASYNC_MAX_CONNECTIONS,
+        timeout_seconds: float = LLM_ASYNC_TIMEOUT,
+        keepalive_seconds: float = 60.0,
+    ):
+        if aiohttp is None:
+            raise ImportError("AsyncLLMClient requires aiohttp (pip install aiohttp)")
+        # 未指定 settings 时按每次调用的 call_type 选择配置 (config.LLM_PROFILES)
+        self._fixed_settings = settings
+        self.settings = settings or get_llm_settings()
+        self._url = self.settings.http_base_url + self.GENERATION_PATH
+        self._headers = {
+            "Authorization": f"Bearer {self.settings.api_key}",
+            "Content-Type": "application/json",
+        }
+        self._max_connections = max_connections
+        self._timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self._keepalive_seconds = keepalive_seconds
+        self._session: "aiohttp.ClientSession | None" = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # 会话绑定到首次使用时的事件循环, 之后所有请求复用同一连接池
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_connections,
+                keepalive_timeout=self._keepalive_seconds,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self._headers,
+                timeout=self._timeout,
+            )
+        return self._session
+
+    async def chat(self, prompt: str, system: str | None = None, call_type: str = "default", use_cache: bool = True) -> str:
+        settings = self._fixed_settings or get_llm_settings(call_type)
+        cache = get_llm_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(settings.model, system, prompt, settings.temperature, settings.max_tokens)
+            cached = cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                return cached
+
+        result = await self._post_with_retries(build_messages(prompt, system), call_type, settings)
+        if cache is not None:
+            cache.put(cache_key, result)
+        return result
+
+    async def _post_with_retries(self, messages: list[dict], call_type: str = "default", settings: LLMSettings | None = None) -> str:
+        """
+        与 llm() 相同的错误分类、退避重试、单次超时和课程时间预算
+        (并发由连接池上限控制, 不使用线程版的 AIMD 窗口, 也不做对冲)。
+        """
+        limiter = get_rate_limiter()
+        tracker = get_latency_tracker()
+        error: LLMCallError | None = None
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            timeout = min(call_timeout(call_type), self._timeout.total or LLM_ASYNC_TIMEOUT)
+            if timeout <= 0:
+                tracker.incr(call_type, "budget_exhausted")
+                error = LLMCallError("permanent", f"lesson time budget exhausted ({call_type})")
+                break
+            estimated = estimate_tokens(messages) if limiter is not None else 0
+            if limiter is not None:
+                await limiter.acquire_async(estimated)
+            started_at = time.monotonic()
+            try:
+                content, usage = await self._post(messages, timeout, settings)
+                tracker.record(call_type, time.monotonic() - started_at)
+                if limiter is not None:
+                    limiter.settle(estimated, usage_tokens(usage))
+                record_prompt_usage(call_type, usage)
+                return content
+            except LLMCallError as e:
+                error = e
+                if limiter is not None:
+                    limiter.settle(estimated, 0)
+            if error.kind == "permanent" or attempt == LLM_MAX_RETRIES:
+                break
+            delay = backoff_delay(attempt, error.kind)
+            remaining = remaining_budget()
+            if remaining is not None and remaining <= delay:
+                break
+            await asyncio.sleep(delay)
+        return f"API_ERROR: {error}"
+
+    async def _post(self, messages: list[dict], timeout: float | None = None, settings: LLMSettings | None = None) -> tuple[str, dict | None]:
+        """单次请求。成功返回 (文本, usage), 失败抛出已分类的 LLMCallError。"""
+        settings = settings or self.settings
+        payload = {
+            "model": settings.model,
+            "input": {"messages": messages},
+            "parameters": {
+                "result_format": "message",
+                "temperature": settings.temperature,
+                "max_tokens": settings.max_tokens,
+            },
+        }
+        try:
+            request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+            async with self._get_session().post(self._url, json=payload, timeout=request_timeout) as resp:
+                data = await resp.json(content_type=None)
+                if resp.status != HTTPStatus.OK:
+                    code = data.get("code") or ""
+                    raise LLMCallError(classify_error(resp.status, code), f"DashScope {code or resp.status} - {data.get('message', '')}")
+
+            usage = data.get("usage")
+            choices = (data.get("output") or {}).get("choices") or []
+            if not choices:
+                raise LLMCallError("transient", "empty choices")
+            content = (choices[0].get("message") or {}).get("content") or ""
+            return content.strip(), usage
+
+        except LLMCallError:
+            raise
+        except Exception as e:
+            raise LLMCallError(classify_exception(e), str(e)) from e
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncLLMClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+# 每个事件循环一个默认客户端 (aiohttp 会话不能跨事件循环共享)
+_default_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncLLMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncLLMClient:
+    loop = asyncio.get_running_loop()
+    client = _default_async_clients.get(loop)
+    if client is None:
+        client = AsyncLLMClient()
+        _default_async_clients[loop] = client
+    return client
+
+
+async def allm(prompt: str, system: str | None = None, call_type: str = "default", use_cache: bool = True) -> str:
+    """llm() 的异步版本, 使用当前事件循环的默认 AsyncLLMClient (共享连接池)。"""
+    return await get_async_client().chat(prompt, system, call_type, use_cache)
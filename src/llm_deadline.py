@@ -0,0 +1,145 @@
+# src/llm_deadline.py
+"""
+LLM 调用的时间控制:
+  - call_timeout(): 按调用类型的单次超时, 不超过当前课程剩余的时间预算
+  - lesson_deadline / with_lesson_deadline: 把 AgentState.lesson_deadline 放入 contextvars,
+    节点内 (以及 map_ordered 的工作线程中) 的 llm() 调用都能看到
+  - LatencyTracker: 按调用类型统计成功调用的延迟, 对冲请求以 p95 作为触发阈值
+  - get_call_executor(): 实际发出请求的线程池, 调用方按超时等待其结果
+"""
+import time
+import functools
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Any
+
+from config import (
+    LLM_CALL_TIMEOUTS, LESSON_TIME_BUDGET_SECONDS, LLM_MAX_CONCURRENCY,
+    LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MIN_DELAY
+)
+
+PROCESS_STARTED_AT = time.time()
+
+_lesson_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("lesson_deadline", default=None)
+
+
+def new_lesson_deadline() -> Optional[float]:
+    """新课程开始时的截止时间 (epoch 秒); 未配置 LESSON_TIME_BUDGET_SECONDS 时为 None。"""
+    return time.time() + LESSON_TIME_BUDGET_SECONDS if LESSON_TIME_BUDGET_SECONDS > 0 else None
+
+
+@contextlib.contextmanager
+def lesson_deadline(deadline: Optional[float]):
+    # 截止时间早于本进程启动 (从检查点恢复的课程): 预算从本进程启动时重新计算
+    if deadline is not None and deadline - LESSON_TIME_BUDGET_SECONDS < PROCESS_STARTED_AT:
+        deadline = PROCESS_STARTED_AT + LESSON_TIME_BUDGET_SECONDS
+    token = _lesson_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _lesson_deadline.reset(token)
+
+
+def with_lesson_deadline(node):
+    """节点包装: 在 state.lesson_deadline 下运行节点 (保留原签名, LangGraph 仍会注入 config)。"""
+    @functools.wraps(node)
+    def wrapper(state, *args, **kwargs):
+        with lesson_deadline(getattr(state, "lesson_deadline", None)):
+            return node(state, *args, **kwargs)
+    return wrapper
+
+
+def remaining_budget() -> Optional[float]:
+    deadline = _lesson_deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def call_timeout(call_type: str) -> float:
+    """该类型调用的超时秒数, 不超过课程剩余预算 (可能 <= 0, 表示预算已用完)。"""
+    timeout = LLM_CALL_TIMEOUTS.get(call_type, LLM_CALL_TIMEOUTS["default"])
+    remaining = remaining_budget()
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+class LatencyTracker:
+    """按调用类型记录最近的成功调用延迟, 以及超时 / 对冲 / 预算耗尽次数和输入 token / 前缀缓存命中 token 数。"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._window = window
+
+    def _count(self, call_type: str, key: str, amount: int = 1) -> None:
+        counters = self._counters.setdefault(call_type, {})
+        counters[key] = counters.get(key, 0) + amount
+
+    def record(self, call_type: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(call_type, deque(maxlen=self._window)).append(seconds)
+            self._count(call_type, "calls")
+
+    def incr(self, call_type: str, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._count(call_type, key, amount)
+
+    def percentile(self, call_type: str, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(call_type) or [])
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    def hedge_delay(self, call_type: str) -> Optional[float]:
+        """对冲触发时间 = max(p95, LLM_HEDGE_MIN_DELAY); 未开启或样本不足时返回 None。"""
+        if not LLM_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            enough = len(self._samples.get(call_type) or []) >= LLM_HEDGE_MIN_SAMPLES
+        if not enough:
+            return None
+        return max(LLM_HEDGE_MIN_DELAY, self.percentile(call_type, 0.95))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            call_types = sorted(set(self._samples) | set(self._counters))
+            counters = {k: dict(v) for k, v in self._counters.items()}
+        result = {}
+        for call_type in call_types:
+            entry = counters.get(call_type, {})
+            for name, p in (("p50_s", 0.5), ("p95_s", 0.95), ("p99_s", 0.99)):
+                value = self.percentile(call_type, p)
+                if value is not None:
+                    entry[name] = round(value, 3)
+            if entry.get("input_tokens"):
+                entry["prompt_cache_hit_rate"] = round(entry.get("cached_tokens", 0) / entry["input_tokens"], 3)
+            result[call_type] = entry
+        return result
+
+
+_latency_tracker: Optional[LatencyTracker] = None
+_call_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+def get_latency_tracker() -> LatencyTracker:
+    global _latency_tracker
+    if _latency_tracker is None:
+        with _lock:
+            if _latency_tracker is None:
+                _latency_tracker = LatencyTracker()
+    return _latency_tracker
+
+def get_call_executor() -> ThreadPoolExecutor:
+    """
+    实际发出 DashScope 请求的线程池 (与 llm-worker 池分开, 避免在池内等待池内任务)。
+    调用方在这里的 Future 上按超时等待, 超时和对冲因此不依赖 SDK 自身的超时语义。
+    """
+    global _call_executor
+    if _call_executor is None:
+        with _lock:
+            if _call_executor is None:
+                _call_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY * 4, thread_name_prefix="llm-call")
+    return _call_executor
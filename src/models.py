@@ -1,7 +1,8 @@
 
 import uuid
-from typing import List, Dict, Any, Optional, Union
-from pydantic import BaseModel, Field
+import operator
+from typing import List, Dict, Any, Optional, Union, Annotated
+from pydantic import BaseModel, Field, SkipValidation
 
 
 
@@ -91,11 +92,25 @@ class LessonOutput(BaseModel):
 class AgentState(BaseModel):
     stage2_input: Stage2Input
     
-    lesson_queue: List[LessonInput] = Field(default_factory=list)
+    # (修改) lesson_queue 装载后不再变化, 由 next_lesson_index 指向下一课 (不再每课复制并 pop 整个队列)。
+    # 以下随课程数增长的字段只由节点写入 (load_and_prepare 已校验过), LangGraph 每步构造 AgentState 时跳过重新校验
+    lesson_queue: SkipValidation[List[LessonInput]] = Field(default_factory=list)
+    next_lesson_index: int = 0
     current_lesson: Optional[LessonInput] = None
+    # (新增) 当前课程的 LLM 时间预算截止时间 (epoch 秒), 见 llm_deadline.py; None 表示不限
+    lesson_deadline: Optional[float] = None
     
     current_output_lesson: Optional[LessonOutput] = None
     current_content_text: str = "" 
+    # (新增) 当前课程的出题计划 (utils/exercise_planner.py 的 ExercisePlan.to_dict()), 由 gen_vocab_questions 写入
+    current_exercise_plan: Optional[Dict[str, Any]] = None
+    # (新增) quality_check 拒绝的题目空位 ({word_id, word, type, reason, rejected}), 由 repair_questions 重新出题
+    current_rejected_slots: SkipValidation[List[Dict[str, Any]]] = Field(default_factory=list)
     
-    outputs: List[Dict] = Field(default_factory=list) 
-    errors: List[str] = Field(default_factory=list)
\ No newline at end of file
+    # (修改) 追加式 reducer: 节点只返回本步新增的课程/错误, 由 LangGraph 追加到已有列表
+    outputs: Annotated[SkipValidation[List[Dict]], operator.add] = Field(default_factory=list) 
+    errors: Annotated[SkipValidation[List[str]], operator.add] = Field(default_factory=list)
+
+    @property
+    def remaining_lessons(self) -> int:
+        return max(0, len(self.lesson_queue) - self.next_lesson_index)
\ No newline at end of file
@@ -1,16 +1,160 @@
 # src/nodes/ensure_vocab_cover.py
+import json
+from collections import defaultdict
 # (修复) 导入 Dict, Any
-from typing import Dict, Any
-from src.llm_client import llm
-from src.prompts import FIX_APPEND_PROMPT
+from typing import Dict, Any, List, Optional, Literal, Callable
+from pydantic import BaseModel, ValidationError
+from src.llm_client import llm, discard_cached_response
+from src.prompts import FIX_APPEND_PROMPT, FIX_APPEND_SYSTEM, FIX_PATCH_PROMPT, FIX_PATCH_SYSTEM
 # (需要导入 LessonInput 以便在 state 中访问)
-from models import AgentState, LessonInput
-from src.utils.text_utils import clean_word
+from models import AgentState, LessonInput, LessonOutput, PassageOutput, DialogueLine
+from src.utils.text_utils import clean_word, split_sentences, LATIN_SENTENCE_PATTERN
+from utils.pinyin_annotator import to_pinyin
+from config import VOCAB_COVER_MODE
+
+# (新增) 补丁模式: 模型返回的单条句子级修改
+class SentenceEdit(BaseModel):
+    op: Literal["insert", "replace"]
+    index: int
+    text: str
+    textEn: Optional[str] = None
+    roleId: Optional[int] = None
+
+class PatchResult(BaseModel):
+    edits: List[SentenceEdit]
+
+
+def apply_edits(units: List[Any], edits: List[SentenceEdit], make: Callable[[SentenceEdit, Any], Any]) -> List[Any] | None:
+    """
+    把句子级修改应用到 units (句子或对话行) 上, index 均指原文编号; make(edit, 被替换的单元或 None) 生成新单元。
+    index 越界或同一句被替换两次时返回 None。
+    """
+    replaced: Dict[int, Any] = {}
+    inserted: Dict[int, List[Any]] = defaultdict(list)
+    for edit in edits:
+        if edit.op == "replace":
+            if not 0 <= edit.index < len(units) or edit.index in replaced:
+                return None
+            replaced[edit.index] = make(edit, units[edit.index])
+        else:
+            if not 0 <= edit.index <= len(units):
+                return None
+            inserted[edit.index].append(make(edit, None))
+    result = []
+    for i in range(len(units) + 1):
+        result.extend(inserted.get(i, []))
+        if i < len(units):
+            result.append(replaced.get(i, units[i]))
+    return result
+
+
+def _keep_gap(new: str, old: Optional[str]) -> str:
+    # 替换句沿用原句后的空白/换行
+    return new.strip() + (old[len(old.rstrip()):] if old is not None else "")
+
+
+def aligned_sentences(text: Optional[str], count: int) -> List[str] | None:
+    """译文按句切分; 句数与中文原文一致时才能逐句修改, 否则返回 None。"""
+    segments = split_sentences(text or "", LATIN_SENTENCE_PATTERN)
+    return segments if len(segments) == count else None
+
+
+def patch_passage(passage: PassageOutput, edits: List[SentenceEdit], lesson_words: List[str]) -> PassageOutput | None:
+    sentences = split_sentences(passage.text)
+    en = aligned_sentences(passage.textEn, len(sentences))
+    units = [(zh, en[i] if en else None) for i, zh in enumerate(sentences)]
+    patched = apply_edits(units, edits, lambda e, old: (
+        _keep_gap(e.text, old[0] if old else None),
+        (e.textEn or "").strip() or (old[1] if old else ""), # 模型没有给出新译文时保留原句的
+    ))
+    if patched is None:
+        return None
+    text = "".join(u[0] for u in patched)
+    update: Dict[str, Any] = {
+        "text": text,
+        # 原有的 covered_words 中仍在文中的保留, 再加上新覆盖的词
+        "covered_words": list(dict.fromkeys(
+            [w for w in passage.covered_words if clean_word(w) in text] + [w for w in lesson_words if w in text]))
+    }
+    # 译文只替换被修改的句子; 与原文句数对不上时无法定位, 保持原样
+    if en is not None:
+        update["textEn"] = " ".join(u[1].strip() for u in patched if u[1] and u[1].strip())
+    elif passage.textEn:
+        print("  - WARNING: passage.textEn is not sentence-aligned with the text; left unchanged.")
+    # 拼音在本地按新全文重新标注 (已标注过的词走缓存)
+    pinyin = to_pinyin(text)
+    if pinyin is not None:
+        update["pinyin"] = pinyin
+    return passage.model_copy(update=update)
+
+
+def patch_dialogues(dialogues: List[DialogueLine], edits: List[SentenceEdit], lesson_words: List[str]) -> List[DialogueLine] | None:
+    default_role = dialogues[0].roleId if dialogues else 1
+    patched = apply_edits(dialogues, edits, lambda e, old: DialogueLine(
+        dialogueId=0,
+        roleId=e.roleId or (old.roleId if old else default_role),
+        text=e.text.strip(),
+        textEn=e.textEn,
+        pinyin=to_pinyin(e.text),
+        covered_words=[w for w in lesson_words if w in e.text]
+    ))
+    if patched is None:
+        return None
+    # 重新编号 dialogueId
+    return [line.model_copy(update={"dialogueId": i + 1}) for i, line in enumerate(patched)]
+
+
+# (新增) 补丁模式: 模型只返回句子级修改, 本地应用到课文/对话 (同时更新被修改句的译文、拼音和 covered_words);
+# 返回 (更新后的 LessonOutput, 新的上下文文本), 无法解析或应用时返回 None (调用方回退到全文改写)
+def cover_by_patch(output_lesson: LessonOutput, missing_words: List[str], lesson_words: List[str],
+                   hsk_level: int) -> tuple[LessonOutput, str] | None:
+    if output_lesson.dialogues:
+        units = [f"(roleId {line.roleId}) {line.text}" for line in output_lesson.dialogues]
+    elif output_lesson.passage:
+        units = [s.strip() for s in split_sentences(output_lesson.passage.text)]
+    else:
+        return None
+    prompt = FIX_PATCH_PROMPT.format(
+        hsk_level=hsk_level,
+        count=len(units),
+        numbered_text="\n".join(f"[{i}] {unit}" for i, unit in enumerate(units)),
+        missing_vocab_list="、".join(missing_words)
+    )
+    llm_output = llm(prompt, system=FIX_PATCH_SYSTEM, call_type="cover")
+    if "API_ERROR" in llm_output:
+        print(f"  - WARNING: Patch call failed: {llm_output}")
+        return None
+    try:
+        cleaned_output = llm_output.strip()
+        if cleaned_output.startswith("```json"):
+            cleaned_output = cleaned_output[7:-3].strip()
+        edits = PatchResult.model_validate_json(cleaned_output).edits
+    except (json.JSONDecodeError, ValidationError) as e:
+        print(f"  - WARNING: Failed to parse patch edits. Error: {e}")
+        discard_cached_response(prompt, FIX_PATCH_SYSTEM, "cover")
+        return None
+    if not edits:
+        print("  - WARNING: Patch returned no edits.")
+        return None
+
+    if output_lesson.dialogues:
+        dialogues = patch_dialogues(output_lesson.dialogues, edits, lesson_words)
+        if dialogues is None:
+            print(f"  - WARNING: Patch edits out of range: {[(e.op, e.index) for e in edits]}")
+            return None
+        context_text = "\n".join([line.text for line in dialogues if line.text])
+        return output_lesson.model_copy(update={"dialogues": dialogues}), context_text
+    passage = patch_passage(output_lesson.passage, edits, lesson_words)
+    if passage is None:
+        print(f"  - WARNING: Patch edits out of range: {[(e.op, e.index) for e in edits]}")
+        return None
+    return output_lesson.model_copy(update={"passage": passage}), passage.text
+
 
 # (修复) 返回 dict, 正确处理错误
 def ensure_vocab_cover(state: AgentState) -> Dict[str, Any]:
     print("---NODE: ensure_vocab_cover ---")
-    errors = list(state.errors) # 操作副本
+    errors: List[str] = [] # 本步新增的错误 (errors 为追加式字段)
     # state.current_lesson 现在是 LessonInput 对象
     current_lesson: LessonInput = state.current_lesson
     text_content = state.current_content_text
@@ -28,35 +172,47 @@ def ensure_vocab_cover(state: AgentState) -> Dict[str, Any]:
 
     if not missing_words_obj:
         print("  - All vocabulary covered. No action needed.")
-        return {"errors": errors} # 如果无需更改，则返回当前错误列表
+        return {} # 无需更改
 
     cleaned_missing_words = [clean_word(v.word) for v in missing_words_obj]
     print(f"  - Missing {len(cleaned_missing_words)} words: {', '.join(cleaned_missing_words)}")
 
-    missing_vocab_list_str = "、".join(cleaned_missing_words)
-    prompt = FIX_APPEND_PROMPT.format(text=text_content, missing_vocab_list=missing_vocab_list_str)
-
     try:
-        fixed_text = llm(prompt)
-        if "API_ERROR" in fixed_text: # 对 LLM 错误的基本检查
-             raise Exception(f"LLM call failed: {fixed_text}")
+        update: Dict[str, Any] = {}
+        if VOCAB_COVER_MODE == "patch" and state.current_output_lesson:
+            patched = cover_by_patch(state.current_output_lesson, cleaned_missing_words,
+                                     [clean_word(v.word) for v in current_lesson.related_vocabulary],
+                                     state.stage2_input.hsk_level)
+            if patched is not None:
+                update = {"current_output_lesson": patched[0], "current_content_text": patched[1]}
+            else:
+                print("  - Patch repair unavailable. Falling back to full rewrite.")
+
+        if not update:
+            missing_vocab_list_str = "、".join(cleaned_missing_words)
+            prompt = FIX_APPEND_PROMPT.format(text=text_content, missing_vocab_list=missing_vocab_list_str)
+            fixed_text = llm(prompt, system=FIX_APPEND_SYSTEM, call_type="cover")
+            if "API_ERROR" in fixed_text: # 对 LLM 错误的基本检查
+                 raise Exception(f"LLM call failed: {fixed_text}")
+            update = {"current_content_text": fixed_text} # str
 
         # 最终检查
-        final_missing = [word for word in cleaned_missing_words if word not in fixed_text]
+        final_missing = [word for word in cleaned_missing_words if word not in update["current_content_text"]]
         if final_missing:
             warning_msg = f"ensure_vocab_cover: Failed to fix missing words: {', '.join(final_missing)}"
             print(f"  - WARNING: {warning_msg}")
             errors.append(warning_msg) # 将警告添加为错误
         else:
-            print("  - Repair successful. Context text for downstream nodes is updated.")
+            print(f"  - Repair successful ({'patch' if 'current_output_lesson' in update else 'rewrite'}). "
+                  f"Context text for downstream nodes is updated.")
 
         # (修复) 返回包含更新后文本和错误的 dict
         return {
-            "current_content_text": fixed_text, # str
+            **update,
             "errors": errors # List[str]
         }
     except Exception as e:
         import traceback
         print(f"ERROR in ensure_vocab_cover LLM call: {e}\n{traceback.format_exc()}")
         errors.append(f"ensure_vocab_cover: LLM call failed. Error: {e}")
-        return {"errors": errors} # 仅返回错误字典
\ No newline at end of file
+        return {"errors": errors} # 仅返回错误字典
@@ -1,22 +1,53 @@
 # src/nodes/gen_vocab_questions.py
 import json
 import uuid
-import random
+import hashlib
 from collections import Counter
 # (修复) 导入 Dict, Any
-from typing import Dict, Any
-from llm_client import llm
-from prompts import VOCAB_QUESTIONS_PROMPT, JSON_ONLY_SUFFIX
+from typing import Dict, Any, List, Tuple
+from llm_client import llm, discard_cached_response
+from prompts import VOCAB_QUESTIONS_PROMPT, VOCAB_QUESTIONS_SYSTEM, VOCAB_QUESTIONS_BATCH_PROMPT, VOCAB_QUESTIONS_BATCH_SYSTEM
 # (需要导入 LessonInput 和 LessonOutput 以便在 state 中访问)
 from models import (
     AgentState, VocabPackage, LessonOutput, Question,
-    OptionItem, Stimuli, LessonInput
+    OptionItem, Stimuli, LessonInput, VocabItem
 )
 from pydantic import ValidationError
+from langchain_core.runnables import RunnableConfig
 import re
-from utils.text_utils import clean_word
-from config import LISTENING_EXERCISE_TYPES, SKILL_TO_EXERCISE_MAP
-from tools.tts import generate_audio_placeholder
+from utils.text_utils import clean_word, select_context
+from utils.concurrency import map_ordered
+from utils.json_stream import JsonArrayStream
+from utils.exercise_planner import plan_lesson, trim_to_plan
+from utils.pinyin_annotator import to_pinyin
+from config import (
+    LISTENING_EXERCISE_TYPES, LLM_MAX_CONCURRENCY,
+    VOCAB_QUESTIONS_MODE, VOCAB_QUESTIONS_BATCH_SIZE,
+    VOCAB_CONTEXT_MODE, VOCAB_CONTEXT_NEIGHBOURS, VOCAB_CONTEXT_MAX_CHARS, VOCAB_FULL_CONTEXT_TYPES
+)
+from tools.tts import get_tts_queue, audio_text_for, tts_group_for
+from checkpointing import get_run_progress
+from question_bank import get_question_bank
+
+# (新增) 单道题的构建, 供完整解析和流式解析共用; 校验失败时抛出 ValidationError / TypeError
+def build_question(item: Dict[str, Any], hsk_level: int) -> Question:
+    # (V6/V7) 使用 Pydantic V6/V7 模型自动验证
+    return Question(
+        level=hsk_level,
+        type=item.get("type", "UNKNOWN"),
+        stimuli=Stimuli.model_validate(item.get("stimuli", {})),
+        stem=item.get("stem"),
+        stem_en=item.get("stem_en"),
+        options=[annotate_option(OptionItem.model_validate(opt)) for opt in item.get("options")] if item.get("options") else None,
+        answer=item.get("answer")
+    )
+
+
+# (新增) 选项拼音在本地标注 (提示词不再要求模型输出拼音); 不含汉字的选项保持原值
+def annotate_option(option: OptionItem) -> OptionItem:
+    option.pinyin = to_pinyin(option.text) or option.pinyin
+    return option
+
 
 # (无需更改) V6/V7 解析器
 def parse_llm_json_output(llm_output: str, hsk_level: int) -> list[Question]:
@@ -32,20 +63,7 @@ def parse_llm_json_output(llm_output: str, hsk_level: int) -> list[Question]:
         data = json.loads(cleaned_output)
         questions_data = data.get("questions", [])
 
-        parsed_questions = []
-        for item in questions_data:
-            # (V6/V7) 使用 Pydantic V6/V7 模型自动验证
-            q = Question(
-                level=hsk_level,
-                type=item.get("type", "UNKNOWN"),
-                stimuli=Stimuli.model_validate(item.get("stimuli", {})),
-                stem=item.get("stem"),
-                stem_en=item.get("stem_en"),
-                options=[OptionItem.model_validate(opt) for opt in item.get("options")] if item.get("options") else None,
-                answer=item.get("answer")
-            )
-            parsed_questions.append(q)
-
+        parsed_questions = [build_question(item, hsk_level) for item in questions_data]
         return parsed_questions
     except (json.JSONDecodeError, ValidationError, TypeError, IndexError) as e:
         print(f"  - ERROR: Failed to parse or validate V6 JSON. Error: {e}")
@@ -57,15 +75,207 @@ def parse_llm_json_output(llm_output: str, hsk_level: int) -> list[Question]:
         return []
 
 
+def format_exercise_requests(exercise_counts: Counter) -> str:
+    return "\n".join(f"- 生成 {count} 道 `{ex_type}` 类型的题目" for ex_type, count in exercise_counts.items() if count > 0)
+
+
+# (新增) 出题上下文: 只取目标词附近的句子; 计划中有需要通篇理解的题型 (如 listen_choice) 时使用全文
+def context_for(context_text: str, words: List[str], exercise_counts: Counter) -> str:
+    if VOCAB_CONTEXT_MODE != "window" or any(exercise_counts.get(t) for t in VOCAB_FULL_CONTEXT_TYPES):
+        return context_text
+    return select_context(context_text, words, VOCAB_CONTEXT_NEIGHBOURS, VOCAB_CONTEXT_MAX_CHARS)
+
+
+# (新增) 听力题提交到 TTS 合成队列 (submitted 记录已提交的题目 id, 避免流式解析和最终结果重复提交;
+# 从题库复用且已有音频的题目不再合成)
+def submit_question_tts(q: Question, tts_group: str | None, submitted: set) -> None:
+    if q.type in LISTENING_EXERCISE_TYPES and q.id not in submitted and not (q.stimuli and q.stimuli.audio_url):
+        text_to_synthesize = audio_text_for(q.type, q.stimuli.text if q.stimuli else None, q.stem)
+        if text_to_synthesize:
+            get_tts_queue().submit(q.id, text_to_synthesize, group=tts_group)
+            submitted.add(q.id)
+
+
+# (新增) 单个词的出题逻辑, 可在共享线程池中并发执行; 返回 (VocabPackage, 该词的错误列表)
+# (修改) exercise_counts: 出题计划中该词的 {题型: 数量} (utils/exercise_planner.py), 超出计划的题目会被丢弃
+def generate_word_package(vocab_item: VocabItem, context_text: str, hsk_level_int: int, exercise_counts: Counter,
+                          position: str = "", tts_group: str | None = None) -> Tuple[VocabPackage, List[str]]:
+    word_errors: List[str] = []
+    original_word = vocab_item.word
+    cleaned_word = clean_word(original_word)
+    print(f"    - {position} Processing word: '{original_word}'")
+
+    exercise_requests_str = format_exercise_requests(exercise_counts)
+
+    if not exercise_requests_str:
+        print(f"      - No exercises requested for '{original_word}'. Skipping.")
+        return VocabPackage(word_id=str(vocab_item.word_id), word=original_word, questions=[]), word_errors
+
+    # --- (V7 LLM 调用 & 解析 & TTS - 无需更改, 但添加错误检查) ---
+    prompt = VOCAB_QUESTIONS_PROMPT.format(
+         word=cleaned_word,
+         passage_text=context_for(context_text, [cleaned_word], exercise_counts),
+         exercise_requests_list=exercise_requests_str
+    )
+    questions = [] # 将包含 Question Pydantic 对象
+    llm_failed_for_word = False
+    submitted_tts = set()
+
+    # (新增) 流式出题: 每道题的 JSON 一闭合就校验并提交 TTS, 不等整段输出结束
+    # (未开启 LLM_STREAMING_ENABLED 时 llm() 以完整文本回调一次, 流程相同)
+    stream = JsonArrayStream("questions")
+    streamed: List[Question] = []
+    stream_invalid = False
+
+    def on_delta(delta: str | None) -> None:
+        nonlocal stream_invalid
+        if delta is None: # 新的一次请求 (客户端重试): 丢弃上一次收到的题目
+            stream.reset()
+            streamed.clear()
+            stream_invalid = False
+            return
+        for item in stream.feed(delta):
+            try:
+                q = build_question(item, hsk_level_int)
+            except (ValidationError, TypeError) as e:
+                stream_invalid = True
+                print(f"    - WARNING: Streamed question for '{original_word}' failed validation: {e}")
+                continue
+            streamed.append(q)
+            submit_question_tts(q, tts_group, submitted_tts)
+
+    for attempt in range(2):
+        on_delta(None)
+        # 解析失败后的重试跳过响应缓存, 否则只会重放同一段输出
+        llm_output = llm(prompt, system=VOCAB_QUESTIONS_SYSTEM, call_type="vocab_questions", on_delta=on_delta,
+                         use_cache=attempt == 0)
+        if "API_ERROR" in llm_output:
+             # (修改) llm() 内部已按错误类型退避重试, 这里不再立即重发 (只对解析失败重试)
+             llm_failed_for_word = True
+             word_errors.append(f"LLM failed for {original_word}: {llm_output}")
+             print(f"    - ERROR: LLM failed for word '{original_word}' after client retries: {llm_output}")
+             break
+
+        # 流式解析到的题目完整有效时直接使用 (TTS 已提交); 否则以完整文本的解析为准
+        if streamed and stream.complete and not stream_invalid and not stream.items_failed:
+            parsed_q_list = list(streamed)
+        else:
+            parsed_q_list = parse_llm_json_output(llm_output, hsk_level_int)
+        # 只保留计划内的题型和数量, 多出的题目不进入质检
+        planned_q_list = trim_to_plan(parsed_q_list, exercise_counts)
+        if len(planned_q_list) < len(parsed_q_list):
+            print(f"      - Dropped {len(parsed_q_list) - len(planned_q_list)} questions outside the plan for '{original_word}'.")
+        parsed_q_list = planned_q_list
+        if parsed_q_list: # 检查解析是否成功返回列表
+            questions = parsed_q_list
+            llm_failed_for_word = False # 成功了
+            break
+        else: # 解析返回了空列表
+            print(f"    - Attempt {attempt + 1} failed parsing LLM output for word '{original_word}'. Retrying...")
+            discard_cached_response(prompt, VOCAB_QUESTIONS_SYSTEM, "vocab_questions")
+            if attempt == 1: # 最后一次尝试失败
+                llm_failed_for_word = True
+
+    if llm_failed_for_word:
+        # 如果这个单词的所有尝试都失败了，创建一个空的包
+        print(f"      - Creating empty package for word '{original_word}' due to generation/parsing failures.")
+        return VocabPackage(word_id=str(vocab_item.word_id), word=original_word, questions=[]), word_errors
+
+    # (修改) TTS 不再同步阻塞: 提交到合成队列, 与后续单词的 LLM 调用重叠, finalize_lesson 时回填 audio_url
+    # 流式解析时已提交的题目不会重复提交; 被丢弃的题目的任务在 finalize_lesson 释放课程任务组时取消
+    for q in questions: # q 是 Question Pydantic 对象
+        submit_question_tts(q, tts_group, submitted_tts)
+
+    package = VocabPackage(
+        word_id=str(vocab_item.word_id),
+        word=original_word,
+        questions=questions # Question 对象列表
+    )
+    return package, word_errors
+
+
+# (新增) 多词合并出题中单个词的部分: 题目全部通过校验且计划内的题目非空时返回题目列表, 否则返回 None (该词回退到单词出题)
+def parse_batch_section(section: Dict[str, Any], hsk_level_int: int, exercise_counts: Counter) -> List[Question] | None:
+    try:
+        questions = [build_question(item, hsk_level_int) for item in section.get("questions") or []]
+    except (ValidationError, TypeError, AttributeError) as e:
+        print(f"    - WARNING: Batch section '{section.get('word_key')}' failed validation: {e}")
+        return None
+    return trim_to_plan(questions, exercise_counts) or None
+
+
+# (新增) 一次请求为一组词出题: 课文只发送一次, 输出按 word_key 拆分成各词的 VocabPackage;
+# 缺失、解析或校验失败的词按原题型计划回退到 generate_word_package。返回值与 words 顺序一致。
+def generate_batch_packages(words: List[Tuple[int, VocabItem, Counter]], context_text: str, hsk_level_int: int,
+                            total: int, tts_group: str | None = None) -> List[Tuple[VocabPackage, List[str]]]:
+    keys = [f"w{n + 1}" for n in range(len(words))]
+    word_sections = "\n\n".join(
+        f"### {key}: 核心词 `{clean_word(vocab_item.word)}`\n出题要求清单:\n{format_exercise_requests(counts)}"
+        for key, (_, vocab_item, counts) in zip(keys, words)
+    )
+    group_counts = sum((counts for _, _, counts in words), Counter())
+    passage_text = context_for(context_text, [clean_word(v.word) for _, v, _ in words], group_counts)
+    prompt = VOCAB_QUESTIONS_BATCH_PROMPT.format(passage_text=passage_text, word_sections=word_sections)
+    print(f"    - ({words[0][0] + 1}-{words[-1][0] + 1}/{total}) Processing {len(words)} words in one call: "
+          f"{', '.join(repr(v.word) for _, v, _ in words)}")
+
+    submitted_tts = set()
+    sections: Dict[str, List[Question]] = {}
+    stream = JsonArrayStream("packages")
+
+    def accept(section: Dict[str, Any]) -> None:
+        key = section.get("word_key")
+        if key not in keys or key in sections:
+            return
+        questions = parse_batch_section(section, hsk_level_int, words[keys.index(key)][2])
+        if questions is not None:
+            sections[key] = questions
+            for q in questions:
+                submit_question_tts(q, tts_group, submitted_tts)
+
+    def on_delta(delta: str | None) -> None:
+        if delta is None: # 新的一次请求 (客户端重试)
+            stream.reset()
+            sections.clear()
+            return
+        for section in stream.feed(delta):
+            accept(section)
+
+    llm_output = llm(prompt, system=VOCAB_QUESTIONS_BATCH_SYSTEM, call_type="vocab_batch", on_delta=on_delta)
+    if "API_ERROR" in llm_output:
+        print(f"    - WARNING: Batch question call failed ({llm_output}). Falling back to per-word calls.")
+    elif not stream.complete:
+        # 流式解析没有读到完整的顶层对象 (例如输出被截断): 以完整文本的解析为准
+        try:
+            cleaned_output = llm_output.strip()
+            if cleaned_output.startswith("```json"):
+                cleaned_output = cleaned_output[7:-3].strip()
+            for section in json.loads(cleaned_output).get("packages") or []:
+                if isinstance(section, dict):
+                    accept(section)
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"    - WARNING: Failed to parse batch question output. Error: {e}")
+            discard_cached_response(prompt, VOCAB_QUESTIONS_BATCH_SYSTEM, "vocab_batch")
+
+    results = []
+    for key, (i, vocab_item, counts) in zip(keys, words):
+        questions = sections.get(key)
+        if questions is None:
+            print(f"      - No valid section for '{vocab_item.word}' in batch output. Generating it alone.")
+            results.append(generate_word_package(vocab_item, context_text, hsk_level_int, counts, f"({i + 1}/{total})", tts_group))
+            continue
+        results.append((VocabPackage(word_id=str(vocab_item.word_id), word=vocab_item.word, questions=questions), []))
+    return results
+
+
 # (修复) 返回 dump 后的 dict, 正确处理错误
-def gen_vocab_questions(state: AgentState) -> Dict[str, Any]:
-    print("---NODE: gen_vocab_questions (V8 Randomizing) ---")
-    errors = list(state.errors) # 操作副本
+def gen_vocab_questions(state: AgentState, config: RunnableConfig | None = None) -> Dict[str, Any]:
+    print("---NODE: gen_vocab_questions (V9 Planned) ---")
+    errors: List[str] = [] # 本步新增的错误 (errors 为追加式字段)
     # state.current_lesson 现在是 LessonInput 对象
     current_lesson: LessonInput = state.current_lesson
-    # state.current_output_lesson 现在是 LessonOutput 对象
-    # 如果要修改它，请操作副本
-    output_lesson = state.current_output_lesson.model_copy(deep=True) if state.current_output_lesson else None
+    # state.current_output_lesson 现在是 LessonOutput 对象 (只读, 结果通过浅拷贝返回)
+    output_lesson = state.current_output_lesson
     context_text = state.current_content_text
 
     # 检查上游节点是否成功传递了数据
@@ -76,106 +286,110 @@ def gen_vocab_questions(state: AgentState) -> Dict[str, Any]:
 
     # --- 开始逻辑 ---
     hsk_level_int = state.stage2_input.hsk_level
-    all_vocab_packages = [] # 将包含 VocabPackage Pydantic 对象
     vocab_list = current_lesson.related_vocabulary # 这是 VocabItem 对象列表
+    total = len(vocab_list)
 
-    print(f"  - Generating question packages for {len(vocab_list)} vocabulary items...")
+    # (新增) 课程级出题计划: 按 question_num 和技能分布确定每个词的题型和数量 (同一课程每次相同, 续跑时不变)
+    plan = plan_lesson(current_lesson, state.stage2_input.question_num, topic=state.stage2_input.topic)
+    print(f"  - Exercise plan: {sum(plan.types.values())}/{plan.target} questions, skills {dict(plan.skills)}, "
+          f"types {dict(plan.types)} (seed {plan.seed})")
+
+    batch_size = VOCAB_QUESTIONS_BATCH_SIZE if VOCAB_QUESTIONS_MODE == "batch" else 1
+    print(f"  - Generating question packages for {total} vocabulary items (concurrency {LLM_MAX_CONCURRENCY}, "
+          f"{'batch size %d' % batch_size if batch_size > 1 else 'one call per word'})...")
 
     try:
-        for i, vocab_item in enumerate(vocab_list): # vocab_item 是 VocabItem 对象
-            original_word = vocab_item.word
-            cleaned_word = clean_word(original_word)
-            print(f"    - ({i+1}/{len(vocab_list)}) Processing word: '{original_word}'")
-
-            # --- (V8 随机化逻辑 - 无需更改) ---
-            specific_exercise_requests = []
-            for skill, count in vocab_item.skill_distribution.items():
-                if count > 0:
-                    available_types = SKILL_TO_EXERCISE_MAP.get(skill)
-                    if available_types:
-                        chosen_types = random.choices(available_types, k=count)
-                        specific_exercise_requests.extend(chosen_types)
-                    else:
-                        print(f"  - WARNING: Skill '{skill}' for word '{original_word}' has no types in SKILL_TO_EXERCISE_MAP.")
-
-            exercise_counts = Counter(specific_exercise_requests)
-
-            # --- (V7 Prompt 构建逻辑 - 无需更改) ---
-            exercise_requests = []
-            for ex_type, count in exercise_counts.items():
-                if count > 0:
-                    exercise_requests.append(f"- 生成 {count} 道 `{ex_type}` 类型的题目")
-
-            if not exercise_requests:
-                print(f"      - No exercises requested for this word. Skipping.")
-                package = VocabPackage(word_id=str(vocab_item.word_id), word=original_word, questions=[])
-                all_vocab_packages.append(package) # 添加空的 VocabPackage 对象
+        progress = get_run_progress(config)
+        lesson_id = output_lesson.lesson_id
+        tts_group = tts_group_for(state.stage2_input.topic, lesson_id)
+        # 进度键包含上下文摘要: 课文被重新生成后, 旧课文上出的题不会被复用
+        context_digest = hashlib.sha1(context_text.encode("utf-8")).hexdigest()[:12]
+        progress_key = lambda vocab_item: f"{vocab_item.word_id}@{context_digest}"
+
+        results: List[Tuple[VocabPackage, List[str]] | None] = [None] * total
+        pending: List[Tuple[int, VocabItem, Counter]] = []
+        planned_words = set()
+        for i, vocab_item in enumerate(vocab_list):
+            # 重复出现的词在计划中已合并, 只有第一次出现时出题
+            duplicate = vocab_item.word_id in planned_words
+            planned_words.add(vocab_item.word_id)
+            # 断点续跑: 本运行中已完成的单词直接复用
+            finished = progress.get_word(lesson_id, progress_key(vocab_item)) if progress is not None else None
+            if finished is not None:
+                print(f"    - ({i+1}/{total}) Word '{vocab_item.word}' already finished in this run. Skipping.")
+                results[i] = (VocabPackage.model_validate(finished[0]), finished[1])
+                continue
+            exercise_counts = Counter() if duplicate else plan.for_word(vocab_item.word_id)
+            if not any(exercise_counts.values()):
+                results[i] = (VocabPackage(word_id=str(vocab_item.word_id), word=vocab_item.word, questions=[]), [])
                 continue
-            exercise_requests_str = "\n".join(exercise_requests)
-
-            # --- (V7 LLM 调用 & 解析 & TTS - 无需更改, 但添加错误检查) ---
-            prompt = VOCAB_QUESTIONS_PROMPT.format(
-                 word=cleaned_word,
-                 passage_text=context_text,
-                 exercise_requests_list=exercise_requests_str
-            ) + JSON_ONLY_SUFFIX
-            questions = [] # 将包含 Question Pydantic 对象
-            llm_failed_for_word = False
-            for attempt in range(2):
-                llm_output = llm(prompt)
-                if "API_ERROR" in llm_output:
-                     print(f"    - LLM API Error on attempt {attempt+1} for word '{original_word}'. Retrying...")
-                     if attempt == 1: # 最后一次尝试失败
-                         llm_failed_for_word = True
-                         errors.append(f"LLM failed after 2 attempts for {original_word}: {llm_output}")
-                         print(f"    - ERROR: LLM failed after 2 attempts for word '{original_word}'.")
-                     continue # 重试循环
-
-                parsed_q_list = parse_llm_json_output(llm_output, hsk_level_int)
-                if parsed_q_list: # 检查解析是否成功返回列表
-                    questions = parsed_q_list
-                    llm_failed_for_word = False # 成功了
-                    break
-                else: # 解析返回了空列表
-                    print(f"    - Attempt {attempt + 1} failed parsing LLM output for word '{original_word}'. Retrying...")
-                    if attempt == 1: # 最后一次尝试失败
-                        llm_failed_for_word = True
-                        # 不再添加重复的错误信息，因为 parse_llm_json_output 内部已经打印并添加
-                        # errors.append(f"Failed to generate/parse questions for word '{original_word}' after 2 attempts.")
-                        # print(f"    - ERROR: Failed to generate/parse questions for word '{original_word}' after 2 attempts.")
-
-            if llm_failed_for_word:
-                # 如果这个单词的所有尝试都失败了，创建一个空的包并继续
-                 print(f"      - Creating empty package for word '{original_word}' due to generation/parsing failures.")
-                 package = VocabPackage(word_id=str(vocab_item.word_id), word=original_word, questions=[])
-                 all_vocab_packages.append(package)
-                 continue # 处理下一个单词
-
-            # TTS 逻辑无需更改
-            for q in questions: # q 是 Question Pydantic 对象
-                 if q.type in LISTENING_EXERCISE_TYPES:
-                    text_to_synthesize = ""
-                    if q.type in ["listen_choice", "listen_tf"]:
-                         if q.stimuli and q.stimuli.text: text_to_synthesize = q.stimuli.text
-                    elif q.type == "speak_follow":
-                         text_to_synthesize = q.stem
-                    if text_to_synthesize:
-                         q.stimuli.audio_url = generate_audio_placeholder(text_to_synthesize)
-
-            package = VocabPackage(
-                word_id=str(vocab_item.word_id),
-                word=original_word,
-                questions=questions # Question 对象列表
-            )
-            all_vocab_packages.append(package) # 添加 VocabPackage 对象
-
-        # 更新复制的 Pydantic 对象
-        output_lesson.vocab_packages = all_vocab_packages # VocabPackage 对象列表
+            pending.append((i, vocab_item, exercise_counts))
+
+        # (新增) 题库复用: 不依赖上下文的题型先从数据库取已通过质检的题目, 只有不足的部分交给 LLM
+        reused: Dict[int, List[Question]] = {}
+        bank = get_question_bank()
+        if bank is not None and pending:
+            try:
+                taken = bank.take([(vocab_item.word, counts) for _, vocab_item, counts in pending], hsk_level_int,
+                                  scope=state.stage2_input.topic, lesson_id=lesson_id)
+            except Exception as e:
+                print(f"  - WARNING: Question bank lookup failed, generating all questions with the LLM. Error: {e}")
+                taken = [[] for _ in pending]
+            still_pending = []
+            for (i, vocab_item, counts), bank_questions in zip(pending, taken):
+                if bank_questions:
+                    reused[i] = bank_questions
+                    counts = counts - Counter(q.type for q in bank_questions)
+                    submitted_tts = set()
+                    for q in bank_questions:
+                        submit_question_tts(q, tts_group, submitted_tts)
+                if any(counts.values()):
+                    still_pending.append((i, vocab_item, counts))
+                    continue
+                package = VocabPackage(word_id=str(vocab_item.word_id), word=vocab_item.word, questions=bank_questions)
+                print(f"    - ({i+1}/{total}) Word '{vocab_item.word}' served entirely from the question bank ({len(bank_questions)} questions).")
+                if progress is not None:
+                    progress.save_word(lesson_id, progress_key(vocab_item), package.model_dump(), [])
+                results[i] = (package, [])
+            print(f"  - Question bank: reused {sum(len(qs) for qs in reused.values())} questions, "
+                  f"{len(still_pending)}/{len(pending)} words still need the LLM.")
+            pending = still_pending
+
+        def run_group(group: List[Tuple[int, VocabItem, Counter]]) -> List[Tuple[VocabPackage, List[str]]]:
+            if len(group) == 1:
+                i, vocab_item, exercise_counts = group[0]
+                group_results = [generate_word_package(vocab_item, context_text, hsk_level_int, exercise_counts, f"({i+1}/{total})", tts_group)]
+            else:
+                group_results = generate_batch_packages(group, context_text, hsk_level_int, total, tts_group)
+            merged = []
+            for (i, vocab_item, _), (package, word_errors) in zip(group, group_results):
+                generated_ok = bool(package.questions)
+                if i in reused: # 题库中取出的题目排在 LLM 新出的题目之前
+                    package = package.model_copy(update={"questions": reused[i] + package.questions})
+                # 生成失败的单词 (有题目需求却没有题目) 不记为完成, 续跑时重试
+                if progress is not None and generated_ok:
+                    progress.save_word(lesson_id, progress_key(vocab_item), package.model_dump(), word_errors)
+                merged.append((package, word_errors))
+            return merged
+
+        # 各组之间互不依赖, 并发调用 LLM; 结果按原下标放回, 包顺序与 vocab_list 一致
+        groups = [pending[n:n + batch_size] for n in range(0, len(pending), batch_size)]
+        for group, group_results in zip(groups, map_ordered(run_group, groups)):
+            for (i, _, _), result in zip(group, group_results):
+                results[i] = result
+
+        all_vocab_packages = [] # 将包含 VocabPackage Pydantic 对象
+        for package, word_errors in results:
+            all_vocab_packages.append(package)
+            errors.extend(word_errors)
+
+        # (修改) 浅拷贝替换 vocab_packages, 代替 model_copy(deep=True) + model_dump()
+        output_lesson = output_lesson.model_copy(update={"vocab_packages": all_vocab_packages})
         print(f"  - Successfully attached VocabPackages to LessonOutput: '{current_lesson.lesson_name}'")
 
-        # (修复) 返回包含 dump 后对象和错误的 dict
         return {
-            "current_output_lesson": output_lesson.model_dump(), #
+            "current_output_lesson": output_lesson,
+            "current_exercise_plan": plan.to_dict(),
             "errors": errors
         }
 
@@ -183,4 +397,4 @@ def gen_vocab_questions(state: AgentState) -> Dict[str, Any]:
         import traceback
         print(f"ERROR in gen_vocab_questions loop: {e}\n{traceback.format_exc()}")
         errors.append(f"gen_vocab_questions: Failed during loop. Error: {e}")
-        return {"errors": errors} # 仅返回错误字典
\ No newline at end of file
+        return {"errors": errors} # 仅返回错误字典
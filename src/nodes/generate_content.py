@@ -1,12 +1,13 @@
 # src/nodes/generate_content.py
 import json
 # (修复) 导入 Dict, Any
-from typing import Dict, Any
-from src.llm_client import llm
-from src.prompts import PASSAGE_PROMPT, DIALOGUE_PROMPT
+from typing import Dict, Any, List
+from src.llm_client import llm, discard_cached_response
+from src.prompts import PASSAGE_PROMPT, PASSAGE_SYSTEM, DIALOGUE_PROMPT, DIALOGUE_SYSTEM
 # (需要导入 LessonInput 以便在 state 中访问)
 from models import AgentState, LessonOutput, PassageOutput, DialogueLine, Role, LessonInput
 from src.utils.text_utils import clean_word
+from utils.pinyin_annotator import to_pinyin
 from pydantic import ValidationError
 
 def estimate_chars(minutes: int) -> tuple[int, int]:
@@ -19,7 +20,7 @@ def estimate_chars(minutes: int) -> tuple[int, int]:
 # (修复) 返回 dump 后的 dict, 正确处理错误
 def generate_content(state: AgentState) -> Dict[str, Any]:
     print("---NODE: generate_content ---")
-    errors = list(state.errors) # 操作副本
+    errors: List[str] = [] # 本步新增的错误 (errors 为追加式字段)
     # state.current_lesson 现在是 LessonInput 对象
     current_lesson: LessonInput = state.current_lesson
     if not current_lesson:
@@ -45,6 +46,7 @@ def generate_content(state: AgentState) -> Dict[str, Any]:
         type=current_lesson.type
     )
     generated_text_for_context = ""
+    prompt, system = "", None
 
     try:
         if content_type == "dialogue" and roles:
@@ -58,14 +60,19 @@ def generate_content(state: AgentState) -> Dict[str, Any]:
                 vocab_list=vocab_list_str
                 # 注意：如果 DIALOGUE_PROMPT 需要 cmin/cmax，请在这里添加
             )
-            llm_output = llm(prompt)
+            system = DIALOGUE_SYSTEM
+            llm_output = llm(prompt, system=system, call_type="content")
             # 在尝试解析 JSON 之前检查 API 错误
             if "API_ERROR" in llm_output:
                  raise Exception(f"LLM API Error: {llm_output}")
             dialogue_data = json.loads(llm_output)
             # 更新本地 Pydantic 对象
             output_lesson.roles = roles
-            output_lesson.dialogues = [DialogueLine.model_validate(line) for line in dialogue_data]
+            # (新增) 拼音在本地按每行文本标注 (提示词不再要求模型输出拼音)
+            output_lesson.dialogues = [
+                line.model_copy(update={"pinyin": to_pinyin(line.text) or line.pinyin})
+                for line in (DialogueLine.model_validate(line) for line in dialogue_data)
+            ]
             generated_text_for_context = "\n".join([line.text for line in output_lesson.dialogues if line.text]) # 添加 if line.text 健壮性
         else:
             print(f"  - Generating: PASSAGE (JSON)")
@@ -77,19 +84,23 @@ def generate_content(state: AgentState) -> Dict[str, Any]:
                 chars_min=cmin,
                 chars_max=cmax
             )
-            llm_output = llm(prompt)
+            system = PASSAGE_SYSTEM
+            llm_output = llm(prompt, system=system, call_type="content")
             # 在尝试解析 JSON 之前检查 API 错误
             if "API_ERROR" in llm_output:
                  raise Exception(f"LLM API Error: {llm_output}")
             passage_data = json.loads(llm_output)
             # 更新本地 Pydantic 对象
             output_lesson.passage = PassageOutput.model_validate(passage_data)
+            output_lesson.passage.pinyin = to_pinyin(output_lesson.passage.text) or output_lesson.passage.pinyin
             generated_text_for_context = output_lesson.passage.text if output_lesson.passage else "" # 添加 if 健壮性
 
     except (json.JSONDecodeError, ValidationError) as e:
         import traceback
         print(f"ERROR in generate_content: {e}\n{traceback.format_exc()}")
         errors.append(f"generate_content: Failed to parse LLM JSON. Error: {e}")
+        if prompt: # 解析失败的输出不留在响应缓存中, 重跑时重新生成
+            discard_cached_response(prompt, system, "content")
         return {"errors": errors} # 仅返回错误字典
     except Exception as e: # 捕获 LLM 调用或其他意外错误
         import traceback
@@ -97,9 +108,8 @@ def generate_content(state: AgentState) -> Dict[str, Any]:
         errors.append(f"generate_content: Unexpected error. Error: {e}")
         return {"errors": errors}
 
-    # (修复) 返回包含 dump 后对象和字符串的 dict
+    # (修改) 直接返回 Pydantic 对象, 下游节点无需 dump 后再重新校验
     return {
-        "current_output_lesson": output_lesson.model_dump(), #
-        "current_content_text": generated_text_for_context,
-        "errors": errors # 返回当前错误列表
+        "current_output_lesson": output_lesson,
+        "current_content_text": generated_text_for_context
     }
\ No newline at end of file
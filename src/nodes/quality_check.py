@@ -1,12 +1,16 @@
 # src/nodes/quality_check.py
 import re
 # (修复) 导入 Dict, Any
-from typing import Dict, Any
-from llm_client import llm
+from typing import Dict, Any, List, Tuple
+from llm_client import llm, discard_cached_response
 # (需要导入 LessonOutput 以便在 state 中访问)
 from models import AgentState, Question, LessonOutput, VocabPackage
-from prompts import QUALITY_CHECK_PROMPT
-from config import ALL_EXERCISE_TYPES
+from prompts import QUALITY_CHECK_PROMPT, QUALITY_CHECK_SYSTEM, QUALITY_CHECK_BATCH_PROMPT, QUALITY_CHECK_BATCH_SYSTEM
+from config import QC_JUDGE_MODE, QC_JUDGE_BATCH_SIZE
+from collections import Counter
+from utils.question_rules import validate_question, record_stats
+from utils.concurrency import map_ordered
+from question_bank import get_question_bank
 import json
 from pydantic import BaseModel, ValidationError
 from src.utils.text_utils import clean_word
@@ -15,12 +19,126 @@ class QualityCheckResult(BaseModel):
     is_valid: bool
     reason: str
 
+class BatchVerdict(BaseModel):
+    question_id: str
+    is_valid: bool
+    reason: str = ""
+
+class BatchQualityCheckResult(BaseModel):
+    verdicts: List[BatchVerdict]
+
+# (judge_job) = (vocab_pkg, question, target_word_cleaned, q_identifier)
+JudgeJob = Tuple[VocabPackage, Question, str, str]
+
+# (新增) 被拒绝的题目空位, 交给 repair_questions 重新出题
+def rejected_slot(vocab_pkg: VocabPackage, q: Question, reason: str) -> Dict[str, Any]:
+    return {
+        "word_id": vocab_pkg.word_id,
+        "word": vocab_pkg.word,
+        "type": q.type,
+        "reason": reason or "",
+        "rejected": q.model_dump(mode="json", exclude={"id", "level"})
+    }
+
+def strip_code_fence(text: str) -> str:
+    # 尝试去除可能的 Markdown 代码块标记
+    if text.strip().startswith("```json"):
+        return text.strip()[7:-3].strip()
+    if text.strip().startswith("```"):
+        return text.strip()[3:-3].strip()
+    return text
+
+# (新增) 单题 LLM 评审, 可在共享线程池中并发执行; 返回 (is_valid_llm, reason) (解析或调用失败时默认放行)
+def judge_question(q: Question, target_word_cleaned: str, hsk_level_int: int, q_identifier: str) -> Tuple[bool, str]:
+    judge_output = ""
+    try:
+        check_prompt = QUALITY_CHECK_PROMPT.format(
+            hsk_level=hsk_level_int,
+            target_word=target_word_cleaned,
+            question_json=q.model_dump_json(indent=2)
+        )
+        judge_output = llm(check_prompt, system=QUALITY_CHECK_SYSTEM, call_type="judge")
+        if "API_ERROR" in judge_output:
+            raise Exception(f"LLM Judge API Error: {judge_output}")
+
+        judge_output = strip_code_fence(judge_output)
+        result = QualityCheckResult.model_validate_json(judge_output)
+
+        if not result.is_valid:
+            print(f"  - FAILED (LLM): {q_identifier}. Reason: {result.reason}")
+            return False, result.reason
+
+    except (json.JSONDecodeError, ValidationError) as e:
+        print(f"  - WARNING: LLM-Judge failed to parse result for {q_identifier}. Error: {e}. Output was: {judge_output}")
+        discard_cached_response(check_prompt, QUALITY_CHECK_SYSTEM, "judge")
+        # 默认放行以保证健壮性
+    except Exception as e: # 捕获 API 错误或其他错误
+        print(f"  - WARNING: LLM-Judge call failed for {q_identifier}. Error: {e}")
+        # 默认放行
+    return True, ""
+
+# (新增) 批量评审: 一次请求评审一组题目; 整批解析失败时逐题回退, 缺失某题结论时仅该题回退
+def judge_batch(jobs: List[JudgeJob], hsk_level_int: int) -> List[Tuple[bool, str]]:
+    items = [
+        {
+            "question_id": f"q{i + 1}",
+            "target_word": target_word_cleaned,
+            "question": q.model_dump(mode="json", exclude={"id", "level"})
+        }
+        for i, (_, q, target_word_cleaned, _) in enumerate(jobs)
+    ]
+    judge_output = ""
+    try:
+        batch_prompt = QUALITY_CHECK_BATCH_PROMPT.format(
+            hsk_level=hsk_level_int,
+            questions_json=json.dumps(items, ensure_ascii=False, indent=2)
+        )
+        judge_output = llm(batch_prompt, system=QUALITY_CHECK_BATCH_SYSTEM, call_type="judge")
+        if "API_ERROR" in judge_output:
+            raise Exception(f"LLM Judge API Error: {judge_output}")
+        result = BatchQualityCheckResult.model_validate_json(strip_code_fence(judge_output))
+        verdicts_by_id = {v.question_id: v for v in result.verdicts}
+    except (json.JSONDecodeError, ValidationError) as e:
+        print(f"  - WARNING: Batch LLM-Judge failed to parse result for {len(jobs)} questions. Error: {e}. Falling back to per-question judging.")
+        discard_cached_response(batch_prompt, QUALITY_CHECK_BATCH_SYSTEM, "judge")
+        return [judge_question(q, word, hsk_level_int, ident) for _, q, word, ident in jobs]
+    except Exception as e: # 捕获 API 错误或其他错误, 与逐题模式一致默认放行
+        print(f"  - WARNING: Batch LLM-Judge call failed for {len(jobs)} questions. Error: {e}")
+        return [(True, "")] * len(jobs)
+
+    results = []
+    for item, (_, q, target_word_cleaned, q_identifier) in zip(items, jobs):
+        verdict = verdicts_by_id.get(item["question_id"])
+        if verdict is None:
+            print(f"  - WARNING: Batch LLM-Judge returned no verdict for {q_identifier}. Judging it alone.")
+            results.append(judge_question(q, target_word_cleaned, hsk_level_int, q_identifier))
+            continue
+        if not verdict.is_valid:
+            print(f"  - FAILED (LLM): {q_identifier}. Reason: {verdict.reason}")
+        results.append((verdict.is_valid, verdict.reason))
+    return results
+
+def judge_all(jobs: List[JudgeJob], hsk_level_int: int) -> List[Tuple[bool, str]]:
+    """按 QC_JUDGE_MODE 评审所有题目, 返回与 jobs 顺序一致的 (is_valid, reason) 列表。"""
+    if QC_JUDGE_MODE == "batch" and QC_JUDGE_BATCH_SIZE > 1:
+        batches = [jobs[i:i + QC_JUDGE_BATCH_SIZE] for i in range(0, len(jobs), QC_JUDGE_BATCH_SIZE)]
+        print(f"  - Judging {len(jobs)} questions in {len(batches)} batch calls (batch size {QC_JUDGE_BATCH_SIZE}).")
+        batch_results = map_ordered(lambda batch: judge_batch(batch, hsk_level_int), batches)
+        return [verdict for batch_result in batch_results for verdict in batch_result]
+    return map_ordered(lambda job: judge_question(job[1], job[2], hsk_level_int, job[3]), jobs)
+
 # (修复) 返回 dump 后的 dict, 正确处理错误
 def check_questions(state: AgentState) -> Dict[str, Any]:
     print("---NODE: quality_check ---")
-    errors = list(state.errors) # 操作副本
+    errors: List[str] = [] # 本步新增的错误 (errors 为追加式字段)
 
-    lesson_package = state.current_output_lesson.model_copy(deep=True) if state.current_output_lesson else None
+    # (修改) 只浅拷贝本课的包和题目 (规则修复只改题目的顶层字段), 不再 deep copy 整个 LessonOutput
+    lesson_package = None
+    if state.current_output_lesson:
+        lesson_package = state.current_output_lesson.model_copy(update={"vocab_packages": [
+            pkg.model_copy(update={"questions": [q.model_copy() for q in pkg.questions]})
+            for pkg in state.current_output_lesson.vocab_packages
+        ]})
 
     # 检查上游节点是否成功传递了数据
     if not lesson_package:
@@ -32,10 +150,14 @@ def check_questions(state: AgentState) -> Dict[str, Any]:
     hsk_level_int = state.stage2_input.hsk_level
     total_questions_checked = 0
     failed_questions_count = 0
+    rule_stats: Counter = Counter()
+    bank = get_question_bank()
+    reused_kept: List[Tuple[VocabPackage, Question]] = []
+    rejected_slots: List[Dict[str, Any]] = []
 
     try:
+        judge_jobs: List[JudgeJob] = []
         for vocab_pkg in lesson_package.vocab_packages: # vocab_pkg 是 VocabPackage 对象
-            valid_questions = [] # 将包含 Question Pydantic 对象
             current_pkg_question_count = len(vocab_pkg.questions)
             total_questions_checked += current_pkg_question_count # 累加检查的总数
 
@@ -46,63 +168,49 @@ def check_questions(state: AgentState) -> Dict[str, Any]:
             target_word_cleaned = clean_word(target_word_original)
 
             for q_idx, q in enumerate(vocab_pkg.questions): # q 是 Question 对象
-                is_valid_rule = True
-                is_valid_llm = True
                 q_identifier = f"Word '{target_word_original}' Q_idx {q_idx} (Type: {q.type})" # 用于日志
+                # 无论是否通过规则都要取出, 避免 id 残留
+                is_reused = bank is not None and bank.pop_reused(q.id, state.stage2_input.topic, lesson_package.lesson_id)
 
-                # --- (V6/V7 规则检查 - 无需更改) ---
-                if q.type not in ALL_EXERCISE_TYPES:
-                    print(f"  - FAILED (Rule): Invalid type. {q_identifier}")
-                    is_valid_rule = False
-                else: # 只有类型有效才检查相关性
-                    in_stimuli = q.stimuli and q.stimuli.text and (target_word_original in q.stimuli.text or target_word_cleaned in q.stimuli.text)
-                    in_stem = q.stem and (target_word_original in q.stem or target_word_cleaned in q.stem)
-                    if not in_stimuli and not in_stem and q.type not in ["write_word", "speak_follow", "translate_c2e", "translate_e2c"]:
-                        print(f"  - FAILED (Rule): Target word not in stimuli or stem. {q_identifier}")
-                        is_valid_rule = False
-
-                # --- (V6/V7 LLM 检查 - 无需更改, 但添加错误检查) ---
-                if is_valid_rule:
-                    try:
-                        check_prompt = QUALITY_CHECK_PROMPT.format(
-                            hsk_level=hsk_level_int,
-                            target_word=target_word_cleaned,
-                            question_json=q.model_dump_json(indent=2)
-                        )
-                        judge_output = llm(check_prompt)
-                        if "API_ERROR" in judge_output:
-                            raise Exception(f"LLM Judge API Error: {judge_output}")
-
-                        # 尝试去除可能的 Markdown 代码块标记
-                        if judge_output.strip().startswith("```json"):
-                             judge_output = judge_output.strip()[7:-3].strip()
-                        elif judge_output.strip().startswith("```"):
-                             judge_output = judge_output.strip()[3:-3].strip()
-
-                        result = QualityCheckResult.model_validate_json(judge_output)
-
-                        if not result.is_valid:
-                            is_valid_llm = False
-                            print(f"  - FAILED (LLM): {q_identifier}. Reason: {result.reason}")
-
-                    except (json.JSONDecodeError, ValidationError) as e:
-                        print(f"  - WARNING: LLM-Judge failed to parse result for {q_identifier}. Error: {e}. Output was: {judge_output}")
-                        # 默认放行以保证健壮性
-                    except Exception as e: # 捕获 API 错误或其他错误
-                        print(f"  - WARNING: LLM-Judge call failed for {q_identifier}. Error: {e}")
-                        # 默认放行
-
-                if is_valid_rule and is_valid_llm:
-                    valid_questions.append(q) 
-                else:
+                # --- (新增) 结构规则引擎: 本地修复/拒绝, 被拒绝的题目不再送 LLM 评审 ---
+                is_valid_rule, rule_reason = validate_question(q, (target_word_original, target_word_cleaned), rule_stats)
+                if not is_valid_rule:
+                    print(f"  - FAILED (Rule): {rule_reason}. {q_identifier}")
                     failed_questions_count += 1
-            vocab_pkg.questions = valid_questions 
+                    rejected_slots.append(rejected_slot(vocab_pkg, q, rule_reason))
+                    continue
+
+                # (新增) 从题库复用的题目此前已通过 LLM 评审, 不再重复送审
+                if is_reused:
+                    reused_kept.append((vocab_pkg, q))
+                    continue
+
+                judge_jobs.append((vocab_pkg, q, target_word_cleaned, q_identifier))
+
+        # --- (V6/V7 LLM 检查) 通过规则的题目并发送审, 结果顺序与 judge_jobs 一致 ---
+        record_stats(rule_stats)
+        rejected_by_rules = sum(v for k, v in rule_stats.items() if k.startswith("rejected."))
+        fixed_by_rules = sum(v for k, v in rule_stats.items() if k.startswith("fixed."))
+        print(f"  - Structural rules: {rejected_by_rules} rejected, {fixed_by_rules} auto-fixed, "
+              f"{len(judge_jobs)} sent to LLM judge, {len(reused_kept)} reused from question bank. Hits: {dict(rule_stats)}")
+        verdicts = judge_all(judge_jobs, hsk_level_int)
+        kept_ids = {q.id for _, q in reused_kept}
+        for (vocab_pkg, q, _, _), (is_valid_llm, reason) in zip(judge_jobs, verdicts):
+            if is_valid_llm:
+                kept_ids.add(q.id)
+            else:
+                failed_questions_count += 1
+                rejected_slots.append(rejected_slot(vocab_pkg, q, reason))
+        # 按原顺序保留通过的题目 (复用的与新生成的题目混在同一个包里时顺序不变)
+        for vocab_pkg in lesson_package.vocab_packages:
+            if vocab_pkg.questions:
+                vocab_pkg.questions = [q for q in vocab_pkg.questions if q.id in kept_ids]
 
         print(f"  - Quality check complete. {failed_questions_count}/{total_questions_checked} questions failed and were removed.")
 
-        # (修复) 返回包含 dump 后对象和错误的 dict
         return {
-            "current_output_lesson": lesson_package.model_dump(), #
+            "current_output_lesson": lesson_package,
+            "current_rejected_slots": rejected_slots,
             "errors": errors
         }
 
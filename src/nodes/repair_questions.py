@@ -0,0 +1,148 @@
+# src/nodes/repair_questions.py
+import json
+from collections import Counter, defaultdict
+from typing import Dict, Any, List
+from pydantic import ValidationError
+from langchain_core.runnables import RunnableConfig
+from llm_client import llm, discard_cached_response
+from models import AgentState, Question
+from prompts import REPAIR_QUESTIONS_PROMPT, REPAIR_QUESTIONS_SYSTEM
+from config import QC_REPAIR_MAX_ROUNDS, QC_REPAIR_BATCH_SIZE, QC_REPAIR_MAX_CALLS
+from utils.text_utils import clean_word
+from utils.concurrency import map_ordered
+from utils.question_rules import validate_question
+from nodes.gen_vocab_questions import build_question, context_for, submit_question_tts
+from tools.tts import tts_group_for
+from nodes.quality_check import judge_all, strip_code_fence, JudgeJob
+
+
+# (新增) 一次请求为一组被拒绝的空位各出一道新题 (附原题和拒绝原因); 返回与 slots 顺序一致的 Question 或 None
+def regenerate_slots(slots: List[Dict[str, Any]], context_text: str, hsk_level_int: int) -> List[Question | None]:
+    keys = [f"s{n + 1}" for n in range(len(slots))]
+    items = [
+        {
+            "slot_id": key,
+            "target_word": clean_word(slot["word"]),
+            "type": slot["type"],
+            "reason": slot["reason"],
+            "rejected_question": slot["rejected"]
+        }
+        for key, slot in zip(keys, slots)
+    ]
+    words = list(dict.fromkeys(clean_word(slot["word"]) for slot in slots))
+    prompt = REPAIR_QUESTIONS_PROMPT.format(
+        passage_text=context_for(context_text, words, Counter(slot["type"] for slot in slots)),
+        hsk_level=hsk_level_int,
+        slots_json=json.dumps(items, ensure_ascii=False, indent=2)
+    )
+    results: List[Question | None] = [None] * len(slots)
+    llm_output = llm(prompt, system=REPAIR_QUESTIONS_SYSTEM, call_type="repair")
+    if "API_ERROR" in llm_output:
+        print(f"    - WARNING: Repair call failed for {len(slots)} slots: {llm_output}")
+        return results
+    try:
+        questions_data = json.loads(strip_code_fence(llm_output)).get("questions") or []
+    except (json.JSONDecodeError, AttributeError) as e:
+        print(f"    - WARNING: Failed to parse repair output for {len(slots)} slots. Error: {e}")
+        discard_cached_response(prompt, REPAIR_QUESTIONS_SYSTEM, "repair")
+        return results
+
+    for item in questions_data:
+        if not isinstance(item, dict) or item.get("slot_id") not in keys:
+            continue
+        n = keys.index(item["slot_id"])
+        if results[n] is not None:
+            continue
+        if item.get("type") != slots[n]["type"]: # 空位的题型是计划的一部分, 不接受换题型
+            print(f"    - WARNING: Repair for '{slots[n]['word']}' returned type {item.get('type')} instead of {slots[n]['type']}.")
+            continue
+        try:
+            results[n] = build_question(item, hsk_level_int)
+        except (ValidationError, TypeError) as e:
+            print(f"    - WARNING: Repaired question for '{slots[n]['word']}' failed validation: {e}")
+    return results
+
+
+# 新题仍不合格: 下一轮以新题和新的原因为参照
+def retry_slot(slot: Dict[str, Any], q: Question, reason: str) -> Dict[str, Any]:
+    return {**slot, "reason": reason or slot["reason"], "rejected": q.model_dump(mode="json", exclude={"id", "level"})}
+
+
+def repair_questions(state: AgentState, config: RunnableConfig | None = None) -> Dict[str, Any]:
+    """质检后补题: 只为被拒绝的 (词, 题型) 空位重新出题, 新题同样经过规则和 LLM 评审; 受轮数和调用次数限制。"""
+    print("---NODE: repair_questions ---")
+    slots = state.current_rejected_slots
+    lesson_package = state.current_output_lesson
+    if not slots or not lesson_package:
+        return {"current_rejected_slots": []}
+    if QC_REPAIR_MAX_ROUNDS <= 0 or QC_REPAIR_MAX_CALLS <= 0:
+        print(f"  - Repair disabled. {len(slots)} rejected slots left empty.")
+        return {"current_rejected_slots": []}
+
+    hsk_level_int = state.stage2_input.hsk_level
+    context_text = state.current_content_text
+    tts_group = tts_group_for(state.stage2_input.topic, lesson_package.lesson_id)
+    batch_size = max(1, QC_REPAIR_BATCH_SIZE)
+    repaired: Dict[str, List[Question]] = defaultdict(list)
+    submitted_tts = set()
+    pending = list(slots)
+    calls = 0
+
+    try:
+        for round_no in range(1, QC_REPAIR_MAX_ROUNDS + 1):
+            batches = [pending[n:n + batch_size] for n in range(0, len(pending), batch_size)]
+            batches = batches[:QC_REPAIR_MAX_CALLS - calls]
+            if not batches:
+                break
+            calls += len(batches)
+            attempted = [slot for batch in batches for slot in batch]
+            next_pending = pending[len(attempted):] # 超出调用预算的空位留到下一轮
+            print(f"  - Round {round_no}: regenerating {len(attempted)} rejected slots in {len(batches)} calls.")
+            generated = [q for batch_result in map_ordered(
+                lambda batch: regenerate_slots(batch, context_text, hsk_level_int), batches) for q in batch_result]
+
+            # 新题先过结构规则, 再送 LLM 评审; 仍不合格的空位带着新的原因进入下一轮
+            judge_jobs: List[JudgeJob] = []
+            judged_slots: List[Dict[str, Any]] = []
+            for slot, q in zip(attempted, generated):
+                if q is None:
+                    next_pending.append(slot)
+                    continue
+                q_identifier = f"Word '{slot['word']}' repair (Type: {q.type})"
+                is_valid_rule, rule_reason = validate_question(q, (slot["word"], clean_word(slot["word"])))
+                if not is_valid_rule:
+                    print(f"  - FAILED (Rule): {rule_reason}. {q_identifier}")
+                    next_pending.append(retry_slot(slot, q, rule_reason))
+                    continue
+                judge_jobs.append((None, q, clean_word(slot["word"]), q_identifier))
+                judged_slots.append(slot)
+            for (_, q, _, _), slot, (is_valid_llm, reason) in zip(judge_jobs, judged_slots, judge_all(judge_jobs, hsk_level_int)):
+                if is_valid_llm:
+                    repaired[slot["word_id"]].append(q)
+                    submit_question_tts(q, tts_group, submitted_tts)
+                else:
+                    next_pending.append(retry_slot(slot, q, reason))
+            pending = next_pending
+            if not pending:
+                break
+
+        filled = sum(len(qs) for qs in repaired.values())
+        print(f"  - Repair complete. {filled}/{len(slots)} rejected slots refilled in {calls} calls, {len(pending)} left empty.")
+        if not filled:
+            return {"current_rejected_slots": []}
+
+        # 补上的题目追加到对应词的包末尾 (同一 word_id 只追加到第一个包)
+        vocab_packages = []
+        for pkg in lesson_package.vocab_packages:
+            extra = repaired.pop(pkg.word_id, [])
+            vocab_packages.append(pkg.model_copy(update={"questions": pkg.questions + extra}) if extra else pkg)
+        return {
+            "current_output_lesson": lesson_package.model_copy(update={"vocab_packages": vocab_packages}),
+            "current_rejected_slots": []
+        }
+
+    except Exception as e:
+        import traceback
+        print(f"ERROR in repair_questions: {e}\n{traceback.format_exc()}")
+        # 补题失败不影响已通过质检的题目, 不计入 errors (errors 会终止串行流程)
+        return {"current_rejected_slots": []}
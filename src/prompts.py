@@ -1,143 +1,291 @@
-
-
 JSON_ONLY_SUFFIX = """
 重要：除了JSON代码块本身，不要输出任何其他文字、解释或注释。你的回答必须是一个可以直接通过 `json.loads()` 解析的合法JSON对象。
 """
 
+# (修改) 每个提示词拆成两部分, 以便命中服务端的前缀缓存 (prefix / context cache):
+#   *_SYSTEM: 固定不变的说明 (角色、JSON 格式、质检标准、JSON_ONLY_SUFFIX), 作为 system 消息发送, 逐字节稳定
+#   *_PROMPT: 可变内容, 作为 user 消息发送; 同一课共享的内容 (课文等) 在前, 每个词 / 每道题的变量在后
+# 调用方式: llm(XXX_PROMPT.format(...), system=XXX_SYSTEM)
+# (修改) 拼音由本地标注 (utils/pinyin_annotator.py), 提示词不再要求模型输出 pinyin 字段
 
-PASSAGE_PROMPT = """
-你是一位专业的中文教学内容设计师。
-你的任务是为 HSK{hsk_level} 水平的学生，根据下面的要求创作一篇短文。
 
----
-学习单元：{lesson_name}
-单元说明：{lesson_desc}
-必须自然地包含以下所有核心词汇：{vocab_list}
-字数要求：{chars_min}-{chars_max}字
----
+PASSAGE_SYSTEM = """
+你是一位专业的中文教学内容设计师。
+你的任务是根据用户给出的要求（学生 HSK 水平、学习单元、核心词汇、字数），为学生创作一篇短文。
 
 输出要求：你必须严格按照以下 JSON 格式返回：
-{{
+{
   "text": "（生成的中文文章全文）",
   "textEn": "（对应的英文翻译全文）",
-  "pinyin": "（整篇文章的拼音）",
   "covered_words": ["（文章中实际包含的核心词汇列表）", ...]
-}}
+}
 """ + JSON_ONLY_SUFFIX
 
-
-DIALOGUE_PROMPT = """
-你是一位专业的中文教学内容设计师和剧本作家。
-你的任务是为 HSK{hsk_level} 水平的学生创作一段对话。
+PASSAGE_PROMPT = """
+请为 HSK{hsk_level} 水平的学生创作一篇短文。
 
 ---
 学习单元：{lesson_name}
 单元说明：{lesson_desc}
-对话角色：{roles_str}
-必须自然地包含以下所有核心词V汇：{vocab_list}
+必须自然地包含以下所有核心词汇：{vocab_list}
+字数要求：{chars_min}-{chars_max}字
 ---
+"""
+
+
+DIALOGUE_SYSTEM = """
+你是一位专业的中文教学内容设计师和剧本作家。
+你的任务是根据用户给出的要求（学生 HSK 水平、学习单元、对话角色、核心词汇），为学生创作一段对话。
 
 输出要求：你必须严格按照以下 JSON 列表格式返回，其中每个对象代表一行对话：
 [
-  {{
+  {
     "dialogueId": 1,
     "roleId": 1,
     "text": "（角色1的第一句话）",
     "textEn": "（对应的英文翻译）",
-    "pinyin": "（对应的拼音）",
     "covered_words": ["（这句中包含的核心词汇）"]
-  }},
-  {{
+  },
+  {
     "dialogueId": 2,
     "roleId": 2,
     "text": "（角色2的回应）",
     "textEn": "...",
-    "pinyin": "...",
     "covered_words": []
-  }}
+  }
 ]
 """ + JSON_ONLY_SUFFIX
 
+DIALOGUE_PROMPT = """
+请为 HSK{hsk_level} 水平的学生创作一段对话。
 
-FIX_APPEND_PROMPT = """
+---
+学习单元：{lesson_name}
+单元说明：{lesson_desc}
+对话角色：{roles_str}
+必须自然地包含以下所有核心词汇：{vocab_list}
+---
+"""
+
+
+FIX_APPEND_SYSTEM = """
 你是一位中文写作润色专家。
-下面的文章遗漏了一些必须包含的词汇。
+用户会给出一篇遗漏了某些必须包含的词汇的文章，以及缺失的词汇列表。
+你的任务是在不改变原文核心内容和风格的前提下，对文章进行扩写或修改，从而自然地融入所有**缺失的词汇**。
 
+请只输出**完整修改后的新文章全文**，不要解释你的修改过程。
+"""
+
+FIX_APPEND_PROMPT = """
 原始文章：
 ---
 {text}
 ---
 
-你的任务是在不改变原文核心内容和风格的前提下，对文章进行扩写或修改，从而自然地融入以下**缺失的词汇**：`{missing_vocab_list}`。
-
-请只输出**完整修改后的新文章全文**，不要解释你的修改过程。
+缺失的词汇：`{missing_vocab_list}`
 """
 
 
-VOCAB_QUESTIONS_PROMPT = """
-你是一位顶级的中文教学内容设计师，你必须严格遵循 JSON 格式要求。
+# (新增) 补词的补丁模式: 只输出句子级修改, 不输出全文
+FIX_PATCH_SYSTEM = """
+你是一位中文写作润色专家。
+用户会给出一篇按句编号的文章（或按行编号的对话）、学生的 HSK 水平，以及文章中遗漏的必须包含的词汇。
+你的任务是用**尽量少的句子级修改**自然地融入所有**缺失的词汇**，不改变原文的核心内容和风格，不要改动其他句子，也不要输出全文。
 
-核心教学目标：帮助学生掌握中文词汇 `{word}`。
-可参考的上下文（文章或对话）：
+修改方式只有两种（index 均指原文中的编号）：
+- "replace": 用新句子替换第 index 句
+- "insert": 在第 index 句之前插入一句新句子（index 等于句子总数时表示追加到末尾）
+
+输出要求：你必须严格按照以下 JSON 格式返回：
+{
+  "edits": [
+    {
+      "op": "insert",
+      "index": 3,
+      "text": "（新的中文句子）",
+      "textEn": "（该句的英文翻译）",
+      "roleId": 1
+    }
+  ]
+}
+其中 roleId 只有对话需要，表示说这句话的角色编号。
+""" + JSON_ONLY_SUFFIX
+
+FIX_PATCH_PROMPT = """
+学生水平：HSK {hsk_level}
+
+原文（共 {count} 句）：
 ---
-{passage_text}
+{numbered_text}
 ---
 
-**你的任务**：
-请严格按照下面的“出题要求清单”，为核心词 `{word}` 生成一个包含所有题目的 JSON 对象。
+缺失的词汇：`{missing_vocab_list}`
+"""
 
-**出题要求清单**:
-{exercise_requests_list}
 
-**JSON 格式定义 (V6 结构)**:
-你的输出必须是一个 JSON 对象，包含一个 "questions" 列表。
+# 出题提示词共用的题目格式定义
+QUESTION_FORMAT_SPEC = """
 **所有题目**，无论何种类型，都必须遵循以下**统一格式**：
 
 ```json
-{{
+{
   "type": "（题型ID, 例如: read_choice, listen_tf）",
-  "stimuli": {{
+  "stimuli": {
     "text": "（做题所需的上下文。听力题则为听力稿。无则为 null）"
-  }},
+  },
   "stem": "（具体的中文题目问题）",
   "stem_en": "（具体的英文翻译问题）",
   "options": [
-    {{
+    {
       "id": "A",
       "text": "（选项A的文本）",
-      "meaning": "（选项A的英文含义，可选）",
-      "pinyin": "（选项A的拼音，可选）"
-    }},
-    {{
+      "meaning": "（选项A的英文含义，可选）"
+    },
+    {
       "id": "B",
       "text": "（选项B的文本）"
-    }}
+    }
   ],
   "answer": "（答案。选择题为选项id 'A', 判断题为 true/false）"
-}}
+}
+```
 """
 
-QUALITY_CHECK_PROMPT = """
-你是一位严格的中文教学内容质检专家。
-你的任务是评估一个JSON格式的练习题是否符合质量标准。
+VOCAB_QUESTIONS_SYSTEM = """
+你是一位顶级的中文教学内容设计师，你必须严格遵循 JSON 格式要求。
+
+用户会给出可参考的上下文（文章或对话）、一个核心词，以及该词的“出题要求清单”。
+**你的任务**：
+请严格按照“出题要求清单”，为核心词生成一个包含所有题目的 JSON 对象。
+
+**JSON 格式定义 (V6 结构)**:
+你的输出必须是一个 JSON 对象，包含一个 "questions" 列表。
+""" + QUESTION_FORMAT_SPEC + JSON_ONLY_SUFFIX
 
+VOCAB_QUESTIONS_PROMPT = """
+可参考的上下文（文章或对话）：
+---
+{passage_text}
+---
+
+核心教学目标：帮助学生掌握中文词汇 `{word}`。
+
+**出题要求清单**:
+{exercise_requests_list}
+"""
+
+VOCAB_QUESTIONS_BATCH_SYSTEM = """
+你是一位顶级的中文教学内容设计师，你必须严格遵循 JSON 格式要求。
+
+用户会给出可参考的上下文（文章或对话），以及若干个核心词和每个词各自的“出题要求清单”。
+**你的任务**：
+请严格按照每个核心词各自的“出题要求清单”，为**每一个**核心词分别出题。每道题只考察它所属的核心词。
+
+**JSON 格式定义 (V6 结构)**:
+你的输出必须是一个 JSON 对象，包含一个 "packages" 列表，每个核心词一项，`word_key` 必须与用户给出的编号一致：
+
+```json
+{
+  "packages": [
+    {
+      "word_key": "w1",
+      "word": "（核心词）",
+      "questions": [ "（该词的所有题目，格式见下）" ]
+    }
+  ]
+}
+```
+""" + QUESTION_FORMAT_SPEC + JSON_ONLY_SUFFIX
+
+VOCAB_QUESTIONS_BATCH_PROMPT = """
+可参考的上下文（文章或对话）：
+---
+{passage_text}
+---
+
+核心教学目标：帮助学生掌握下面列出的每一个中文词汇。
+
+{word_sections}
+"""
+
+
+# 质检标准 (单题 / 批量共用)
+QUALITY_CRITERIA = """
 ---
-标准1 (相关性): 题目（`stimuli.text`或`stem`）是否紧密围绕核心词汇 `{target_word}` 进行考察？
+标准1 (相关性): 题目（`stimuli.text`或`stem`）是否紧密围绕该题的核心词汇 `target_word` 进行考察？
 标准2 (正确性): 题目的 `answer` 字段对于 `stem` 字段来说是否正确无误？
-标准3 (难度): 题目的语言难度是否适合 HSK {hsk_level} 级别的学生？
+标准3 (难度): 题目的语言难度是否适合用户给出的 HSK 级别的学生？
 标准4 (唯一性/选择题专项): 如果这是一个选择题（`options` 字段非空），是否只有一个选项（`options.text`）是明确的最佳答案，而其他选项是明确错误的？
 标准5 (翻译质量): `stem_en` 字段是否是 `stem` 字段的准确英文翻译？
 ---
+"""
 
-待评估的题目 JSON :
-{question_json}
----
-
+QUALITY_CHECK_SYSTEM = """
+你是一位严格的中文教学内容质检专家。
+你的任务是评估一个JSON格式的练习题是否符合质量标准。
+""" + QUALITY_CRITERIA + """
 请根据上述所有标准，对这个题目进行评估，并严格按照以下 JSON 格式返回你的结论：
 
-{{
+{
   "is_valid": true,
   "reason": "（如果 is_valid 为 false，请在此处用中文简要说明不合格的原因，例如：'标准4不合格：选项B和C均可视为正确答案'）"
-}}
+}
+"""
+
+QUALITY_CHECK_PROMPT = """
+学生水平：HSK {hsk_level}
+核心词汇 target_word：`{target_word}`
+
+待评估的题目 JSON :
+{question_json}
+"""
+
+
+QUALITY_CHECK_BATCH_SYSTEM = """
+你是一位严格的中文教学内容质检专家。
+你的任务是逐一评估用户给出的列表中的每一个JSON格式练习题是否符合质量标准。
+""" + QUALITY_CRITERIA + """
+请根据上述所有标准，对列表中的**每一道**题目分别进行评估，并严格按照以下 JSON 格式返回，`verdicts` 中每道题一项，`question_id` 必须与输入一致：
+
+{
+  "verdicts": [
+    {
+      "question_id": "q1",
+      "is_valid": true,
+      "reason": "（如果 is_valid 为 false，请在此处用中文简要说明不合格的原因）"
+    }
+  ]
+}
+""" + JSON_ONLY_SUFFIX
+
+QUALITY_CHECK_BATCH_PROMPT = """
+学生水平：HSK {hsk_level}
+
+待评估的题目列表 (每项包含 question_id, target_word, question):
+{questions_json}
 """
 
+
+REPAIR_QUESTIONS_SYSTEM = """
+你是一位顶级的中文教学内容设计师，你必须严格遵循 JSON 格式要求。
+
+用户会给出可参考的上下文（文章或对话），以及若干个未通过质检的题目“空位”。每个空位包含：
+空位编号 `slot_id`、核心词 `target_word`、题型 `type`、被拒绝的原题 `rejected_question`，以及质检不合格的原因 `reason`。
+**你的任务**：
+为**每一个**空位重新出**一道**同一题型的新题，只考察该空位的核心词。请针对 `reason` 修正问题，不要照抄原题。
+
+**JSON 格式定义 (V6 结构)**:
+你的输出必须是一个 JSON 对象，包含一个 "questions" 列表，每个空位一项；每道题在统一格式之外增加 `slot_id` 字段，且必须与输入一致。
+""" + QUESTION_FORMAT_SPEC + JSON_ONLY_SUFFIX
+
+REPAIR_QUESTIONS_PROMPT = """
+可参考的上下文（文章或对话）：
+---
+{passage_text}
+---
+
+学生水平：HSK {hsk_level}
+
+待重新出题的空位列表:
+{slots_json}
+"""
@@ -0,0 +1,158 @@
+# src/question_bank.py
+import random
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+from models import Question, Stimuli, OptionItem
+from config import QUESTION_BANK_ENABLED, QUESTION_BANK_TYPES, QUESTION_BANK_MAX_AGE_DAYS, QUESTION_BANK_MIN_POOL
+
+
+class QuestionBank:
+    """
+    从数据库中取出已通过质检并保存过的题目, 按 (词, HSK 级别, 题型) 复用, 只有不足的部分交给 LLM 出题。
+    候选题随机抽取; 同一 topic (scope) 内同一道题只复用一次, 不同 topic 之间可以再次抽到。
+    复用的题目分配新的 id (保存时不会与原题冲突), 已有的 audio_url 一并沿用。
+    复用题 id 按课程 (scope, lesson_id) 记录: 质检时逐题取出, finalize_lesson 或课程失败时 release_lesson() 清掉剩余部分。
+    """
+
+    def __init__(self, types: set = QUESTION_BANK_TYPES, max_age_days: float = QUESTION_BANK_MAX_AGE_DAYS,
+                 min_pool: int = QUESTION_BANK_MIN_POOL):
+        self.types = set(types)
+        self.max_age_days = max_age_days
+        self.min_pool = max(1, min_pool)
+        self.requested = 0      # 可复用题型的需求题数
+        self.served = 0         # 从题库取出的题数
+        self.words_served = 0   # 全部需求都由题库满足 (无需调用 LLM) 的词数
+        self.served_by_type: Counter = Counter()
+        self._used_sources: Dict[str, set] = defaultdict(set)  # {scope: 已复用过的原题 question_uuid}
+        # {(scope, lesson_id): 复用后尚未质检的新题目 id}, 质检时跳过 LLM 评审 (质检后移除)
+        self._reused_ids: Dict[Tuple[str, str], set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _fetch_candidates(self, words: List[str], hsk_level: int, types: set) -> Dict[Tuple[str, str], List[Any]]:
+        # 延迟导入: 未配置 DATABASE_URL 时 database 模块在导入时就会报错
+        from sqlalchemy import select
+        from database import (
+            SessionLocal, GeneratedQuestionDB, GeneratedVocabPackageDB, VocabularyDB, GeneratedLessonDB
+        )
+        stmt = (
+            select(VocabularyDB.word, GeneratedQuestionDB.type, GeneratedQuestionDB.question_uuid,
+                   GeneratedQuestionDB.stimuli, GeneratedQuestionDB.stem, GeneratedQuestionDB.stem_en,
+                   GeneratedQuestionDB.options, GeneratedQuestionDB.answer)
+            .join(GeneratedVocabPackageDB, GeneratedVocabPackageDB.vocab_package_db_id == GeneratedQuestionDB.vocab_package_db_id)
+            .join(VocabularyDB, VocabularyDB.vocab_uuid == GeneratedVocabPackageDB.vocab_uuid)
+            .join(GeneratedLessonDB, GeneratedLessonDB.lesson_db_id == GeneratedVocabPackageDB.lesson_db_id)
+            .where(VocabularyDB.word.in_(words), VocabularyDB.hsk_level == hsk_level,
+                   GeneratedQuestionDB.level == hsk_level, GeneratedQuestionDB.type.in_(types))
+        )
+        if self.max_age_days > 0:
+            stmt = stmt.where(GeneratedLessonDB.generated_at >= datetime.now(timezone.utc) - timedelta(days=self.max_age_days))
+        db = SessionLocal()
+        try:
+            rows = db.execute(stmt).all()
+        finally:
+            db.close()
+        candidates: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+        seen_stems = set()
+        for row in rows:
+            # 同一道题可能被多个课程保存过 (内容相同, uuid 不同), 按题干去重
+            if (row.word, row.type, row.stem) in seen_stems:
+                continue
+            seen_stems.add((row.word, row.type, row.stem))
+            candidates[(row.word, row.type)].append(row)
+        return candidates
+
+    @staticmethod
+    def _to_question(row: Any, hsk_level: int) -> Question:
+        return Question(
+            level=hsk_level,
+            type=row.type,
+            stimuli=Stimuli.model_validate(row.stimuli or {}),
+            stem=row.stem,
+            stem_en=row.stem_en,
+            options=[OptionItem.model_validate(opt) for opt in row.options] if row.options else None,
+            answer=row.answer
+        )
+
+    def take(self, requests: List[Tuple[str, Counter]], hsk_level: int, scope: str = "",
+             lesson_id: str = "") -> List[List[Question]]:
+        """
+        requests: [(词, {题型: 数量})]。返回与 requests 顺序一致的复用题目列表;
+        调用方按返回题目的题型从计划中扣除, 只为剩余部分调用 LLM。scope 通常为 topic 名。
+        """
+        results: List[List[Question]] = [[] for _ in requests]
+        wanted_types = {t for _, counts in requests for t, n in counts.items() if n > 0 and t in self.types}
+        if not wanted_types:
+            return results
+        candidates = self._fetch_candidates(list({word for word, _ in requests}), hsk_level, wanted_types)
+
+        with self._lock:
+            used_sources = self._used_sources[scope]
+            reused_ids = self._reused_ids[(scope, str(lesson_id))]
+            for result, (word, counts) in zip(results, requests):
+                eligible = {t: n for t, n in counts.items() if n > 0 and t in self.types}
+                for ex_type, needed in eligible.items():
+                    self.requested += needed
+                    pool = [row for row in candidates.get((word, ex_type), []) if row.question_uuid not in used_sources]
+                    if len(pool) < self.min_pool:
+                        continue
+                    for row in random.sample(pool, min(needed, len(pool))):
+                        try:
+                            q = self._to_question(row, hsk_level)
+                        except Exception as e: # 旧数据不符合当前模型时跳过该题
+                            print(f"    - WARNING: Skipping bank question {row.question_uuid} for '{word}': {e}")
+                            continue
+                        used_sources.add(row.question_uuid)
+                        reused_ids.add(q.id)
+                        result.append(q)
+                self.served += len(result)
+                self.served_by_type.update(q.type for q in result)
+                if sum(counts.values()) and len(result) == sum(counts.values()):
+                    self.words_served += 1
+        return results
+
+    def pop_reused(self, question_id: str, scope: str = "", lesson_id: str = "") -> bool:
+        """该题是否从题库复用到该课程; 每道题只在质检时查询一次, 查询后即移除。"""
+        with self._lock:
+            reused_ids = self._reused_ids.get((scope, str(lesson_id)))
+            if reused_ids is None or question_id not in reused_ids:
+                return False
+            reused_ids.discard(question_id)
+            return True
+
+    def release_lesson(self, scope: str = "", lesson_id: str = "") -> int:
+        """丢弃该课程尚未质检的复用题 id (课程结束或失败时调用), 返回丢弃的数量。"""
+        with self._lock:
+            return len(self._reused_ids.pop((scope, str(lesson_id)), ()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "served": self.served,
+                "hit_rate": round(self.served / self.requested, 3) if self.requested else 0.0,
+                "words_without_llm_call": self.words_served,
+                "served_by_type": dict(self.served_by_type),
+            }
+
+
+_question_bank: Optional[QuestionBank] = None
+_question_bank_configured = False
+_question_bank_lock = threading.Lock()
+
+def get_question_bank() -> Optional[QuestionBank]:
+    """进程内的全局题库。未开启 QUESTION_BANK_ENABLED 或数据库不可用时返回 None。"""
+    global _question_bank, _question_bank_configured
+    if not _question_bank_configured:
+        with _question_bank_lock:
+            if not _question_bank_configured:
+                if QUESTION_BANK_ENABLED:
+                    try:
+                        import database # noqa: F401 (检查 DATABASE_URL 是否可用)
+                        _question_bank = QuestionBank()
+                    except Exception as e:
+                        print(f"  - WARNING: Question bank disabled, database unavailable: {e}")
+                _question_bank_configured = True
+    return _question_bank
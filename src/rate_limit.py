@@ -0,0 +1,223 @@
+# src/rate_limit.py
+import time
+import random
+import asyncio
+import threading
+import multiprocessing
+from typing import Optional, Dict, Any
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_RATE_LIMIT_QPS, LLM_RATE_LIMIT_TPM, LLM_RATE_LIMIT_OUTPUT_ESTIMATE,
+    LLM_AIMD_ENABLED, LLM_AIMD_MIN_WINDOW, LLM_AIMD_MAX_WINDOW, LLM_AIMD_DECREASE_COOLDOWN,
+    LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+)
+
+
+class RateLimiter:
+    """
+    QPS (每秒请求数) + TPM (每分钟 token 数) 双令牌桶。
+    桶状态放在 multiprocessing 共享内存中: 同一个 RateLimiter 通过 ProcessPoolExecutor 的
+    initializer 传给各个工作进程后, 所有进程的 LLM 调用共用同一份额度 (进程内多线程同样适用)。
+    共享内存和锁只能在创建进程时传递 (initializer 参数), 不能作为任务参数提交。
+    """
+
+    def __init__(self, qps: float = LLM_RATE_LIMIT_QPS, tpm: float = LLM_RATE_LIMIT_TPM):
+        self.qps = qps
+        self.tpm = tpm
+        # 容量: 请求桶允许 1 秒的突发, token 桶允许 1 分钟的突发
+        self.request_capacity = max(1.0, qps)
+        self.token_capacity = max(1.0, tpm)
+        self._lock = multiprocessing.Lock()
+        # [剩余请求数, 剩余 token 数, 上次补充时间 (time.time, 跨进程一致)]
+        self._state = multiprocessing.RawArray("d", [self.request_capacity, self.token_capacity, time.time()])
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._state[2])
+        self._state[2] = now
+        if self.qps > 0:
+            self._state[0] = min(self.request_capacity, self._state[0] + elapsed * self.qps)
+        if self.tpm > 0:
+            self._state[1] = min(self.token_capacity, self._state[1] + elapsed * self.tpm / 60.0)
+
+    def try_acquire(self, tokens: int) -> float:
+        """尝试扣除 1 个请求和 tokens 个 token。成功返回 0, 否则返回建议等待的秒数 (不扣除)。"""
+        tokens = min(float(tokens), self.token_capacity) # 超大请求最多等满一个桶, 避免永远等待
+        with self._lock:
+            self._refill(time.time())
+            wait = 0.0
+            if self.qps > 0 and self._state[0] < 1.0:
+                wait = max(wait, (1.0 - self._state[0]) / self.qps)
+            if self.tpm > 0 and self._state[1] < tokens:
+                wait = max(wait, (tokens - self._state[1]) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.qps > 0:
+                self._state[0] -= 1.0
+            if self.tpm > 0:
+                self._state[1] -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int) -> float:
+        """阻塞直到拿到额度, 返回等待的总秒数。"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """按实际 usage 修正预扣的 token (可以变为负数, 之后的请求相应多等)。"""
+        if self.tpm <= 0 or actual_tokens is None:
+            return
+        with self._lock:
+            self._state[1] = min(self.token_capacity, self._state[1] + min(float(estimated_tokens), self.token_capacity) - actual_tokens)
+
+
+def estimate_tokens(messages: list[dict], output_estimate: int = LLM_RATE_LIMIT_OUTPUT_ESTIMATE) -> int:
+    """粗略预估: 中文约 1 字 1 token, 英文偏高估计也无妨 (settle 时会按实际 usage 修正)。"""
+    return sum(len(m.get("content") or "") for m in messages) + output_estimate
+
+
+def usage_tokens(usage) -> Optional[int]:
+    """从 DashScope 返回的 usage (对象或字典) 中取 input_tokens + output_tokens。"""
+    if not usage:
+        return None
+    get = usage.get if isinstance(usage, dict) else (lambda k, d=None: getattr(usage, k, d))
+    try:
+        total = get("total_tokens", None)
+        if total is None:
+            total = (get("input_tokens", 0) or 0) + (get("output_tokens", 0) or 0)
+        return int(total)
+    except (TypeError, ValueError):
+        return None
+
+
+def usage_prompt_tokens(usage) -> tuple[int, int]:
+    """
+    从 usage 中取 (输入 token 数, 命中服务端前缀缓存的输入 token 数)。
+    缓存命中数在 prompt_tokens_details.cached_tokens (DashScope 与 OpenAI 兼容格式相同), 没有时记为 0。
+    """
+    if not usage:
+        return 0, 0
+    get = lambda obj, k: (obj.get(k) if isinstance(obj, dict) else getattr(obj, k, None)) if obj is not None else None
+    try:
+        input_tokens = int(get(usage, "input_tokens") or get(usage, "prompt_tokens") or 0)
+        cached = int(get(get(usage, "prompt_tokens_details"), "cached_tokens") or 0)
+    except (TypeError, ValueError):
+        return 0, 0
+    return input_tokens, cached
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_configured = False
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """进程内的全局限流器。未配置 QPS/TPM 时返回 None (不限流)。"""
+    global _rate_limiter, _rate_limiter_configured
+    if not _rate_limiter_configured:
+        with _rate_limiter_lock:
+            if not _rate_limiter_configured:
+                if LLM_RATE_LIMIT_QPS > 0 or LLM_RATE_LIMIT_TPM > 0:
+                    _rate_limiter = RateLimiter(LLM_RATE_LIMIT_QPS, LLM_RATE_LIMIT_TPM)
+                _rate_limiter_configured = True
+    return _rate_limiter
+
+def install_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """替换进程内的全局限流器 (批量运行时由工作进程的 initializer 装入父进程创建的共享限流器)。"""
+    global _rate_limiter, _rate_limiter_configured
+    _rate_limiter = limiter
+    _rate_limiter_configured = True
+
+
+
+class AIMDConcurrencyLimiter:
+    """
+    进程内的自适应并发窗口 (AIMD)。同时在途的 LLM 请求数不超过 int(window):
+      - 成功: window += 1 / window (大约每一轮窗口的请求成功后 +1)
+      - 限流 (429 / Throttling): window *= 0.5, 冷却期内只减一次 (同一波突发的多个 429 不会连续减半)
+    瞬时错误和永久错误不调整窗口。
+    """
+
+    def __init__(self, initial: float = LLM_MAX_CONCURRENCY, min_window: float = LLM_AIMD_MIN_WINDOW,
+                 max_window: float = LLM_AIMD_MAX_WINDOW, decrease_factor: float = 0.5,
+                 cooldown_seconds: float = LLM_AIMD_DECREASE_COOLDOWN):
+        self.min_window = max(1.0, min_window)
+        self.max_window = max(self.min_window, max_window)
+        self.window = min(self.max_window, max(self.min_window, float(initial)))
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.decreases = 0
+        self.min_seen = self.window
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.window):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """不等待: 窗口已满时返回 False (用于对冲请求这类可以放弃的额外调用)。"""
+        with self._cond:
+            if self.in_flight >= int(self.window):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: str) -> None:
+        """outcome: success | throttle | transient | permanent | cancelled (未发出请求, 不调整窗口)"""
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.successes += 1
+                self.window = min(self.max_window, self.window + 1.0 / self.window)
+            elif outcome == "throttle":
+                self.throttles += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown_seconds:
+                    self.window = max(self.min_window, self.window * self.decrease_factor)
+                    self.min_seen = min(self.min_seen, self.window)
+                    self.decreases += 1
+                    self._last_decrease = now
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"window": round(self.window, 2), "min_window_seen": round(self.min_seen, 2),
+                    "in_flight": self.in_flight, "successes": self.successes,
+                    "throttles": self.throttles, "decreases": self.decreases}
+
+
+_concurrency_limiter: Optional[AIMDConcurrencyLimiter] = None
+
+def get_concurrency_limiter() -> Optional[AIMDConcurrencyLimiter]:
+    """进程内的 AIMD 并发窗口; LLM_AIMD_ENABLED=0 时返回 None。"""
+    global _concurrency_limiter
+    if LLM_AIMD_ENABLED and _concurrency_limiter is None:
+        with _rate_limiter_lock:
+            if _concurrency_limiter is None:
+                _concurrency_limiter = AIMDConcurrencyLimiter()
+    return _concurrency_limiter
+
+
+def backoff_delay(attempt: int, kind: str, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """第 attempt 次 (从 0 开始) 失败后的等待秒数: 指数退避 + full jitter。限流错误至少等待 base。"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if kind == "throttle":
+        delay = max(delay, min(cap, base))
+    return delay
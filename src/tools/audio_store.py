@@ -0,0 +1,130 @@
+# src/tools/audio_store.py
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+AUDIO_SUBDIR = "audio"
+
+
+@dataclass(frozen=True)
+class VoiceSettings:
+    voice: str = os.getenv("TTS_VOICE", "default")
+    speed: float = float(os.getenv("TTS_SPEED", "1.0"))
+    audio_format: str = "mp3"
+
+
+def normalize_tts_text(text: str) -> str:
+    """全角/半角统一 (NFKC) 并压缩空白, 使仅格式不同的文本得到同一个 key。"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class AudioStore:
+    """
+    内容寻址的本地音频库: 文件名 = sha256(规范化文本 + 音色设置)。
+    合成前先查已有文件; 同一 key 并发请求只合成一次。
+    audio_url 形如 "audio/<key>.mp3", 文件位于 MEDIA_ROOT/audio/ 下。
+    """
+
+    def __init__(self, root: str = MEDIA_ROOT, voice: VoiceSettings = VoiceSettings()):
+        self.root = Path(root)
+        self.audio_dir = self.root / AUDIO_SUBDIR
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self.voice = voice
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def key_for(self, text: str) -> str:
+        raw = json.dumps([normalize_tts_text(text), asdict(self.voice)], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def url_for_key(self, key: str) -> str:
+        return f"{AUDIO_SUBDIR}/{key}.{self.voice.audio_format}"
+
+    def path_for_url(self, audio_url: str) -> Path:
+        return self.root / audio_url
+
+    def get_or_synthesize(self, text: str, synthesize: Callable[[str, VoiceSettings], bytes]) -> str:
+        key = self.key_for(text)
+        audio_url = self.url_for_key(key)
+        path = self.path_for_url(audio_url)
+
+        with self._lock:
+            try:
+                # (修复) 命中时刷新 mtime: collect_garbage 按 mtime 保留近期文件, 正在使用的音频不会被当作旧文件删除
+                os.utime(path)
+                self.hits += 1
+                return audio_url
+            except FileNotFoundError:
+                pass # 未合成过 (或刚被清理), 按未命中处理
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1 # 相同文本正在合成, 等待其结果即可
+
+        if not owner:
+            return future.result()
+
+        try:
+            data = synthesize(normalize_tts_text(text), self.voice)
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path) # 原子落盘, 避免读到半个文件
+            future.set_result(audio_url)
+            return audio_url
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def collect_garbage(self, reference_counts: Dict[str, int], min_age_seconds: float = 3600, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        删除引用计数为 0 的音频文件。reference_counts 为 {audio_url: 引用该音频的题目数}
+        (见 database.audio_reference_counts)。min_age_seconds 内写入或命中过的文件保留, 避免误删正在运行中的课程的音频。
+        """
+        now = time.time()
+        removed, kept, freed = 0, 0, 0
+        for path in self.audio_dir.glob(f"*.{self.voice.audio_format}"):
+            audio_url = f"{AUDIO_SUBDIR}/{path.name}"
+            stat = path.stat()
+            if reference_counts.get(audio_url, 0) > 0 or now - stat.st_mtime < min_age_seconds:
+                kept += 1
+                continue
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+        return {"removed": removed, "kept": kept, "freed_bytes": freed, "dry_run": dry_run}
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_audio_store: Optional[AudioStore] = None
+_audio_store_lock = threading.Lock()
+
+def get_audio_store() -> AudioStore:
+    global _audio_store
+    if _audio_store is None:
+        with _audio_store_lock:
+            if _audio_store is None:
+                _audio_store = AudioStore()
+    return _audio_store
@@ -1,17 +1,132 @@
-import hashlib
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional, Any, List
+from config import TTS_MAX_WORKERS
+from tools.audio_store import get_audio_store, VoiceSettings
 
 TTS_BASE_LATENCY_SECONDS = 0.2  # 模拟 API 调用的基础网络延迟
 TTS_SECONDS_PER_CHAR = 0.05     # 模拟每生成一个字符的语音所需时间
 
-def generate_audio_placeholder(text: str) -> str:
+def synthesize_placeholder(text: str, voice: VoiceSettings) -> bytes:
+    """模拟 TTS 引擎: 按文本长度阻塞, 返回占位音频内容。"""
 
     simulated_duration = TTS_BASE_LATENCY_SECONDS + (len(text) * TTS_SECONDS_PER_CHAR)
-    
+
     time.sleep(simulated_duration)
-    
-    timestamp = int(time.time() * 1000)
-    hash_object = hashlib.md5(f"{text}{timestamp}".encode())
-    unique_id = hash_object.hexdigest()[:8]
-    
-    return f"audio/{unique_id}.mp3"
\ No newline at end of file
+
+    return f"PLACEHOLDER AUDIO voice={voice.voice} speed={voice.speed}\n{text}".encode("utf-8")
+
+def generate_audio_placeholder(text: str) -> str:
+    """
+    (修改) 返回内容寻址的 audio_url: 相同文本 (规范化后) + 相同音色只合成一次,
+    之后直接复用音频库中的已有文件。
+    """
+    return get_audio_store().get_or_synthesize(text, synthesize_placeholder)
+
+
+def tts_group_for(topic: str, lesson_id) -> str:
+    """课程的 TTS 任务组键: 同一进程中可能同时运行多个 topic (lesson_id 会重复), 因此带上 topic。"""
+    return f"{topic}|{lesson_id}"
+
+
+def audio_text_for(q_type: str, stimuli_text: Optional[str], stem: Optional[str]) -> str:
+    """听力题合成 stimuli.text, 跟读题合成 stem, 其余题型不需要音频。"""
+    if q_type in ("listen_choice", "listen_tf"):
+        return stimuli_text or ""
+    if q_type == "speak_follow":
+        return stem or ""
+    return ""
+
+
+class TTSJobQueue:
+    """
+    TTS 合成任务队列: 出题节点解析出题目后立即提交, 合成在独立线程池中进行,
+    与后续单词的 LLM 调用重叠; finalize_lesson 按课程 (group) 收集结果并写回 audio_url。
+    """
+
+    def __init__(self, max_workers: int = TTS_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-worker")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Future] = {}
+        self._groups: Dict[str, List[str]] = {}
+        self._metrics: List[Dict[str, float]] = []
+
+    def _run(self, text: str, submitted_at: float) -> str:
+        started_at = time.perf_counter()
+        audio_url = generate_audio_placeholder(text)
+        finished_at = time.perf_counter()
+        with self._lock:
+            self._metrics.append({
+                "queue_wait": started_at - submitted_at,
+                "synthesis": finished_at - started_at,
+                "chars": len(text),
+            })
+        return audio_url
+
+    def submit(self, job_id: str, text: str, group: Optional[str] = None) -> Future:
+        future = self._executor.submit(self._run, text, time.perf_counter())
+        with self._lock:
+            self._jobs[job_id] = future
+            if group is not None:
+                self._groups.setdefault(group, []).append(job_id)
+        return future
+
+    def result(self, job_id: str, text: Optional[str] = None, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        取回任务结果 (阻塞直到合成完成, 最多 timeout 秒, 超时抛出 concurrent.futures.TimeoutError)。
+        找不到任务时 (例如从检查点恢复后), 若提供 text 则现在提交到线程池合成, 同样受 timeout 约束。
+        """
+        with self._lock:
+            future = self._jobs.pop(job_id, None)
+        if future is None:
+            if not text:
+                return None
+            future = self._executor.submit(self._run, text, time.perf_counter())
+        return future.result(timeout=timeout)
+
+    def release_group(self, group: str) -> int:
+        """丢弃该课程中未被取回的任务 (例如质检淘汰的题目), 尚未开始的任务会被取消。返回丢弃数量。"""
+        with self._lock:
+            job_ids = self._groups.pop(group, [])
+            leftovers = [self._jobs.pop(job_id) for job_id in job_ids if job_id in self._jobs]
+        for future in leftovers:
+            future.cancel()
+        return len(leftovers)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._metrics)
+            pending = len(self._jobs)
+        if not samples:
+            return {"jobs": 0, "pending": pending}
+
+        def pct(values: List[float], p: float) -> float:
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        waits = [m["queue_wait"] for m in samples]
+        synth = [m["synthesis"] for m in samples]
+        return {
+            "jobs": len(samples),
+            "audio_store": get_audio_store().stats(),
+            "pending": pending,
+            "chars": int(sum(m["chars"] for m in samples)),
+            "synthesis_total_s": round(sum(synth), 3),
+            "synthesis_p50_s": pct(synth, 0.5),
+            "synthesis_p95_s": pct(synth, 0.95),
+            "queue_wait_p50_s": pct(waits, 0.5),
+            "queue_wait_p95_s": pct(waits, 0.95),
+        }
+
+
+_tts_queue: Optional[TTSJobQueue] = None
+_tts_queue_lock = threading.Lock()
+
+def get_tts_queue() -> TTSJobQueue:
+    global _tts_queue
+    if _tts_queue is None:
+        with _tts_queue_lock:
+            if _tts_queue is None:
+                _tts_queue = TTSJobQueue()
+    return _tts_queue
@@ -0,0 +1,70 @@
+# src/utils/concurrency.py
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+from config import LLM_MAX_CONCURRENCY
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_shared_executor() -> ThreadPoolExecutor:
+    """
+    所有节点共享的 LLM 工作线程池 (大小 = LLM_MAX_CONCURRENCY)。
+    并行课程模式下多个课程共用这一个池, 因此它同时也是进程内 LLM 并发的全局上限。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm-worker")
+    return _executor
+
+
+def map_ordered(func: Callable[[T], R], items: Iterable[T], max_concurrency: Optional[int] = None) -> List[R]:
+    """
+    在共享线程池中并发执行 func(item), 同一时刻最多 max_concurrency 个在途任务。
+    返回值顺序与 items 一致 (与完成顺序无关), 保证输出确定性。
+    每个任务在调用方 contextvars 上下文的副本中运行 (课程时间预算等随之传入工作线程)。
+    任一任务抛出的异常会在其余在途任务结束后原样抛出; 需要逐项记错的调用方应在 func 内部自行捕获。
+    """
+    items = list(items)
+    limit = max(1, min(max_concurrency or LLM_MAX_CONCURRENCY, len(items) or 1))
+    if limit == 1:
+        return [func(item) for item in items]
+
+    executor = get_shared_executor()
+    results: List[Optional[R]] = [None] * len(items)
+    pending = {}
+    next_index = 0
+    first_error: Optional[BaseException] = None
+
+    def submit_next() -> None:
+        nonlocal next_index
+        if next_index < len(items) and first_error is None:
+            ctx = contextvars.copy_context()
+            pending[executor.submit(ctx.run, func, items[next_index])] = next_index
+            next_index += 1
+
+    for _ in range(limit):
+        submit_next()
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx = pending.pop(future)
+            try:
+                results[idx] = future.result()
+            except BaseException as e:
+                if first_error is None:
+                    first_error = e
+            submit_next()
+
+    if first_error is not None:
+        raise first_error
+    return results
@@ -0,0 +1,128 @@
+# src/utils/exercise_planner.py
+"""
+课程级出题计划 (纯 Python, 不调用 LLM)。
+在出题前把 question_num、课程的 skill_distribution 和每个词的 skill_distribution 换算成确定的计划:
+  1. 课程题量 = Stage2Input.question_num (每课); question_num <= 0 时取技能分布之和
+  2. 按课程 skill_distribution 的比例把题量分给各技能 (最大余数法; 课程未给出技能分布时用各词分布之和),
+     分布之和与 question_num 不一致 (需要缩放) 时打印提示
+  3. 每个技能的题量按各词在该技能上的权重分给词 (没有词需要该技能时平均分给所有词)
+  4. 每个技能内按题型轮转分配 (起点随机), 整课的题型分布均衡
+随机性只来自 seed (默认由 topic 和 lesson_id 推导), 同一输入总是得到同一计划, 断点续跑时也不会变化。
+"""
+import hashlib
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+from models import LessonInput
+from config import SKILL_TO_EXERCISE_MAP, EXERCISE_PLAN_SEED
+
+
+@dataclass
+class ExercisePlan:
+    lesson_id: str
+    seed: int
+    target: int
+    skills: Dict[str, int]
+    words: Dict[str, Counter] = field(default_factory=dict) # {word_id: {题型: 数量}}
+    word_names: Dict[str, str] = field(default_factory=dict)
+
+    def for_word(self, word_id) -> Counter:
+        return Counter(self.words.get(str(word_id)) or {})
+
+    @property
+    def types(self) -> Counter:
+        total: Counter = Counter()
+        for counts in self.words.values():
+            total.update(counts)
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lesson_id": self.lesson_id,
+            "seed": self.seed,
+            "target": self.target,
+            "skills": dict(self.skills),
+            "types": dict(self.types),
+            "words": {word_id: {"word": self.word_names.get(word_id, ""), "exercises": dict(counts)}
+                      for word_id, counts in self.words.items() if counts},
+        }
+
+
+def apportion(total: int, weights: Dict[str, float], rng: random.Random) -> Dict[str, int]:
+    """最大余数法: 按权重把 total 分成整数份, 余数相同时由 rng 决定先后。"""
+    result = {key: 0 for key in weights}
+    weight_sum = sum(w for w in weights.values() if w > 0)
+    if total <= 0 or weight_sum <= 0:
+        return result
+    exact = {key: total * max(0.0, w) / weight_sum for key, w in weights.items()}
+    for key, value in exact.items():
+        result[key] = math.floor(value)
+    tie_breaks = {key: rng.random() for key in weights}
+    order = sorted(weights, key=lambda key: (-(exact[key] - result[key]), tie_breaks[key]))
+    for key in order[:total - sum(result.values())]:
+        result[key] += 1
+    return result
+
+
+def default_seed(topic: str, lesson_id) -> int:
+    if EXERCISE_PLAN_SEED is not None:
+        return EXERCISE_PLAN_SEED
+    return int(hashlib.sha1(f"{topic}|{lesson_id}".encode("utf-8")).hexdigest()[:8], 16)
+
+
+def plan_lesson(lesson: LessonInput, question_num: int, topic: str = "", seed: Optional[int] = None) -> ExercisePlan:
+    seed = default_seed(topic, lesson.lesson_id) if seed is None else seed
+    rng = random.Random(seed)
+    words = lesson.related_vocabulary
+    # 同一 word_id 重复出现时合并为一个词 (技能权重相加), 只出一份题
+    word_keys = list(dict.fromkeys(str(v.word_id) for v in words))
+
+    # 只考虑有可用题型的技能; 课程未给出技能分布时使用各词分布之和
+    skill_weights = {s: n for s, n in lesson.skill_distribution.items() if n > 0 and SKILL_TO_EXERCISE_MAP.get(s)}
+    if not skill_weights:
+        summed: Counter = Counter()
+        for v in words:
+            summed.update({s: n for s, n in v.skill_distribution.items() if n > 0 and SKILL_TO_EXERCISE_MAP.get(s)})
+        skill_weights = dict(summed)
+    target = sum(skill_weights.values())
+    if question_num and question_num > 0:
+        if question_num != target:
+            print(f"  - Plan for lesson {lesson.lesson_id}: skill distribution ({target} questions) "
+                  f"rescaled to question_num={question_num}.")
+        target = question_num
+    skills = apportion(target, skill_weights, rng) if words else {}
+
+    plan = ExercisePlan(lesson_id=str(lesson.lesson_id), seed=seed, target=target, skills=skills,
+                        words={key: Counter() for key in word_keys},
+                        word_names={str(v.word_id): v.word for v in reversed(words)})
+    for skill, quota in skills.items():
+        if quota <= 0:
+            continue
+        word_weights = {key: 0 for key in word_keys}
+        for v in words:
+            word_weights[str(v.word_id)] += max(0, v.skill_distribution.get(skill, 0))
+        if not any(w > 0 for w in word_weights.values()):
+            word_weights = {key: 1 for key in word_keys}
+        per_word = apportion(quota, word_weights, rng)
+        # 题型在整课范围内轮转, 各题型数量最多相差 1
+        types = list(SKILL_TO_EXERCISE_MAP[skill])
+        pointer = rng.randrange(len(types))
+        for key in word_keys:
+            for _ in range(per_word.get(key, 0)):
+                plan.words[key][types[pointer % len(types)]] += 1
+                pointer += 1
+    return plan
+
+
+def trim_to_plan(questions: List[Any], counts: Counter) -> List[Any]:
+    """只保留计划内的题目: 每种题型最多保留计划的数量, 计划外的题型丢弃 (不会被质检评审)。"""
+    remaining = Counter(counts)
+    kept = []
+    for q in questions:
+        if remaining.get(q.type, 0) > 0:
+            remaining[q.type] -= 1
+            kept.append(q)
+    return kept
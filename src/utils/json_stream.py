@@ -0,0 +1,82 @@
+# src/utils/json_stream.py
+import json
+from typing import Any, Dict, List, Optional
+
+
+class JsonArrayStream:
+    """
+    增量解析 {"<key>": [ {...}, {...}, ... ]} 形式的 LLM 输出。
+    feed() 接收文本片段, 返回本次新闭合的数组元素 (dict); 元素之外的内容 (如 ```json 代码块标记) 被忽略。
+    只跟踪括号深度、字符串和转义, 不做完整的 JSON 校验: 最终结果仍应以完整文本的解析为准。
+    """
+
+    def __init__(self, key: str = "questions"):
+        self.key = key
+        self.reset()
+
+    def reset(self) -> None:
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_chars: List[str] = []
+        self._last_key: Optional[str] = None
+        self._in_target = False          # 当前位于 key 对应的数组中
+        self._item: Optional[List[str]] = None # 正在读取的元素文本
+        self.items_emitted = 0
+        self.items_failed = 0            # 括号闭合但 json.loads 失败的元素
+        self.complete = False            # 顶层对象已闭合
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        emitted: List[Dict[str, Any]] = []
+        for ch in text:
+            if self._item is not None:
+                self._item.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = "".join(self._string_chars)
+                elif len(self._stack) == 1:
+                    self._string_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_chars = []
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1 and self._last_key == self.key:
+                    self._in_target = True
+                elif ch == "{" and self._in_target and len(self._stack) == 2:
+                    self._item = [ch]
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if self._item is not None and len(self._stack) == 2:
+                    item = self._close_item()
+                    if item is not None:
+                        emitted.append(item)
+                elif len(self._stack) == 1:
+                    self._in_target = False
+                elif not self._stack:
+                    self.complete = True
+        return emitted
+
+    def _close_item(self) -> Optional[Dict[str, Any]]:
+        raw, self._item = "".join(self._item), None
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            self.items_failed += 1
+            return None
+        if not isinstance(item, dict):
+            self.items_failed += 1
+            return None
+        self.items_emitted += 1
+        return item
@@ -0,0 +1,87 @@
+# src/utils/pinyin_annotator.py
+"""
+本地拼音标注, 代替让 LLM 输出 pinyin 字段 (省去内容和出题调用约一半的输出 token, 格式也统一):
+  - 汉字片段按 pypinyin 的词典分词, 多音字按词整体查音 (如 银行 yín háng / 行走 xíng zǒu)
+  - 带声调符号, 音节之间用一个空格
+  - 中文标点转换为对应的英文标点 (标点前不留空格, 标点后留一个空格); 字母、数字原样保留, 换行保留
+  - 按词缓存 (lru_cache), 课文和题目中反复出现的词只查一次
+pypinyin 为可选依赖: 未安装时 to_pinyin() 返回 None, 调用方保持字段原值。
+"""
+import re
+import functools
+from typing import List, Optional, Tuple
+
+from config import PINYIN_CACHE_SIZE
+
+try:
+    from pypinyin import pinyin as _pinyin, Style
+    from pypinyin.seg.mmseg import seg as _segmenter
+except ImportError: # 可选依赖
+    _pinyin = None
+
+HAN_PATTERN = re.compile(r"[㐀-䶿一-鿿]+")
+# 非汉字部分的切分: 换行 / 其他空白 / 省略号、破折号 / 字母数字串 / 单个字符
+_OTHER_TOKEN = re.compile(r"\n|\s+|……|——|[A-Za-z0-9]+(?:[.,:][0-9]+)*|.")
+
+_PUNCTUATION = {
+    "，": ",", "。": ".", "！": "!", "？": "?", "：": ":", "；": ";", "、": ",",
+    "“": '"', "”": '"', "‘": "'", "’": "'", "（": "(", "）": ")", "《": "<", "》": ">",
+    "「": '"', "」": '"', "『": "'", "』": "'", "【": "[", "】": "]",
+    "……": "...", "——": "-", "～": "~", "·": "·",
+}
+# 左侧标点: 前面留空格, 后面不留; 其余标点前面不留空格
+_OPENING = set("“‘（《「『【([")
+
+
+def is_available() -> bool:
+    return _pinyin is not None
+
+
+@functools.lru_cache(maxsize=PINYIN_CACHE_SIZE)
+def word_pinyin(word: str) -> str:
+    """一个词 (分词结果) 的拼音, 音节之间用空格分隔。"""
+    return " ".join(syllables[0] for syllables in _pinyin(word, style=Style.TONE, errors="ignore") if syllables)
+
+
+def _tokens(text: str) -> List[Tuple[str, bool, bool]]:
+    # (拼音或标点, 前面不留空格, 后面不留空格)
+    tokens: List[Tuple[str, bool, bool]] = []
+    position = 0
+    for match in HAN_PATTERN.finditer(text):
+        tokens.extend(_other_tokens(text[position:match.start()]))
+        tokens.extend((word_pinyin(word), False, False) for word in _segmenter.cut(match.group()))
+        position = match.end()
+    tokens.extend(_other_tokens(text[position:]))
+    return tokens
+
+
+def _other_tokens(text: str) -> List[Tuple[str, bool, bool]]:
+    tokens = []
+    for token in _OTHER_TOKEN.findall(text):
+        if token == "\n":
+            tokens.append(("\n", True, True))
+        elif token.isspace():
+            continue # 空格由拼接规则统一处理
+        elif token in _OPENING:
+            tokens.append((_PUNCTUATION.get(token, token), False, True))
+        elif token in _PUNCTUATION or not token[0].isalnum():
+            tokens.append((_PUNCTUATION.get(token, token), True, False))
+        else:
+            tokens.append((token, False, False))
+    return tokens
+
+
+def to_pinyin(text: Optional[str]) -> Optional[str]:
+    """文本的拼音标注; 文本不含汉字或未安装 pypinyin 时返回 None。"""
+    if not text or _pinyin is None or not HAN_PATTERN.search(text):
+        return None
+    result = ""
+    glue = True # 行首不加空格
+    for token, attach_left, attach_right in _tokens(text):
+        if not token:
+            continue
+        if result and not glue and not attach_left:
+            result += " "
+        result += token
+        glue = attach_right
+    return result.strip()
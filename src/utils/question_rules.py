@@ -0,0 +1,175 @@
+# src/utils/question_rules.py
+"""
+题目结构校验规则引擎 (纯 Python, 不调用 LLM)。
+在 LLM Judge 之前运行: 能自动修复的直接修复, 结构性错误直接拒绝, 从而省掉对应的评审调用。
+"""
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from models import Question
+from config import ALL_EXERCISE_TYPES
+
+CHOICE_TYPES = frozenset({"listen_choice", "read_choice"})
+TF_TYPES = frozenset({"listen_tf", "read_tf"})
+LISTEN_TYPES = frozenset({"listen_choice", "listen_tf"})
+OPEN_ANSWER_TYPES = frozenset({"write_word", "translate_c2e", "translate_e2c", "read_fillblank"})
+# 不要求题干/材料中出现目标词的题型
+WORD_OPTIONAL_TYPES = frozenset({"write_word", "speak_follow", "translate_c2e", "translate_e2c"})
+ALL_TYPES = frozenset(ALL_EXERCISE_TYPES)
+
+TRUE_TOKENS = {"true", "t", "正确", "对", "是", "yes", "correct", "√"}
+FALSE_TOKENS = {"false", "f", "错误", "错", "否", "不对", "no", "incorrect", "wrong", "×"}
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    types: FrozenSet[str]                               # 适用题型
+    check: Callable[[Question, Sequence[str]], Optional[str]]  # 返回拒绝原因, None 表示通过
+    fix: Optional[Callable[[Question], bool]] = None   # 在 check 之前尝试就地修复, 返回是否修改了题目
+
+
+# =============== 修复函数 ===============
+def _to_bool(value) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        token = value.strip().lower()
+        if token in TRUE_TOKENS:
+            return True
+        if token in FALSE_TOKENS:
+            return False
+    return None
+
+def fix_tf_answer(q: Question) -> bool:
+    if isinstance(q.answer, bool):
+        return False
+    coerced = _to_bool(q.answer)
+    if coerced is None and isinstance(q.answer, str) and q.options:
+        # 例如 answer="A" 且选项 A 的文本为 "正确"
+        for opt in q.options:
+            if opt.id.strip().upper() == q.answer.strip().upper():
+                coerced = _to_bool(opt.text)
+                break
+    if coerced is None:
+        return False
+    q.answer = coerced
+    return True
+
+def fix_choice_answer(q: Question) -> bool:
+    if not q.options:
+        return False
+    answer = q.answer
+    if isinstance(answer, list) and len(answer) == 1:
+        answer = answer[0]
+    if not isinstance(answer, str):
+        return False
+    ids = {opt.id for opt in q.options}
+    if answer in ids:
+        if answer is q.answer:
+            return False
+        q.answer = answer
+        return True
+    normalized = answer.strip().rstrip(".。)）").lstrip("(（").upper()
+    for opt in q.options:
+        if opt.id.strip().upper() == normalized or opt.text.strip() == answer.strip():
+            q.answer = opt.id
+            return True
+    return False
+
+
+# =============== 检查函数 ===============
+def check_type(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    return None if q.type in ALL_TYPES else f"Invalid type '{q.type}'"
+
+def check_stem(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    return None if q.stem and q.stem.strip() else "Empty stem"
+
+def check_target_word(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    words = [w for w in target_words if w]
+    in_stimuli = q.stimuli and q.stimuli.text and any(w in q.stimuli.text for w in words)
+    in_stem = q.stem and any(w in q.stem for w in words)
+    return None if in_stimuli or in_stem else "Target word not in stimuli or stem"
+
+def check_listen_stimuli(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    return None if q.stimuli and q.stimuli.text and q.stimuli.text.strip() else "Listening question without stimuli text"
+
+def check_min_options(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    return None if q.options and len(q.options) >= 2 else f"Choice question with {len(q.options or [])} options"
+
+def check_unique_option_ids(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    ids = [opt.id.strip() for opt in q.options or []]
+    return None if len(ids) == len(set(ids)) else "Duplicate option ids"
+
+def check_unique_option_texts(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    texts = [opt.text.strip() for opt in q.options or []]
+    return None if len(texts) == len(set(texts)) else "Duplicate option texts"
+
+def check_answer_in_options(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    if not q.options:
+        return None # 非选择形式的填空题等, 由 check_answer_present 负责
+    return None if q.answer in {opt.id for opt in q.options} else f"Answer {q.answer!r} is not one of the option ids"
+
+def check_tf_answer(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    return None if isinstance(q.answer, bool) else f"True/false answer {q.answer!r} is not a boolean"
+
+def check_answer_present(q: Question, target_words: Sequence[str]) -> Optional[str]:
+    if q.answer is None or (isinstance(q.answer, str) and not q.answer.strip()):
+        return "Missing answer"
+    return None
+
+
+# =============== 规则注册表 (按顺序执行, 首个拒绝即停止) ===============
+RULES: List[Rule] = [
+    Rule("unknown_type", frozenset(), check_type),
+    Rule("empty_stem", ALL_TYPES, check_stem),
+    Rule("target_word_missing", ALL_TYPES - WORD_OPTIONAL_TYPES, check_target_word),
+    Rule("listen_without_stimuli", LISTEN_TYPES, check_listen_stimuli),
+    Rule("too_few_options", CHOICE_TYPES, check_min_options),
+    Rule("duplicate_option_ids", CHOICE_TYPES | {"read_fillblank"}, check_unique_option_ids),
+    Rule("duplicate_option_texts", CHOICE_TYPES | {"read_fillblank"}, check_unique_option_texts),
+    Rule("answer_not_in_options", CHOICE_TYPES | {"read_fillblank"}, check_answer_in_options, fix=fix_choice_answer),
+    Rule("tf_answer_not_bool", TF_TYPES, check_tf_answer, fix=fix_tf_answer),
+    Rule("missing_answer", OPEN_ANSWER_TYPES, check_answer_present),
+]
+
+def rules_for(q_type: str) -> List[Rule]:
+    if q_type not in ALL_TYPES:
+        return [RULES[0]]
+    return [rule for rule in RULES if q_type in rule.types]
+
+
+# =============== 统计 ===============
+_stats_lock = threading.Lock()
+_global_stats: Counter = Counter()
+
+def record_stats(stats: Counter) -> None:
+    with _stats_lock:
+        _global_stats.update(stats)
+
+def get_rule_stats() -> Dict[str, int]:
+    """进程内累计的规则命中次数: rejected.<rule> / fixed.<rule> / checked / passed。"""
+    with _stats_lock:
+        return dict(_global_stats)
+
+
+def validate_question(q: Question, target_words: Sequence[str], stats: Optional[Counter] = None) -> Tuple[bool, Optional[str]]:
+    """
+    对题目执行适用的结构规则 (可能就地修复 q)。target_words 为目标词的原形/清洗后形式。
+    返回 (是否通过, 拒绝时的 "rule: reason")。
+    """
+    if stats is not None:
+        stats["checked"] += 1
+    for rule in rules_for(q.type):
+        if rule.fix is not None and rule.fix(q) and stats is not None:
+            stats[f"fixed.{rule.name}"] += 1
+        reason = rule.check(q, target_words)
+        if reason:
+            if stats is not None:
+                stats[f"rejected.{rule.name}"] += 1
+            return False, f"{rule.name}: {reason}"
+    if stats is not None:
+        stats["passed"] += 1
+    return True, None
@@ -5,4 +5,59 @@ def clean_word(word: str) -> str:
     match = re.search(r'（(.*?)）|\((.*?)\)', word)
     if match:
         return match.group(1) or match.group(2)
-    return re.sub(r'（.*?）|\(.*?\)', '', word).strip()
\ No newline at end of file
+    return re.sub(r'（.*?）|\(.*?\)', '', word).strip()
+
+# (新增) 句子切分: 句末标点 (可带右引号) 或换行 (对话按行拼接) 结束一句; 返回每句在原文中的 (start, end)
+SENTENCE_PATTERN = re.compile(r'[^。！？!?；;\n]*[。！？!?；;]+[”’」』"\']*|[^。！？!?；;\n]+')
+
+# 英文译文 / 拼音的句子切分 (句末为 . ! ? 或中文句末标点)
+LATIN_SENTENCE_PATTERN = re.compile(r'[^.!?。！？\n]*[.!?。！？]+[”’"\')\]]*|[^.!?。！？\n]+')
+
+def sentence_spans(text: str, pattern: re.Pattern = SENTENCE_PATTERN) -> list[tuple[int, int]]:
+    return [m.span() for m in pattern.finditer(text) if m.group().strip()]
+
+
+def split_sentences(text: str, pattern: re.Pattern = SENTENCE_PATTERN) -> list[str]:
+    """按句切分, 句间的空白/换行归入前一句; "".join(结果) == text。"""
+    spans = sentence_spans(text, pattern)
+    if not spans:
+        return [text] if text else []
+    # 句首空白 (英文句间的空格) 归入前一句
+    starts = [0] + [start + len(text[start:end]) - len(text[start:end].lstrip()) for start, end in spans[1:]]
+    ends = starts[1:] + [len(text)]
+    return [text[start:end] for start, end in zip(starts, ends)]
+
+
+def select_context(text: str, words: list[str], neighbours: int = 1, max_chars: int = 400) -> str:
+    """
+    从课文/对话中选出包含任一目标词的句子及其前后 neighbours 句, 总长不超过 max_chars
+    (优先保留命中句, 再按距离由近到远加入相邻句; 至少保留一个命中句)。
+    选中的句子按原文顺序截取原文片段, 不相邻的片段之间用 "……" 分隔。
+    没有句子包含目标词时返回全文。
+    """
+    spans = sentence_spans(text)
+    hits = [i for i, (start, end) in enumerate(spans) if any(w and w in text[start:end] for w in words)]
+    if not hits:
+        return text
+
+    selected: set[int] = set()
+    used = 0
+    for distance in range(neighbours + 1):
+        for hit in hits:
+            for i in {hit - distance, hit + distance}:
+                if 0 <= i < len(spans) and i not in selected:
+                    length = spans[i][1] - spans[i][0]
+                    if selected and used + length > max_chars:
+                        continue
+                    selected.add(i)
+                    used += length
+
+    chunks, run_start, prev = [], None, None
+    for i in sorted(selected):
+        if prev is None or i != prev + 1:
+            if run_start is not None:
+                chunks.append(text[spans[run_start][0]:spans[prev][1]].strip())
+            run_start = i
+        prev = i
+    chunks.append(text[spans[run_start][0]:spans[prev][1]].strip())
+    return "\n……\n".join(chunks)